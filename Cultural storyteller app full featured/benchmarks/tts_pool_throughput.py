@@ -0,0 +1,82 @@
+"""
+Narration throughput: a fresh pyttsx3 engine per call versus the worker pool
+
+Run from the app directory:
+
+    python benchmarks/tts_pool_throughput.py [--jobs 100] [--baseline-jobs 20] [--workers N] [--cpu-budget N]
+
+The baseline starts an engine per narration, as synthesize_speech() used
+to; the pool run queues every job at once on a started pool and waits for
+them all. Jobs run within PROCESS_POOL_CONFIG['cpu_budget'], like in the
+app. Output files go to a temporary directory and are removed.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import TTS_POOL_CONFIG, PROCESS_POOL_CONFIG
+from utils.tts_pool import create_engine, submit_speech, start_tts_pool, shutdown_tts_pool
+
+RATE = 160
+
+def narration_texts(count):
+    return [f"Story number {i}. Once upon a time, in a village by the river, lived a wise old weaver."
+            for i in range(count)]
+
+def per_call_baseline(texts, out_dir):
+    """Narrate one after another, starting an engine each time"""
+    started = time.perf_counter()
+    for i, text in enumerate(texts):
+        engine = create_engine()
+        engine.setProperty('rate', RATE)
+        engine.save_to_file(text, os.path.join(out_dir, f"baseline_{i}.wav"))
+        engine.runAndWait()
+    return time.perf_counter() - started
+
+def pool_run(texts, out_dir):
+    """Queue every narration on the pool at once and wait for all of them"""
+    started = time.perf_counter()
+    futures = [submit_speech(text, RATE, os.path.join(out_dir, f"pool_{i}.wav")) for i, text in enumerate(texts)]
+    for future in futures:
+        future.result(timeout=TTS_POOL_CONFIG['job_timeout'])
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=100, help="concurrent narrations for the pool run")
+    parser.add_argument('--baseline-jobs', type=int, default=20, help="narrations for the per-call baseline")
+    parser.add_argument('--workers', type=int, help="pool size; defaults to TTS_POOL_CONFIG")
+    parser.add_argument('--cpu-budget', type=int, help="jobs running at once; defaults to PROCESS_POOL_CONFIG")
+    args = parser.parse_args()
+
+    if args.workers:
+        TTS_POOL_CONFIG['max_workers'] = args.workers
+    if args.cpu_budget:
+        PROCESS_POOL_CONFIG['cpu_budget'] = args.cpu_budget
+    out_dir = tempfile.mkdtemp(prefix='tts_bench_')
+    try:
+        print(f"CPUs: {os.cpu_count()}, pool workers: {TTS_POOL_CONFIG['max_workers']}, "
+              f"CPU budget: {PROCESS_POOL_CONFIG['cpu_budget']}")
+
+        if args.baseline_jobs:
+            elapsed = per_call_baseline(narration_texts(args.baseline_jobs), out_dir)
+            print(f"Per-call engine: {args.baseline_jobs} jobs in {elapsed:.2f}s, "
+                  f"{args.baseline_jobs / elapsed:.1f} jobs/s")
+
+        started = time.perf_counter()
+        ready = start_tts_pool()
+        print(f"Pool start: {ready} workers ready in {time.perf_counter() - started:.2f}s")
+
+        elapsed = pool_run(narration_texts(args.jobs), out_dir)
+        print(f"Pool: {args.jobs} concurrent jobs in {elapsed:.2f}s, {args.jobs / elapsed:.1f} jobs/s")
+    finally:
+        shutdown_tts_pool()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
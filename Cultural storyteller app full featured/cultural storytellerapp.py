@@ -13,9 +13,11 @@ try:
         autobiography, settings, dashboard, 
         historical_figures, maps_timeline, community
     )
-    from utils.auth import check_authentication
+    from utils.auth import check_authentication, restore_session
     from utils.database import init_database
-    from utils.config import APP_CONFIG
+    from utils.activity import record_activity
+    from utils.config import APP_CONFIG, VOICE_SAMPLE_CONFIG
+    from utils.voice_samples import start_voice_sample_warmup
 except ImportError as e:
     st.error(f"Import error: {e}")
     st.stop()
@@ -31,6 +33,10 @@ st.set_page_config(
 # Initialize database on first run
 init_database()
 
+# Pre-render voice previews in the background, off the request path
+if VOICE_SAMPLE_CONFIG['warm_on_startup']:
+    start_voice_sample_warmup()
+
 # Load custom CSS for dark gradient theme
 def load_css():
     st.markdown("""
@@ -185,6 +191,10 @@ def main():
     if 'current_user' not in st.session_state:
         st.session_state.current_user = None
     
+    # Resume the server-side session (also after a server restart)
+    if restore_session():
+        st.session_state.show_splash = False
+    
     # Show splash screen on first visit
     if st.session_state.show_splash:
         show_splash_screen()
@@ -241,6 +251,9 @@ def main():
     # Route to selected page
     page = pages[selected]
     
+    # Presence: cheap in-memory update, flushed to the database in batches
+    record_activity((st.session_state.current_user or {}).get('id'))
+    
     if page == "home":
         home.show_home_page()
     elif page == "stories":
@@ -1,6 +1,7 @@
 import streamlit as st
 import hashlib
-from utils.database import create_user, verify_user, get_user_by_username
+from utils.database import create_user, verify_user
+from utils.auth import login_user
 
 def hash_password(password):
     """Hash password using SHA256"""
@@ -41,9 +42,7 @@ def show_login_page():
             
             if login_clicked:
                 if verify_user(username, hash_password(password), "storyteller"):
-                    st.session_state.authenticated = True
-                    st.session_state.user_type = "storyteller"
-                    st.session_state.current_user = get_user_by_username(username)
+                    login_user(username)
                     st.success("✅ Welcome back, Storyteller!")
                     st.rerun()
                 else:
@@ -83,9 +82,7 @@ def show_login_page():
             
             if login_clicked:
                 if verify_user(username, hash_password(password), "audience"):
-                    st.session_state.authenticated = True
-                    st.session_state.user_type = "audience"
-                    st.session_state.current_user = get_user_by_username(username)
+                    login_user(username)
                     st.success("✅ Welcome back, Audience member!")
                     st.rerun()
                 else:
@@ -1,7 +1,25 @@
 import streamlit as st
-from utils.database import get_all_stories, search_stories
+from utils.database import (
+    get_all_stories, search_stories, get_stories_by_ids, get_story_images,
+    get_playlist_values, get_playlist_stories, get_story_content, PLAYLIST_FIELDS
+)
+from utils.image_store import get_image_path
+from utils.enrichment import get_story_enrichment
+from utils.transcoding import get_story_renditions, pick_rendition
+from utils.recordings import get_story_audio_status
+from utils.similarity import find_similar_stories
+from utils.playlist import Playlist
+from utils.voice_synthesis import get_available_voices, listing_narration_renditions
+from utils.config import PLAYLIST_CONFIG
 import time
 
+# Connection choice -> bandwidth in kbps for picking an audio rendition
+CONNECTION_SPEEDS = {
+    "Fast (Wi-Fi)": 2000,
+    "Standard (4G)": 300,
+    "Slow (3G)": 150
+}
+
 def show_stories_page():
     """Display stories page with search and filtering"""
     st.markdown('<div class="main-header"><h1>📖 Cultural Stories Library</h1></div>', unsafe_allow_html=True)
@@ -9,6 +27,9 @@ def show_stories_page():
     # Search and filter section
     show_search_filters()
     
+    # Listen to a whole category, author or region
+    show_playlist_player()
+    
     # Stories grid
     show_stories_grid()
 
@@ -37,6 +58,71 @@ def show_search_filters():
     if st.button("🎯 Apply Filters", use_container_width=True):
         st.success(f"Filters applied! Found stories matching your criteria.")
 
+def show_playlist_player():
+    """Play a category's, author's or region's stories one after another"""
+    with st.expander("🎧 Story Playlists", expanded='playlist' in st.session_state):
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            field = st.selectbox("Play by", PLAYLIST_FIELDS, format_func=str.title)
+        
+        with col2:
+            value = st.selectbox(field.title(), get_playlist_values(field))
+        
+        with col3:
+            voice = st.selectbox("🎭 Narrator", get_available_voices(), key="playlist_voice")
+        
+        if st.button("▶️ Play Playlist", use_container_width=True) and value:
+            if 'playlist' in st.session_state:
+                st.session_state.playlist.stop()
+            st.session_state.playlist = Playlist(
+                get_playlist_stories(field, value, PLAYLIST_CONFIG['max_stories']), voice
+            )
+        
+        playlist = st.session_state.get('playlist')
+        if not playlist or not playlist.current:
+            return
+        
+        # Controls come first: a click reruns the page before the next narration starts
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            if st.button("⏮️ Previous", use_container_width=True, disabled=playlist.index == 0):
+                playlist.skip_to(playlist.index - 1)
+        with col2:
+            if st.button("⏹️ Stop", use_container_width=True):
+                playlist.stop()
+                del st.session_state.playlist
+                return
+        with col3:
+            if st.button("⏭️ Next", use_container_width=True, disabled=playlist.upcoming is None):
+                playlist.skip_to(playlist.index + 1)
+        
+        story = playlist.current
+        st.markdown(f"#### 🎵 Now playing ({playlist.index + 1}/{len(playlist.stories)}): "
+                    f"{story['title']} — by {story['author']}")
+        
+        # Narrated in the background: this rerun shows whatever is ready and returns
+        narration = playlist.play_current()
+        if narration.chunks:
+            # Each part gets its own player, so a rerun never replaces the one playing
+            for path in list(narration.chunks):
+                st.audio(path, format="audio/wav")
+        elif narration.done and not narration.future.exception():
+            audio_file, mime = narration.future.result()
+            if audio_file:
+                st.audio(audio_file, format=mime)
+        
+        if narration.done and narration.future.exception():
+            st.error(f"Narration failed: {str(narration.future.exception())}")
+        elif not narration.done:
+            st.progress(len(narration.chunks) / narration.total if narration.total else 0.0)
+            st.caption("🎙️ Narrating... play the parts that are ready, then refresh for the rest.")
+            st.button("🔄 Refresh", key="playlist_refresh")
+        
+        upcoming = playlist.upcoming
+        if upcoming:
+            st.caption(f"⏭️ Up next: {upcoming['title']} — by {upcoming['author']}")
+
 def show_stories_grid():
     """Display stories in a grid layout"""
     st.markdown("### 📚 Featured Stories")
@@ -221,8 +307,55 @@ def show_story_viewer(story):
     
     st.markdown(story_content)
     
+    # Summary, tags and moral computed in the background after publishing
+    enrichment = get_story_enrichment(story['id']) if story.get('id') else None
+    if enrichment:
+        with st.expander("✨ Story Insights"):
+            st.markdown(f"**Summary:** {enrichment['summary']}")
+            if enrichment['moral']:
+                st.markdown(f"**Moral:** {enrichment['moral']}")
+            if enrichment['suggested_tags']:
+                st.markdown(" ".join(f"`{tag}`" for tag in enrichment['suggested_tags']))
+            if enrichment['narration_measured']:
+                minutes, seconds = divmod(int(round(enrichment['narration_seconds'])), 60)
+                st.caption(f"⏱️ {minutes}:{seconds:02d} narration")
+            else:
+                st.caption(f"⏱️ About {enrichment['narration_seconds'] / 60:.0f} min to narrate")
+    
+    # Story art, served from the local image store
+    images = get_story_images(story['id']) if story.get('id') else []
+    if images:
+        cols = st.columns(min(len(images), 3))
+        for i, digest in enumerate(images):
+            with cols[i % len(cols)]:
+                st.image(get_image_path(digest, 640), use_column_width=True)
+    
     # Voice narration controls
     show_voice_controls(story)
+    
+    # Related tales from the local similarity index
+    show_similar_stories(story)
+
+def show_similar_stories(story, limit=5):
+    """Display stories similar to the one being viewed"""
+    if not story.get('id'):
+        return
+    
+    neighbours = find_similar_stories(story['id'], k=limit)
+    related = get_stories_by_ids([story_id for story_id, _ in neighbours])
+    
+    if not related:
+        return
+    
+    st.markdown("#### 🔗 Related Tales")
+    
+    for related_story in related:
+        st.markdown(f"""
+        <div class="story-card">
+            <h4 style="color: white; margin: 0 0 5px 0;">{related_story['title']}</h4>
+            <p style="color: #cccccc; margin: 0; font-size: 0.9rem;">by {related_story['author']} · 🏷️ {related_story['category']} · 📍 {related_story['region']}</p>
+        </div>
+        """, unsafe_allow_html=True)
 
 def play_story_audio(story):
     """Play story with voice narration"""
@@ -290,6 +423,26 @@ def show_voice_controls(story):
     with col2:
         speech_speed = st.slider("Speech Speed", 0.5, 2.0, 1.0, 0.1)
     
+    # An uploaded recording still being processed, or that couldn't be
+    status, error = get_story_audio_status(story['id']) if story.get('id') else (None, None)
+    if status == 'processing':
+        st.info("🎙️ The narrator's recording is still being processed; it will stream here once ready.")
+    elif status == 'failed':
+        st.warning(f"🎙️ The narrator's recording couldn't be processed: {error}")
+    
+    # Recorded audio, or the transcoded listing-voice narration, is streamed
+    # as the rendition that suits the listener's connection
+    renditions = get_story_renditions(story['id']) if story.get('id') else []
+    content = get_story_content(story['id']) if story.get('id') and not renditions else None
+    if content:
+        renditions = listing_narration_renditions(content, selected_voice, speech_speed)
+    if renditions:
+        connection = st.selectbox("📶 Connection", list(CONNECTION_SPEEDS))
+        rendition = pick_rendition(renditions, CONNECTION_SPEEDS[connection])
+        st.audio(rendition['path'], format=rendition['mime'])
+        st.caption(f"{rendition['codec'].upper()} · {rendition['bitrate'] // 1000} kbps")
+        return
+    
     if st.button("🎵 Play Narration", use_container_width=True):
         st.success(f"Playing story with {selected_voice} voice at {speech_speed}x speed")
         show_audio_player(selected_voice.lower().replace(" ", "_"))
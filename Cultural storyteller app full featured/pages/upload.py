@@ -1,7 +1,14 @@
 import streamlit as st
-from utils.ai_content import generate_story_content, generate_story_images
-from utils.voice_synthesis import get_available_voices, synthesize_speech
-from utils.database import save_story
+from utils.ai_content import generate_story_content, generate_story_images, stream_story_content
+from utils.voice_synthesis import (
+    get_available_voices, narrate_story, create_narration_with_background_music, get_music_track,
+    play_voice_sample
+)
+from utils.config import MUSIC_CONFIG, VOICE_CONFIG
+from utils.database import save_story, get_story_duplicates
+from utils.image_store import ingest_images, get_image_path
+from utils.transcoding import store_audio_upload
+from utils.recordings import process_audio, submit_story_recording
 import time
 
 def show_upload_page():
@@ -70,6 +77,12 @@ def show_manual_story_creation():
             height=400
         )
         
+        story_images = st.file_uploader(
+            "🖼️ Story Images",
+            type=['jpg', 'jpeg', 'png', 'webp'],
+            accept_multiple_files=True
+        )
+        
         # Story settings
         st.markdown("#### 🎛️ Story Settings")
         
@@ -114,17 +127,34 @@ def show_manual_story_creation():
                         }
                     }
                     
-                    # Save to database (mock)
-                    save_story(story_data, st.session_state.current_user['username'])
+                    if story_images:
+                        story_data["images"] = [d for d in ingest_images(story_images) if d]
+                    
+                    # Save to database; near-duplicates are flagged as it is saved
+                    story_data['id'] = save_story(story_data, st.session_state.current_user['username'])
+                    duplicates = get_story_duplicates(story_data['id'])
                 
                 st.success("✅ Story published successfully!")
                 
-                # Show voice generation options
+                if duplicates:
+                    closest = duplicates[0]
+                    st.warning(
+                        f"⚠️ This story looks very similar to \"{closest['title']}\" by {closest['author']} "
+                        f"(~{closest['jaccard']:.0%} overlap). It has been flagged for review as a possible duplicate."
+                    )
+                
+                # Voice options are shown below the form, on this and later reruns
                 if enable_voice:
-                    show_voice_generation_options(story_data)
+                    st.session_state.published_story = story_data
+                else:
+                    st.session_state.pop('published_story', None)
                 
             else:
                 st.error("❌ Please fill in all required fields marked with *")
+    
+    # Buttons can't live inside a form, so the narration options follow it
+    if st.session_state.get('published_story'):
+        show_voice_generation_options(st.session_state.published_story)
 
 def show_ai_story_creation():
     """AI-assisted story creation"""
@@ -169,55 +199,128 @@ def show_ai_story_creation():
         
         generate_images = st.checkbox("🎨 Generate Story Images", value=True)
         generate_voice = st.checkbox("🎵 Generate Voice Narration", value=True)
+        fresh_generation = st.checkbox("🔄 Generate a fresh version (skip saved results)", value=False)
         
         submitted = st.form_submit_button("🎨 Generate Story", use_container_width=True)
         
         if submitted:
             if story_prompt:
-                with st.spinner("🤖 AI is crafting your story..."):
-                    # Simulate AI story generation
-                    generated_story = generate_story_content(
-                        prompt=story_prompt,
-                        story_type=story_type,
-                        length=story_length,
-                        style=ai_style,
-                        cultural_context=cultural_context
-                    )
-                    
-                    time.sleep(3)  # Simulate processing time
-                
-                st.success("✅ Story generated successfully!")
-                
-                # Display generated content
+                # Display generated content as the AI writes it
                 st.markdown("#### 📖 Generated Story")
-                st.markdown(f"**Title:** {generated_story['title']}")
-                st.markdown(f"**Description:** {generated_story['description']}")
-                
-                with st.expander("📚 View Full Story Content"):
-                    st.markdown(generated_story['content'])
-                
-                # Image generation
-                if generate_images:
-                    st.markdown("#### 🎨 Generated Images")
-                    show_generated_images(story_prompt)
                 
-                # Voice generation options
-                if generate_voice:
-                    st.markdown("#### 🎵 Voice Generation")
-                    show_ai_voice_options(generated_story)
+                generated_story = render_story_stream(stream_story_content(
+                    prompt=story_prompt,
+                    story_type=story_type,
+                    length=story_length,
+                    style=ai_style,
+                    cultural_context=cultural_context,
+                    fresh=fresh_generation
+                ))
                 
-                # Allow editing and publishing
-                col1, col2 = st.columns(2)
-                with col1:
-                    if st.button("✏️ Edit Story", use_container_width=True):
-                        st.info("Story loaded in editor for customization!")
-                
-                with col2:
-                    if st.button("🚀 Publish Story", use_container_width=True):
-                        st.success("Story published to your profile!")
+                if generated_story.get('incomplete'):
+                    # Truncated mid-stream: not offered for voice or publishing
+                    st.session_state.pop('ai_story', None)
+                    st.error(f"❌ {generated_story['incomplete']}. Please generate the story again.")
+                else:
+                    st.success("✅ Story generated successfully!")
+                    
+                    # Image generation
+                    digests = []
+                    if generate_images:
+                        st.markdown("#### 🎨 Generated Images")
+                        digests = show_generated_images(story_prompt)
+                    
+                    # Kept for the actions below the form, which run on later reruns
+                    st.session_state.ai_story = {
+                        "story": generated_story,
+                        "story_type": story_type,
+                        "images": digests,
+                        "generate_voice": generate_voice
+                    }
                 
             else:
                 st.error("❌ Please provide a story prompt!")
+    
+    # Buttons can't live inside a form, so the generated story's actions follow it
+    ai_story = st.session_state.get('ai_story')
+    if ai_story:
+        if ai_story['generate_voice']:
+            st.markdown("#### 🎵 Voice Generation")
+            show_ai_voice_options(ai_story['story'])
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("✏️ Edit Story", use_container_width=True):
+                st.info("Story loaded in editor for customization!")
+        
+        with col2:
+            if st.button("🚀 Publish Story", use_container_width=True):
+                publish_ai_story(ai_story)
+                del st.session_state.ai_story
+                st.success("Story published to your profile!")
+
+# AI story type -> library category
+AI_STORY_CATEGORIES = {
+    "Historical Fiction": "Historical",
+    "Mythology Retelling": "Mythological",
+    "Folk Tale": "Folk Tales",
+    "Wisdom Story": "Wisdom",
+    "Heroic Adventure": "Heroic",
+    "Family Saga": "Family Heritage"
+}
+
+def publish_ai_story(ai_story):
+    """Save a generated story, referencing its generated images so they are kept"""
+    story = ai_story['story']
+    return save_story({
+        "title": story.get('title') or "Untitled Story",
+        "category": AI_STORY_CATEGORIES.get(ai_story['story_type'], "Folk Tales"),
+        "region": "Pan-Indian",
+        "language": "English",
+        "description": story.get('description', ''),
+        "content": story.get('content', ''),
+        "tags": [],
+        "duration": "",
+        "images": ai_story['images']
+    }, st.session_state.current_user['username'])
+
+def render_story_stream(events, refresh_interval=0.05):
+    """
+    Render streamed (field, text) story events progressively
+    
+    Args:
+        events (iterable): Output of stream_story_content
+        refresh_interval (float): Minimum seconds between UI refreshes
+    
+    Returns:
+        dict: The story with title, description and content; an
+            'incomplete' key holds the reason if the stream was cut short
+    """
+    story = {'title': '', 'description': '', 'content': ''}
+    
+    title_slot = st.empty()
+    description_slot = st.empty()
+    with st.expander("📚 Full Story Content", expanded=True):
+        content_slot = st.empty()
+    
+    def refresh(cursor="▌"):
+        title_slot.markdown(f"**Title:** {story['title']}")
+        description_slot.markdown(f"**Description:** {story['description']}")
+        content_slot.markdown(story['content'] + cursor)
+    
+    last_refresh = 0.0
+    for field, text in events:
+        if field == 'incomplete':
+            story['incomplete'] = text
+            continue
+        story[field] = story.get(field, '') + text
+        now = time.monotonic()
+        if now - last_refresh >= refresh_interval:
+            refresh()
+            last_refresh = now
+    
+    refresh(cursor="")
+    return story
 
 def show_voice_recording():
     """Voice recording interface"""
@@ -273,8 +376,23 @@ def show_voice_recording():
             
             if st.button("🎵 Process Audio", use_container_width=True):
                 with st.spinner("🎵 Processing your audio..."):
-                    time.sleep(2)
-                st.success("Audio processed successfully!")
+                    try:
+                        processed_file, stats = process_audio(store_audio_upload(audio_file),
+                                                              normalize=normalize_volume,
+                                                              condense_silence=remove_silence)
+                    except Exception as e:
+                        processed_file, stats = None, None
+                        st.error(f"Audio processing failed: {str(e)}")
+                
+                if processed_file:
+                    st.success("Audio processed successfully!")
+                    if stats:
+                        st.caption(
+                            f"⏱️ {stats['input_seconds']:.0f}s → {stats['output_seconds']:.0f}s"
+                            + (f" · 🔊 {stats['loudness_before']:.1f} → {stats['loudness_after']:.1f} LUFS"
+                               if stats['loudness_before'] is not None and stats['loudness_after'] is not None else "")
+                        )
+                    st.audio(processed_file, format="audio/wav")
     
     # Story metadata for voice recordings
     st.markdown("#### 📋 Story Information")
@@ -302,8 +420,39 @@ def show_voice_recording():
         submitted = st.form_submit_button("🎤 Publish Voice Story", use_container_width=True)
         
         if submitted and title:
+            if audio_file:
+                story_id = save_story({
+                    "title": title,
+                    "category": category,
+                    "region": region,
+                    "language": language,
+                    "description": description,
+                    "content": description or title,
+                    "tags": [],
+                    "duration": ""
+                }, st.session_state.current_user['username'])
+                
+                # Levelled, trimmed and encoded for streaming in the background
+                submit_story_recording(story_id, store_audio_upload(audio_file),
+                                       normalize=normalize_volume, condense_silence=remove_silence)
+            
             st.success("🎵 Voice story published successfully!")
 
+def ingest_uploads(uploaded_files):
+    """
+    Ingest uploaded images once, however many times the page reruns
+    
+    Returns:
+        list: Digests in upload order; None for images that failed
+    """
+    ingested = st.session_state.setdefault('ingested_uploads', {})
+    keys = [getattr(f, 'file_id', None) or (f.name, f.size) for f in uploaded_files]
+    new = [(key, f) for key, f in zip(keys, uploaded_files) if key not in ingested]
+    if new:
+        for (key, _), digest in zip(new, ingest_images([f for _, f in new])):
+            ingested[key] = digest
+    return [ingested[key] for key in keys]
+
 def show_visual_story_creation():
     """Visual story creation with image uploads and 3D transformation"""
     st.markdown("### 🖼️ Create Visual Stories")
@@ -325,11 +474,13 @@ def show_visual_story_creation():
         if uploaded_images:
             st.markdown(f"📁 **{len(uploaded_images)} images uploaded**")
             
-            # Display uploaded images
+            # Display uploaded images from their local variants
+            digests = ingest_uploads(uploaded_images)
             cols = st.columns(3)
-            for i, image in enumerate(uploaded_images):
+            for i, (image, digest) in enumerate(zip(uploaded_images, digests)):
                 with cols[i % 3]:
-                    st.image(image, caption=f"Image {i+1}", use_column_width=True)
+                    st.image(get_image_path(digest, 320) if digest else image,
+                             caption=f"Image {i+1}", use_column_width=True)
             
             # Image processing options
             st.markdown("##### 🎨 Image Enhancement")
@@ -403,10 +554,7 @@ def show_visual_story_creation():
                     height=150
                 )
                 
-                background_music = st.selectbox("🎵 Background Music", [
-                    "None", "Traditional Indian", "Peaceful Ambient", 
-                    "Epic Orchestral", "Folk Melodies"
-                ])
+                background_music = st.selectbox("🎵 Background Music", ["None"] + list(MUSIC_CONFIG['tracks']))
             
             with col2:
                 narration_text = st.text_area(
@@ -426,11 +574,33 @@ def show_visual_story_creation():
             submitted = st.form_submit_button("🎬 Create Visual Story", use_container_width=True)
             
             if submitted and story_title:
+                # Reference the uploaded images so they outlive the grace period
+                save_story({
+                    "title": story_title,
+                    "category": "Visual Story",
+                    "region": "Pan-Indian",
+                    "language": "English",
+                    "description": story_sequence,
+                    "content": narration_text or story_sequence or story_title,
+                    "tags": [],
+                    "duration": "",
+                    "images": [d for d in ingest_uploads(uploaded_images or []) if d]
+                }, st.session_state.current_user['username'])
+                
+                narration_audio = None
                 with st.spinner("🎬 Creating your visual story..."):
-                    time.sleep(4)
+                    if narration_text:
+                        narration_audio = create_narration_with_background_music(
+                            narration_text, VOICE_CONFIG['default_voice'], background_music
+                        )
                 
                 st.success("🎬 Visual story created successfully!")
                 
+                if narration_audio:
+                    st.audio(narration_audio, format="audio/wav")
+                    if background_music != "None" and not get_music_track(background_music):
+                        st.info(f"🎵 The \"{background_music}\" track couldn't be loaded, so the narration plays without music.")
+                
                 # Download options
                 col1, col2, col3 = st.columns(3)
                 
@@ -462,25 +632,71 @@ def show_voice_generation_options(story_data):
     with col3:
         add_music = st.checkbox("🎵 Add Background Music", value=False)
     
+    if st.button("🔊 Preview Voice", use_container_width=True):
+        sample_file = play_voice_sample(voice_personality, speech_speed)
+        if sample_file:
+            st.audio(sample_file, format="audio/wav")
+    
     if st.button("🎤 Generate Voice Narration", use_container_width=True):
-        with st.spinner("🎵 Generating voice narration..."):
-            # Simulate voice generation
-            synthesize_speech(story_data['content'], voice_personality, speech_speed)
-            time.sleep(3)
+        parts = st.container()
+        progress = st.progress(0)
+        played = []
         
-        st.success("🎵 Voice narration generated successfully!")
+        def play_chunk(index, path, total):
+            # Each part gets its own player as soon as it is ready, in reading order:
+            # swapping the source of a playing element would restart it
+            parts.audio(path, format="audio/wav")
+            played.append(path)
+            progress.progress((index + 1) / total)
         
-        # Play generated audio
-        st.audio("data:audio/wav;base64,UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUXrTp66hVFApGn+L2wWoWOqDY")
+        with st.spinner("🎵 Generating voice narration..."):
+            try:
+                audio_file = narrate_story(story_data['content'], voice_personality, speech_speed,
+                                           on_chunk=play_chunk, story_id=story_data.get('id'))
+            except Exception as e:
+                audio_file = None
+                st.error(f"Speech synthesis failed: {str(e)}")
+        
+        progress.progress(1.0)
+        if audio_file:
+            st.success("🎵 Voice narration generated successfully!")
+            
+            # Already narrated stories come straight from the cache, in one piece
+            if not played:
+                parts.audio(audio_file, format="audio/wav")
+        
+        if audio_file and add_music:
+            with st.spinner("🎵 Mixing background music..."):
+                mixed_file = create_narration_with_background_music(
+                    story_data['content'], voice_personality, MUSIC_CONFIG['default_track'], speech_speed
+                )
+            st.markdown("🎵 **With background music**")
+            st.audio(mixed_file, format="audio/wav")
 
 def show_generated_images(prompt):
-    """Display AI generated images for stories"""
+    """
+    Display AI generated images for stories
+    
+    Returns:
+        list: Digests of the stored images, to reference when the story is
+            published; unpublished ones are collected after a grace period
+    """
     st.markdown("🎨 Generating images for your story...")
     
     with st.spinner("🎨 Creating visual elements..."):
-        time.sleep(2)
+        # Fetched and resized once; later views use the local variants
+        digests = [d for d in ingest_images(generate_story_images(prompt)) if d]
+    
+    if digests:
+        cols = st.columns(3)
+        for i, digest in enumerate(digests):
+            with cols[i % 3]:
+                st.image(get_image_path(digest, 320), use_column_width=True)
+        
+        st.success("🎨 Story images generated successfully!")
+        return digests
     
-    # Mock generated images
+    # Image service unreachable: show placeholders
     col1, col2, col3 = st.columns(3)
     
     with col1:
@@ -507,7 +723,8 @@ def show_generated_images(prompt):
         <p style="text-align: center; color: white;">Landscape</p>
         """, unsafe_allow_html=True)
     
-    st.success("🎨 Story images generated successfully!")
+    st.warning("🎨 Couldn't fetch story images right now. Showing placeholders.")
+    return []
 
 def show_ai_voice_options(story_data):
     """Show AI voice generation options"""
@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ai_providers import OpenAICompatibleProvider, register_provider
+from utils import ai_cache, batch_generation
+from utils.batch_generation import TokenBucket, generate_story_batch
+from utils.config import BATCH_GENERATION_CONFIG, CIRCUIT_BREAKER_CONFIG
+
+class RateLimitedStub(ThreadingHTTPServer):
+    """
+    Local OpenAI-style chat endpoint that enforces its own rate limit
+
+    Requests over ``rate`` per second (after a burst of ``burst``) get a 429
+    with Retry-After. ``failures`` maps a prompt to the statuses it gets,
+    in order, before it succeeds. Every request is logged as
+    (time, prompt, status).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, rate=1000.0, burst=1000, failures=None, retry_after=0.2):
+        super().__init__(('127.0.0.1', 0), _StubHandler)
+        self.rate = rate
+        self.burst = burst
+        self.failures = {prompt: list(statuses) for prompt, statuses in (failures or {}).items()}
+        self.retry_after = retry_after
+        self.log = []
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def respond(self, prompt):
+        """Status for a request: the scripted failure, a 429 over the limit, or 200"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.failures.get(prompt):
+                status = self.failures[prompt].pop(0)
+            elif self._tokens < 1:
+                status = 429
+            else:
+                self._tokens -= 1
+                status = 200
+            self.log.append((now, prompt, status))
+            return status
+
+    def requests_for(self, prompt):
+        return [entry for entry in self.log if entry[1] == prompt]
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content'].split('based on this prompt:', 1)[1].splitlines()[0].strip()
+        status = self.server.respond(prompt)
+
+        if status == 200:
+            story = {'title': prompt, 'description': 'Stub', 'content': f"A story about {prompt}."}
+            payload = {'choices': [{'message': {'content': json.dumps(story)}}]}
+        else:
+            payload = {'error': {'message': f"Stub status {status}"}}
+        data = json.dumps(payload).encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if status == 429:
+            self.send_header('Retry-After', str(self.server.retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server(tmp_path, monkeypatch):
+    """Start a RateLimitedStub and register it as an AI provider; caches and progress go to tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ai_cache, '_initialized', False)
+    monkeypatch.setitem(BATCH_GENERATION_CONFIG, 'backoff_base', 0.05)
+    monkeypatch.setitem(BATCH_GENERATION_CONFIG, 'backoff_max', 0.2)
+    servers = []
+
+    def start(**settings):
+        server = RateLimitedStub(**settings)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+
+        name = f"stub{server.server_address[1]}"
+        provider = OpenAICompatibleProvider(server.url, model='stub', timeout=5)
+        provider.name = name
+        # Injected failures are the point here: keep the breaker out of the way
+        monkeypatch.setitem(CIRCUIT_BREAKER_CONFIG['overrides'], name, {'min_calls': 1000})
+        register_provider(name, lambda settings: provider)
+        return server, name
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def story_requests(*prompts):
+    return [{'prompt': prompt, 'story_type': 'Folk Tale'} for prompt in prompts]
+
+def test_token_bucket_holds_the_configured_rate(stub_server, monkeypatch):
+    server, provider = stub_server()
+    monkeypatch.setitem(BATCH_GENERATION_CONFIG, 'burst', 2)
+    prompts = [f"river {i}" for i in range(12)]
+
+    results = generate_story_batch(story_requests(*prompts), provider=provider, job_id='rate',
+                                   requests_per_minute=600, max_concurrency=8)
+
+    assert [result['status'] for result in results] == ['ok'] * 12
+    times = sorted(entry[0] for entry in server.log)
+    assert len(times) == 12
+    # Two burst tokens, then one every 0.1 s
+    for i, t in enumerate(times[2:], start=1):
+        assert t - times[0] >= i * 0.1 - 0.03
+    assert times[-1] - times[0] < 2.0
+
+def test_rate_limits_and_server_errors_are_retried_with_backoff(stub_server):
+    server, provider = stub_server(failures={'flaky': [503], 'limited': [429]}, retry_after=0.3)
+
+    results = generate_story_batch(story_requests('flaky', 'limited', 'steady'), provider=provider,
+                                   job_id='retries', requests_per_minute=6000)
+
+    assert {r['request']['prompt']: (r['status'], r['attempts']) for r in results} == {
+        'flaky': ('ok', 2), 'limited': ('ok', 2), 'steady': ('ok', 1)
+    }
+    first, retry = server.requests_for('limited')
+    assert first[2] == 429 and retry[2] == 200
+    assert retry[0] - first[0] >= 0.3
+
+def test_server_side_limit_is_respected_through_retry_after(stub_server):
+    server, provider = stub_server(rate=10.0, burst=2, retry_after=0.1)
+
+    results = generate_story_batch(story_requests(*[f"hill {i}" for i in range(8)]), provider=provider,
+                                   job_id='server-limit', requests_per_minute=6000, max_retries=10)
+
+    assert [result['status'] for result in results] == ['ok'] * 8
+    assert any(entry[2] == 429 for entry in server.log)
+    assert sum(1 for entry in server.log if entry[2] == 200) == 8
+
+def test_resumed_run_skips_items_already_done(stub_server):
+    server, provider = stub_server(failures={'broken': [400]})
+    batch = story_requests('sun', 'moon', 'broken')
+
+    first = generate_story_batch(batch, provider=provider, job_id='resume', requests_per_minute=6000)
+    assert [result['status'] for result in first] == ['ok', 'ok', 'failed']
+    assert first[2]['attempts'] == 1  # Client errors aren't retried
+
+    server.log.clear()
+    second = generate_story_batch(batch, provider=provider, job_id='resume', requests_per_minute=6000)
+    assert [result['status'] for result in second] == ['ok', 'ok', 'ok']
+    assert [entry[1] for entry in server.log] == ['broken']
+    assert second[0]['story'] == first[0]['story']
+
+def test_backoff_does_not_hold_a_concurrency_slot(stub_server, monkeypatch):
+    server, provider = stub_server(failures={'east': [503], 'west': [503]})
+    monkeypatch.setattr(batch_generation, 'backoff_delay', lambda attempt: 0.5)
+
+    started = time.monotonic()
+    results = generate_story_batch(story_requests('east', 'west'), provider=provider,
+                                   job_id='slots', requests_per_minute=6000, max_concurrency=1)
+    elapsed = time.monotonic() - started
+
+    assert [result['status'] for result in results] == ['ok', 'ok']
+    # With one slot the two backoffs overlap; holding it while sleeping would take over 1 s
+    assert elapsed < 0.9
+    assert [entry[2] for entry in server.log[:2]] == [503, 503]
+
+def test_token_bucket_pause_holds_back_callers():
+    async def run():
+        bucket = TokenBucket(rate=1000.0, capacity=5)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.19
@@ -0,0 +1,185 @@
+import os
+import sys
+import time
+import threading
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ai_providers import AIProvider, ProviderError, MockProvider, register_provider
+from utils.circuit_breaker import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, GuardedProvider,
+    call_with_deadline, guard_stream, CLOSED, OPEN, HALF_OPEN
+)
+
+class FaultyProvider(AIProvider):
+    """
+    Local stub that injects the faults an upstream can have
+
+    Args:
+        fail (bool): Raise on every call
+        status (int): Status code of injected failures
+        hang (float): Seconds each call blocks before answering
+        fail_after (int): Streams break off after this many fragments
+    """
+
+    name = 'faulty'
+
+    def __init__(self, fail=False, status=503, hang=0.0, fail_after=None):
+        self.fail = fail
+        self.status = status
+        self.hang = hang
+        self.fail_after = fail_after
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _call(self):
+        self.calls += 1
+        if self.hang:
+            self.release.wait(self.hang)
+        if self.fail:
+            raise ProviderError("Injected failure", status=self.status)
+
+    def generate_story(self, prompt, story_type, length, style, cultural_context):
+        self._call()
+        return {'title': 'Stub', 'description': 'Stub', 'content': 'Stub story.'}
+
+    def stream_story(self, prompt, story_type, length, style, cultural_context):
+        self._call()
+        for i in range(10):
+            if self.fail_after is not None and i == self.fail_after:
+                raise ProviderError("Connection reset mid-stream")
+            yield f"fragment {i} "
+
+    def generate_images(self, prompt, num_images):
+        self._call()
+        return ['stub.png'] * num_images
+
+    def enhance(self, text, enhancement_type):
+        self._call()
+        return text
+
+    def summarize(self, text, max_length):
+        self._call()
+        return text[:max_length]
+
+def make_breaker(**settings):
+    defaults = {'window_size': 10, 'min_calls': 3, 'failure_rate_threshold': 0.5,
+                'slow_call_duration': 5.0, 'slow_call_rate_threshold': 0.8,
+                'open_duration': 0.2, 'half_open_max_calls': 1}
+    defaults.update(settings)
+    return CircuitBreaker('stub', **defaults)
+
+def call(breaker, provider, deadline=1.0):
+    return call_with_deadline(breaker, provider.generate_story, deadline, 'p', 't', 'l', 's', '')
+
+def test_opens_on_failure_rate_and_rejects_without_calling():
+    breaker = make_breaker()
+    provider = FaultyProvider(fail=True)
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            call(breaker, provider)
+    assert breaker.snapshot()['state'] == OPEN
+
+    started = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        call(breaker, provider)
+    assert time.monotonic() - started < 0.05
+    assert provider.calls == 3
+    assert breaker.snapshot()['rejected'] == 1
+
+def test_half_open_probe_closes_on_success_and_reopens_on_failure():
+    breaker = make_breaker()
+    provider = FaultyProvider(fail=True)
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            call(breaker, provider)
+
+    time.sleep(0.25)
+    assert breaker.snapshot()['state'] == HALF_OPEN
+    with pytest.raises(ProviderError):
+        call(breaker, provider)
+    assert breaker.snapshot()['state'] == OPEN
+
+    time.sleep(0.25)
+    provider.fail = False
+    assert call(breaker, provider)['title'] == 'Stub'
+    assert breaker.snapshot()['state'] == CLOSED
+
+def test_client_errors_do_not_count_against_upstream():
+    breaker = make_breaker()
+    provider = FaultyProvider(fail=True, status=400)
+    for _ in range(5):
+        with pytest.raises(ProviderError):
+            call(breaker, provider)
+    snapshot = breaker.snapshot()
+    assert snapshot['state'] == CLOSED
+    assert snapshot['failure_rate'] == 0.0
+
+def test_deadline_returns_before_a_hung_call_finishes():
+    breaker = make_breaker()
+    provider = FaultyProvider(hang=5.0)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        call(breaker, provider, deadline=0.1)
+    assert time.monotonic() - started < 0.5
+    provider.release.set()
+    assert breaker.snapshot()['failure_rate'] == 1.0
+
+def test_stream_failing_mid_way_records_one_failure():
+    breaker = make_breaker()
+    provider = FaultyProvider(fail_after=3)
+    fragments = []
+    with pytest.raises(ProviderError):
+        for fragment in guard_stream(breaker, provider.stream_story('p', 't', 'l', 's', ''), 1.0):
+            fragments.append(fragment)
+    assert len(fragments) == 3
+    snapshot = breaker.snapshot()
+    assert snapshot['calls_in_window'] == 1
+    assert snapshot['failure_rate'] == 1.0
+
+def test_stream_records_one_success_even_when_abandoned():
+    breaker = make_breaker()
+    provider = FaultyProvider()
+    assert len(list(guard_stream(breaker, provider.stream_story('p', 't', 'l', 's', ''), 1.0))) == 10
+
+    stream = guard_stream(breaker, provider.stream_story('p', 't', 'l', 's', ''), 1.0)
+    next(stream)
+    stream.close()
+
+    snapshot = breaker.snapshot()
+    assert snapshot['calls_in_window'] == 2
+    assert snapshot['failure_rate'] == 0.0
+
+def test_outcomes_from_an_earlier_generation_are_ignored():
+    breaker = make_breaker(min_calls=1, failure_rate_threshold=1.0)
+    stale = breaker.allow()
+    breaker.record(0.0, ProviderError("down"), breaker.allow())
+    assert breaker.snapshot()['state'] == OPEN
+
+    time.sleep(0.25)
+    probe = breaker.allow()
+    assert breaker.snapshot()['state'] == HALF_OPEN
+    # A call started before the breaker opened can't close it
+    breaker.record(0.0, None, stale)
+    assert breaker.snapshot()['state'] == HALF_OPEN
+    breaker.record(0.0, None, probe)
+    assert breaker.snapshot()['state'] == CLOSED
+
+def test_open_breaker_falls_back_to_canned_content_fast():
+    from utils import ai_content
+
+    provider = FaultyProvider(fail=True)
+    register_provider('faulty', lambda settings: provider)
+    guarded = GuardedProvider(provider)
+    for _ in range(guarded.breaker.min_calls):
+        with pytest.raises(ProviderError):
+            guarded.generate_story('p', 'Folk Tale', 'Short', 'Traditional', '')
+    assert guarded.breaker.snapshot()['state'] == OPEN
+    calls = provider.calls
+
+    started = time.monotonic()
+    story = ai_content.generate_story_content('p', 'Folk Tale', provider='faulty', fresh=True)
+    assert time.monotonic() - started < 0.5
+    assert provider.calls == calls
+    assert story == MockProvider().generate_story('p', 'Folk Tale', 'Short', 'Traditional', '')
@@ -0,0 +1,66 @@
+import os
+import sys
+import random
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import DEDUP_CONFIG
+from utils.dedup import (
+    shingle, compute_minhash, band_keys, signature_to_blob, signature_from_blob,
+    estimate_jaccard, cluster_pairs
+)
+
+WORDS = ("river king weaver village forest temple elephant monkey sage queen "
+         "drum lamp festival harvest mango peacock tiger prince merchant boat").split()
+
+def story(seed, length=300):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) + str(rng.randrange(50)) for _ in range(length))
+
+def exact_jaccard(a, b):
+    a, b = shingle(a), shingle(b)
+    return len(a & b) / len(a | b)
+
+def test_shingles_are_word_ngrams():
+    assert shingle("The King, the KING!") == {'the king the', 'king the king'}
+    assert shingle("two words") == {'two words'}
+    assert shingle("  ...  ") == set()
+
+def test_signature_is_stable_and_round_trips():
+    signature = compute_minhash(story(1))
+
+    assert signature.dtype == np.uint64
+    assert len(signature) == DEDUP_CONFIG['num_perm']
+    assert np.array_equal(signature, compute_minhash(story(1)))
+    assert np.array_equal(signature_from_blob(signature_to_blob(signature)), signature)
+
+def test_text_without_words_has_no_signature():
+    assert compute_minhash("") is None
+    assert compute_minhash("— … —") is None
+
+def test_estimate_tracks_exact_jaccard():
+    original = story(2)
+    words = original.split()
+    for changed in (10, 60, 150):
+        edited = ' '.join(words[:-changed] + story(100 + changed, changed).split())
+        estimate = estimate_jaccard(compute_minhash(original), np.array([compute_minhash(edited)]))[0]
+        # Standard error with 128 permutations is under 0.05
+        assert abs(estimate - exact_jaccard(original, edited)) < 0.15
+
+def test_near_duplicates_share_a_band_and_unrelated_stories_dont():
+    original = story(3)
+    words = original.split()
+    near = ' '.join(words[:150] + ['monsoon'] + words[151:])
+
+    original_keys = set(band_keys(compute_minhash(original)))
+    assert len(original_keys) == DEDUP_CONFIG['bands']
+    assert original_keys & set(band_keys(compute_minhash(near)))
+    assert not original_keys & set(band_keys(compute_minhash(story(4))))
+
+def test_estimate_against_no_signatures():
+    assert len(estimate_jaccard(compute_minhash(story(5)), [])) == 0
+
+def test_pairs_cluster_transitively():
+    assert cluster_pairs([(3, 1), (5, 3), (8, 9), (2, 2)]) == [[1, 3, 5], [8, 9]]
+    assert cluster_pairs([]) == []
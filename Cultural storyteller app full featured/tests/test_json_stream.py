@@ -0,0 +1,73 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.json_stream import JSONFieldStreamParser
+
+STORY = {
+    'title': 'The Weaver\'s "Gift"',
+    'description': 'A tale\nfrom the river\\bank',
+    'content': 'राम वन गया। Emoji: \U0001F99A, tab:\t, slash: /'
+}
+
+def feed_all(fragments):
+    parser = JSONFieldStreamParser()
+    events = [event for fragment in fragments for event in parser.feed(fragment)]
+    return parser, events
+
+def joined(events):
+    fields = {}
+    for field, text in events:
+        fields[field] = fields.get(field, '') + text
+    return fields
+
+def test_whole_object_in_one_fragment():
+    parser, events = feed_all([json.dumps(STORY)])
+
+    assert parser.done
+    assert parser.result() == STORY
+    assert [field for field, _ in events] == ['title', 'description', 'content']
+
+def test_every_split_point_decodes_the_same():
+    # Escapes, \uXXXX sequences and surrogate pairs split across fragments
+    text = json.dumps(STORY, ensure_ascii=True)
+    for cut in range(len(text) + 1):
+        parser, events = feed_all([text[:cut], text[cut:]])
+        assert parser.done, cut
+        assert parser.result() == STORY, cut
+        assert joined(events) == STORY, cut
+
+def test_one_character_at_a_time():
+    text = json.dumps(STORY, ensure_ascii=True)
+    parser, events = feed_all(list(text))
+
+    assert parser.done
+    assert joined(events) == STORY
+
+def test_text_is_emitted_before_the_value_closes():
+    parser = JSONFieldStreamParser()
+
+    assert parser.feed('{"title": "The Wea') == [('title', 'The Wea')]
+    assert parser.feed('ver", "content": "Once') == [('title', 'ver'), ('content', 'Once')]
+    assert not parser.done
+    assert parser.result() == {'title': 'The Weaver', 'content': 'Once'}
+
+def test_code_fence_and_non_string_values_are_skipped():
+    text = '```json\n{"title": "T", "pages": 3, "tags": ["a", "b}"], "meta": {"x": [1, {"y": "\\""}]}, "content": "C"}\n```'
+    parser, events = feed_all([text])
+
+    assert parser.done
+    assert parser.result() == {'title': 'T', 'content': 'C'}
+
+def test_truncated_stream_is_not_done():
+    parser, _ = feed_all(['{"title": "T", "content": "Once upon'])
+
+    assert not parser.done
+    assert parser.result() == {'title': 'T', 'content': 'Once upon'}
+
+def test_invalid_escapes_are_replaced():
+    parser, _ = feed_all(['{"content": "a\\uZZ b \\ud83e c"}'])
+
+    assert parser.result() == {'content': 'a�ZZ b � c'}
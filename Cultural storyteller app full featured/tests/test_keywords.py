@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.keywords import KeywordMatcher, KeywordEngine, load_vocabulary, tokenize
+
+def counts(phrases, text):
+    matcher = KeywordMatcher(phrases)
+    return {phrases[index]: hits for index, hits in matcher.count(text).items()}
+
+def test_matches_stop_at_word_boundaries():
+    assert counts(['court'], "Courtesy is the courtier's art") == {}
+    assert counts(['court'], "The royal court, and the court's verdict.") == {'court': 2}
+    assert counts(['king'], "the kingdom of the kingfisher") == {}
+
+def test_multi_word_phrases_need_adjacent_words():
+    phrases = ['royal court', 'court']
+    assert counts(phrases, "The royal court sat") == {'royal court': 1, 'court': 1}
+    assert counts(phrases, "Royal, loyal court") == {'court': 1}
+    assert counts(['royal court'], "royal courtyard") == {}
+
+def test_overlapping_phrases_follow_failure_links():
+    phrases = ['river god', 'god of the river', 'the river']
+    found = counts(phrases, "We prayed to the river god of the river")
+
+    assert found == {'the river': 2, 'river god': 1, 'god of the river': 1}
+
+def test_gaps_between_known_words_reset_the_automaton():
+    # 'lion' and 'king' appear, but never next to each other
+    assert counts(['lion king'], "a lion met a king") == {}
+
+def test_case_and_unicode_forms_are_normalized():
+    assert counts(['dharma'], "DHARMA and Dharma") == {'dharma': 2}
+    assert counts(['ﬁre'], "the fire") == {'ﬁre': 1}  # NFKC folds the ligature
+    assert counts(['राम'], "राम ने रामायण पढ़ी") == {'राम': 1}
+
+def test_indic_combining_marks_stay_in_one_token():
+    assert tokenize("कृष्ण की बाँसुरी") == ['कृष्ण', 'की', 'बाँसुरी']
+
+def test_engine_scores_tags_and_picks_the_first_moral():
+    engine = KeywordEngine({'court': ['Royal'], 'forest': ['Nature', 'Adventure']},
+                           {'greed': "Greed loses.", 'kindness': "Kindness wins."})
+
+    tags, moral = engine.analyze("Kindness in the forest, greed at court, and the forest again")
+    assert tags == {'Nature': 2, 'Adventure': 2, 'Royal': 1}
+    assert moral == "Greed loses."
+
+    tags, moral = engine.analyze("Courtesy everywhere")
+    assert not tags and moral is None
+
+def test_vocabulary_file_extends_the_built_ins(tmp_path):
+    path = tmp_path / 'vocabulary.json'
+    path.write_text(json.dumps({'tags': {'stepwell': ['Architecture']}, 'morals': {'honesty': "Be honest."}}),
+                    encoding='utf-8')
+
+    tags, morals = load_vocabulary(str(path))
+    assert tags['stepwell'] == ['Architecture']
+    assert morals['honesty'] == "Be honest."
+    assert 'greed' in morals
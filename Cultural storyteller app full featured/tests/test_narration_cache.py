@@ -0,0 +1,120 @@
+import os
+import sys
+import time
+import wave
+import sqlite3
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.config import NARRATION_CACHE_CONFIG
+from utils.database import init_database
+from utils.narration_cache import (
+    DATABASE_FILE, narration_key, narration_path, narration_temp_path, store_narration,
+    lookup_narration, get_narration_info, evict_narrations, pin_narrations, get_narration_cache_stats
+)
+
+FRAMES = 8000  # half a second at 16 kHz, 16000 bytes of audio
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Empty narration cache and database in tmp_path"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setitem(NARRATION_CACHE_CONFIG, 'lease_seconds', 300)
+    init_database()
+
+def synthesize(text):
+    """Store a silent WAV as the narration of text, like the TTS pool would"""
+    key = narration_key(text, 'Narrator', 1.0)
+    temp_file = narration_temp_path(key)
+    with wave.open(temp_file, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b'\0\0' * FRAMES)
+    store_narration(key, temp_file, 'Narrator', 1.0)
+    return key
+
+def age(key, seconds):
+    """Pretend a narration was last used seconds ago"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    conn.execute('UPDATE narration_cache SET last_used = ? WHERE key = ?', (time.time() - seconds, key))
+    conn.commit()
+    conn.close()
+
+def cached(key):
+    return os.path.exists(narration_path(key)) and get_narration_info(key) is not None
+
+def test_key_is_stable_and_covers_the_audio_settings():
+    key = narration_key("Once upon a time", 'Narrator', 1.0)
+
+    assert key == narration_key("Once upon a time", 'Narrator', 1.0004)
+    assert key != narration_key("Once upon a time", 'Narrator', 1.2)
+    assert key != narration_key("Once upon a time", 'Storyteller', 1.0)
+    assert key != narration_key("Once upon a time", 'Narrator', 1.0, variant={'music': 'sitar'})
+
+def test_stored_narration_is_found_with_its_metadata(cache):
+    key = synthesize("The weaver's tale")
+
+    assert lookup_narration(key) == narration_path(key)
+    info = get_narration_info(key)
+    assert info['voice'] == 'Narrator'
+    assert info['duration'] == pytest.approx(0.5)
+    assert lookup_narration(narration_key("Untold", 'Narrator', 1.0)) is None
+
+def test_least_recently_used_are_evicted_first(cache):
+    keys = [synthesize(f"Story {i}") for i in range(4)]
+    for i, key in enumerate(keys):
+        age(key, 1000 - i * 100)  # Story 0 is the oldest
+
+    size = get_narration_info(keys[0])['bytes']
+    assert evict_narrations(max_bytes=2 * size) == 2
+
+    assert [cached(key) for key in keys] == [False, False, True, True]
+    assert get_narration_cache_stats()['bytes'] == 2 * size
+
+def test_pinned_narrations_are_kept(cache):
+    keys = [synthesize(f"Chunk {i}") for i in range(3)]
+    for key in keys:
+        age(key, 1000)
+
+    with pin_narrations(keys[:2]):
+        with pin_narrations(keys[:1]):
+            pass
+        # The inner pin's release doesn't unpin the outer one
+        assert evict_narrations(max_bytes=0) == 1
+        assert [cached(key) for key in keys] == [True, True, False]
+
+    assert evict_narrations(max_bytes=0) == 2
+    assert get_narration_cache_stats()['entries'] == 0
+
+def test_leased_narrations_are_kept_until_the_lease_ends(cache):
+    old = synthesize("Old story")
+    recent = synthesize("Recent story")
+    age(old, 1000)
+    age(recent, 1000)
+
+    # Looking a narration up renews its lease
+    assert lookup_narration(recent)
+    assert evict_narrations(max_bytes=0) == 1
+    assert not cached(old) and cached(recent)
+
+    age(recent, NARRATION_CACHE_CONFIG['lease_seconds'] + 1)
+    assert evict_narrations(max_bytes=0) == 1
+    assert not cached(recent)
+
+def test_storing_keeps_the_new_narration_over_the_cap(cache, monkeypatch):
+    monkeypatch.setitem(NARRATION_CACHE_CONFIG, 'max_bytes', 0)
+    monkeypatch.setitem(NARRATION_CACHE_CONFIG, 'lease_seconds', 0)
+
+    first = synthesize("First")
+    second = synthesize("Second")
+
+    assert not cached(first) and cached(second)
+
+def test_file_missing_from_disk_is_a_miss(cache):
+    key = synthesize("Vanished")
+    os.remove(narration_path(key))
+
+    assert lookup_narration(key) is None
+    assert get_narration_info(key) is None
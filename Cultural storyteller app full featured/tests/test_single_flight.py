@@ -0,0 +1,134 @@
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import ai_content
+from utils.ai_content import _single_flight
+
+class Interrupted(BaseException):
+    """Stands in for Streamlit stopping a session's script"""
+
+class SlowCall:
+    """
+    Local stub for an upstream call that blocks until released
+
+    Args:
+        result: What the call returns; an exception instance is raised instead
+    """
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(self.result, BaseException):
+            raise self.result
+        return self.result
+
+def run_callers(count, target):
+    """Start count threads calling target; returns (threads, outcomes)"""
+    outcomes = []
+    lock = threading.Lock()
+
+    def worker():
+        try:
+            value = ('ok', target())
+        except BaseException as e:
+            value = ('error', e)
+        with lock:
+            outcomes.append(value)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def join(threads):
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+
+def test_concurrent_callers_share_one_call(monkeypatch):
+    monkeypatch.setattr(ai_content, '_inflight', {})
+    call = SlowCall({'title': 'Shared'})
+
+    threads, outcomes = run_callers(8, lambda: _single_flight('story', call))
+    assert call.started.wait(5)
+    time.sleep(0.1)
+    call.release.set()
+    join(threads)
+
+    assert call.calls == 1
+    assert outcomes == [('ok', {'title': 'Shared'})] * 8
+    # Each caller gets its own copy
+    outcomes[0][1]['title'] = 'Changed'
+    assert outcomes[1][1]['title'] == 'Shared'
+    assert ai_content._inflight == {}
+
+def test_waiters_get_the_leaders_error(monkeypatch):
+    monkeypatch.setattr(ai_content, '_inflight', {})
+    call = SlowCall(RuntimeError("upstream down"))
+
+    threads, outcomes = run_callers(4, lambda: _single_flight('story', call))
+    assert call.started.wait(5)
+    time.sleep(0.1)
+    call.release.set()
+    join(threads)
+
+    assert call.calls == 1
+    assert [kind for kind, _ in outcomes] == ['error'] * 4
+    assert all(str(e) == "upstream down" for _, e in outcomes)
+
+def test_waiter_takes_over_from_an_interrupted_leader(monkeypatch):
+    monkeypatch.setattr(ai_content, '_inflight', {})
+    first = SlowCall(Interrupted())
+    retry = SlowCall('second try')
+    calls = [first, retry]
+
+    leader, leader_outcome = run_callers(1, lambda: _single_flight('story', calls[0]))
+    assert first.started.wait(5)
+    calls.pop(0)
+    waiters, outcomes = run_callers(3, lambda: _single_flight('story', calls[0]))
+    time.sleep(0.1)
+    first.release.set()
+    # Every waiter is back in line behind the retry before it finishes
+    assert retry.started.wait(5)
+    time.sleep(0.1)
+    retry.release.set()
+    join(leader + waiters)
+
+    assert leader_outcome[0][0] == 'error' and isinstance(leader_outcome[0][1], Interrupted)
+    assert retry.calls == 1
+    assert outcomes == [('ok', 'second try')] * 3
+
+def test_timeout_hands_over_to_one_waiter(monkeypatch):
+    monkeypatch.setattr(ai_content, '_inflight', {})
+    stuck = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(threading.current_thread().name)
+        if len(calls) == 1:
+            stuck.wait(5)
+            return 'late'
+        time.sleep(0.05)
+        return 'fresh'
+
+    leader, _ = run_callers(1, lambda: _single_flight('images', compute, timeout=0.2))
+    time.sleep(0.05)
+    waiters, outcomes = run_callers(5, lambda: _single_flight('images', compute, timeout=0.2))
+    join(waiters)
+    stuck.set()
+    join(leader)
+
+    # The stuck call is retired once, and a single waiter leads the retry
+    assert len(calls) == 2
+    assert outcomes == [('ok', 'fresh')] * 5
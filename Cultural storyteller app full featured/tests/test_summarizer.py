@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.summarizer import split_sentences, textrank_summary
+
+def test_sentences_split_at_danda_and_double_danda():
+    text = "राजा ने वन में प्रवेश किया। वहाँ एक ऋषि रहते थे॥ ऋषि ने राजा को आशीर्वाद दिया।"
+
+    assert split_sentences(text) == [
+        "राजा ने वन में प्रवेश किया।",
+        "वहाँ एक ऋषि रहते थे॥",
+        "ऋषि ने राजा को आशीर्वाद दिया।"
+    ]
+
+def test_sentences_split_after_closing_quotes_and_paragraphs():
+    text = 'He said, "Go home." She went.\n\nA new day began Then night'
+
+    assert split_sentences(text) == ['He said, "Go home."', 'She went.', 'A new day began Then night']
+
+def test_abbreviation_free_text_keeps_decimals_together():
+    assert split_sentences("It cost 2.50 rupees. Cheap!") == ["It cost 2.50 rupees.", "Cheap!"]
+
+def test_central_sentences_are_chosen_in_original_order():
+    text = ("The weaver lived by the river. "
+            "Monsoon clouds gathered slowly. "
+            "The weaver wove a cloth for the river goddess. "
+            "A crow sat on a wall. "
+            "The river goddess blessed the weaver and the cloth.")
+
+    summary = textrank_summary(text, max_length=110)
+
+    assert summary == ("The weaver wove a cloth for the river goddess. "
+                       "The river goddess blessed the weaver and the cloth.")
+
+def test_summary_fits_max_length():
+    text = " ".join(f"Sentence {i} tells of the king and his {i} elephants." for i in range(40))
+
+    for max_length in (30, 80, 200):
+        assert len(textrank_summary(text, max_length)) <= max_length
+
+def test_short_and_empty_text():
+    assert textrank_summary("") == ''
+    assert textrank_summary("One line only.") == "One line only."
+    assert textrank_summary("कथा समाप्त हुई। अंत॥") == "कथा समाप्त हुई। अंत॥"
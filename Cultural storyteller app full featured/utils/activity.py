@@ -0,0 +1,148 @@
+import sqlite3
+import time
+import atexit
+import threading
+from utils.config import DATABASE_CONFIG, ACTIVITY_CONFIG
+from utils.sessions import invalidate_user_sessions
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+# user_id -> latest unflushed timestamps (unix seconds)
+_pending_logins = {}
+_pending_seen = {}
+_pending_lock = threading.Lock()
+_flusher = None
+_flusher_lock = threading.Lock()
+
+def _ensure_flusher():
+    """Start the background flush thread on first use"""
+    global _flusher
+    if _flusher is not None:
+        return
+
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="activity-flush", daemon=True)
+            _flusher.start()
+
+def _flush_loop():
+    while True:
+        time.sleep(ACTIVITY_CONFIG['flush_interval'])
+        try:
+            flush_activity()
+        except sqlite3.Error:
+            pass  # Timestamps stay pending and are retried next time
+
+def record_login(user_id):
+    """Record a successful login (also counts as activity)"""
+    now = time.time()
+    with _pending_lock:
+        _pending_logins[user_id] = now
+        _pending_seen[user_id] = now
+    _ensure_flusher()
+
+def record_activity(user_id):
+    """Record that a user was active, e.g. navigated to a page"""
+    if user_id is None:
+        return
+    with _pending_lock:
+        _pending_seen[user_id] = time.time()
+    _ensure_flusher()
+
+def flush_activity():
+    """
+    Write pending timestamps in one batched transaction
+
+    Sessions of users whose last_login changed are marked stale in the
+    same transaction, so they reload the user record.
+
+    Returns:
+        int: Number of users whose timestamps were written
+    """
+    with _pending_lock:
+        logins = dict(_pending_logins)
+        seen = dict(_pending_seen)
+        _pending_logins.clear()
+        _pending_seen.clear()
+
+    if not logins and not seen:
+        return 0
+
+    try:
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        cursor.executemany('''
+            UPDATE users SET last_login = datetime(?, 'unixepoch') WHERE id = ?
+        ''', [(ts, user_id) for user_id, ts in logins.items()])
+        for user_id in logins:
+            invalidate_user_sessions(user_id, cursor)
+        cursor.executemany('''
+            INSERT INTO user_presence (user_id, last_seen)
+            VALUES (?, datetime(?, 'unixepoch'))
+            ON CONFLICT (user_id) DO UPDATE SET last_seen = MAX(last_seen, excluded.last_seen)
+        ''', [(user_id, ts) for user_id, ts in seen.items()])
+        conn.commit()
+        conn.close()
+    except sqlite3.Error:
+        # Merge back without overwriting anything newer recorded meanwhile
+        with _pending_lock:
+            for user_id, ts in logins.items():
+                _pending_logins[user_id] = max(ts, _pending_logins.get(user_id, 0))
+            for user_id, ts in seen.items():
+                _pending_seen[user_id] = max(ts, _pending_seen.get(user_id, 0))
+        raise
+
+    return len(set(logins) | set(seen))
+
+def get_last_seen(user_id):
+    """
+    Get when a user was last active
+
+    Returns:
+        float: Unix timestamp, or None if never seen
+    """
+    with _pending_lock:
+        pending = _pending_seen.get(user_id)
+    if pending is not None:
+        return pending
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT CAST(strftime('%s', last_seen) AS REAL) FROM user_presence WHERE user_id = ?
+    ''', (user_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def get_online_users(window=None):
+    """
+    Get users active within the presence window
+
+    Args:
+        window (int): Seconds of inactivity after which a user is offline
+
+    Returns:
+        set: IDs of online users
+    """
+    window = window or ACTIVITY_CONFIG['online_window']
+    cutoff = time.time() - window
+
+    with _pending_lock:
+        online = {user_id for user_id, ts in _pending_seen.items() if ts >= cutoff}
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT user_id FROM user_presence WHERE last_seen >= datetime(?, 'unixepoch')
+    ''', (cutoff,))
+    online.update(row[0] for row in cursor.fetchall())
+    conn.close()
+    return online
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        flush_activity()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from utils.config import AI_CACHE_CONFIG
+
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bypassed': 0}
+_stats_lock = threading.Lock()
+_initialized = False
+
+def _connect():
+    """Open the cache database, creating it on first use"""
+    global _initialized
+    path = AI_CACHE_CONFIG['cache_file']
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=10)
+    if not _initialized:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ai_cache (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ai_cache_access ON ai_cache (last_access)')
+        conn.commit()
+        _initialized = True
+    return conn
+
+def _count(stat, n=1):
+    with _stats_lock:
+        _stats[stat] += n
+
+def _normalize(value):
+    """Normalize request values so trivially different requests share a key"""
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+def make_cache_key(namespace, params):
+    """
+    Build a content-addressed cache key
+
+    Args:
+        namespace (str): What is being cached, e.g. 'story'
+        params (dict): Request parameters, including any generation settings
+
+    Returns:
+        str: sha256 hex digest of the normalized request
+    """
+    payload = json.dumps({'namespace': namespace, 'params': _normalize(params)},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cache_get(key, ttl=None):
+    """
+    Look up a cached value
+
+    Returns:
+        The cached value, or None on a miss or expired entry
+    """
+    if not AI_CACHE_CONFIG['enabled']:
+        return None
+
+    ttl = AI_CACHE_CONFIG['ttl'] if ttl is None else ttl
+    now = time.time()
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT value, created_at FROM ai_cache WHERE key = ?', (key,))
+    row = cursor.fetchone()
+
+    if row is None:
+        conn.close()
+        _count('misses')
+        return None
+
+    if ttl and now - row[1] > ttl:
+        cursor.execute('DELETE FROM ai_cache WHERE key = ?', (key,))
+        conn.commit()
+        conn.close()
+        _count('misses')
+        return None
+
+    cursor.execute('UPDATE ai_cache SET last_access = ?, hits = hits + 1 WHERE key = ?', (now, key))
+    conn.commit()
+    conn.close()
+    _count('hits')
+    return json.loads(row[0])
+
+def cache_put(key, namespace, value):
+    """Store a JSON-serializable value and evict least recently used entries"""
+    if not AI_CACHE_CONFIG['enabled']:
+        return
+
+    data = json.dumps(value, ensure_ascii=False)
+    now = time.time()
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT OR REPLACE INTO ai_cache (key, namespace, value, size, created_at, last_access)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (key, namespace, data, len(data.encode('utf-8')), now, now))
+
+    cursor.execute('SELECT COALESCE(SUM(size), 0) FROM ai_cache')
+    total = cursor.fetchone()[0]
+    max_bytes = AI_CACHE_CONFIG['max_bytes']
+
+    if total > max_bytes:
+        cursor.execute('SELECT key, size FROM ai_cache ORDER BY last_access')
+        victims = []
+        for victim_key, size in cursor.fetchall():
+            if total <= max_bytes:
+                break
+            if victim_key == key:
+                continue
+            victims.append((victim_key,))
+            total -= size
+        cursor.executemany('DELETE FROM ai_cache WHERE key = ?', victims)
+        _count('evictions', len(victims))
+
+    conn.commit()
+    conn.close()
+
+def cached_call(namespace, params, compute, fresh=False, ttl=None):
+    """
+    Return a cached result for a request, computing and storing it on a miss
+
+    Exceptions from ``compute`` propagate and nothing is cached.
+
+    Args:
+        namespace (str): What is being cached
+        params (dict): Request parameters that determine the result
+        compute (callable): Produces the result on a miss
+        fresh (bool): Skip the lookup and overwrite the cached entry
+        ttl (int): Override the configured time-to-live in seconds
+
+    Returns:
+        The cached or freshly computed value
+    """
+    key = make_cache_key(namespace, params)
+
+    if fresh:
+        _count('bypassed')
+    else:
+        cached = cache_get(key, ttl)
+        if cached is not None:
+            return cached
+
+    value = compute()
+    cache_put(key, namespace, value)
+    return value
+
+def get_cache_stats():
+    """Get cache hit/miss counters and storage usage"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+
+    conn = _connect()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ai_cache')
+    stats['entries'], stats['bytes'] = cursor.fetchone()
+    cursor.execute('SELECT namespace, COUNT(*) FROM ai_cache GROUP BY namespace')
+    stats['by_namespace'] = dict(cursor.fetchall())
+    conn.close()
+
+    return stats
+
+def clear_cache(namespace=None):
+    """Remove all cached entries, or only those in one namespace"""
+    conn = _connect()
+    if namespace:
+        conn.execute('DELETE FROM ai_cache WHERE namespace = ?', (namespace,))
+    else:
+        conn.execute('DELETE FROM ai_cache')
+    conn.commit()
+    conn.close()
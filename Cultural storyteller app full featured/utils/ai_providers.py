@@ -0,0 +1,433 @@
+import re
+import json
+import time
+import random
+import threading
+import requests
+from abc import ABC, abstractmethod
+from utils.config import AI_CONFIG, AI_PROVIDER_CONFIG, get_api_key
+from utils.json_stream import JSONFieldStreamParser
+from utils.summarizer import textrank_summary
+
+class ProviderError(Exception):
+    """An AI provider call failed
+
+    Attributes:
+        status (int): HTTP-style status code when known (429, 503, ...)
+        retry_after (float): Seconds the provider asked us to wait, if any
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """Rate limits, server errors and transport failures are worth retrying"""
+        return self.status is None or self.status == 429 or self.status >= 500
+
+MOCK_STORIES = {
+    "Historical Fiction": {
+        "title": "The Wisdom of Emperor Akbar",
+        "description": "A tale of justice and wisdom from the Mughal court, where Emperor Akbar's fair judgment resolves a complex dispute between merchants.",
+        "content": """
+        In the golden halls of Fatehpur Sikri, Emperor Akbar held court on a bright morning in the year 1590. The sun's rays filtered through the intricate jali work, casting dancing shadows on the marble floor where two merchants stood before the throne, their dispute echoing in the vast chamber.
+
+        "Your Majesty," began Hakim, a textile merchant from Delhi, his voice trembling with emotion, "this man has cheated me of my rightful earnings. We agreed on a price for my finest silk, but now he refuses to pay the full amount."
+
+        Opposite him stood Ramesh, a trader from Gujarat, his head held high despite the accusation. "Respected Emperor, I speak the truth when I say that the silk was not as promised. The quality was inferior to what we agreed upon. I paid what the goods were truly worth."
+
+        Akbar listened carefully, his wise eyes observing both men. The court fell silent, waiting for the emperor's judgment. Birbal, his trusted advisor, watched from the side, knowing that his master would find a solution that served justice while teaching a valuable lesson.
+
+        "Bring me samples of the disputed silk," commanded Akbar. When the material was presented, he examined it closely, feeling its texture and studying its weave under the light.
+
+        After several minutes of contemplation, Akbar spoke: "I see that this silk is indeed of good quality, though perhaps not the finest grade. However, I also understand that expectations must be clearly communicated in any agreement."
+
+        He then made a decision that surprised everyone: "Hakim, you will receive three-quarters of the originally agreed price, for your silk is good but not exceptional. Ramesh, you will pay this amount plus a small penalty for not communicating your concerns before taking the goods."
+
+        "But why the additional penalty, Your Majesty?" asked Ramesh.
+
+        "Because," replied Akbar with a gentle smile, "trust is the foundation of all trade. If you had concerns about the quality, you should have spoken immediately rather than accepting the goods and then refusing payment. This teaches us that honest communication prevents such disputes."
+
+        Both merchants bowed, understanding the wisdom in the emperor's judgment. As they left the court, reconciled and wiser, Birbal approached Akbar.
+
+        "Once again, Jahanpanah, your judgment serves justice while teaching valuable lessons."
+
+        Akbar nodded thoughtfully. "Birbal, true leadership lies not just in making decisions, but in ensuring that every judgment strengthens the bonds of trust and understanding among our people."
+
+        The story of this judgment spread throughout the empire, reminding all traders and merchants that fairness, communication, and trust were the pillars upon which successful commerce was built. And in the courts of Akbar, justice was not merely about punishment or reward, but about creating a society where wisdom prevailed over conflict.
+        """
+    },
+    "Mythology Retelling": {
+        "title": "The Test of Hanuman's Devotion",
+        "description": "A retelling of how Lord Hanuman's unwavering devotion to Rama was tested and proved beyond all doubt.",
+        "content": """
+        In the celestial realm where gods convened to discuss the affairs of mortals and immortals alike, a great debate arose about the nature of true devotion. Some claimed that devotion was merely ritual, others argued it was service, but Sage Narada had a different perspective.
+
+        "True devotion," declared Narada, his veena strings humming with divine melody, "transcends all forms and manifests as complete surrender of the self."
+
+        "But how can we measure such devotion?" asked Indra, king of the gods.
+
+        Narada's eyes twinkled with divine mischief. "Let us test the greatest devotee we know - Hanuman, the devoted servant of Lord Rama."
+
+        And so, a test was devised. Hanuman was sitting in meditation at the foothills of Mount Govardhan when a beautiful brahmin appeared before him, claiming to be a great devotee of Lord Rama.
+
+        "O mighty Hanuman," said the brahmin, "I have heard of your unparalleled devotion to Lord Rama. I too am his devotee, but I wonder - do you love Rama more, or does Rama love you more?"
+
+        Hanuman opened his eyes, surprised by the strange question. "Respected brahmin, how can one measure the ocean of Lord Rama's love? I am but a humble servant."
+
+        "But surely," persisted the brahmin, "your devotion must earn you special favor. Does Rama not grant you whatever you wish?"
+
+        Hanuman shook his head gently. "I desire nothing except the opportunity to serve my Lord. My greatest joy is in chanting his name and carrying out his will."
+
+        The brahmin smiled cunningly. "Then prove it. If your devotion is pure, tear open your chest and show me where Rama resides in your heart."
+
+        Without hesitation, without question, and with complete faith, Hanuman placed his hands on his chest. The brahmin and all the hidden gods watched in amazement as Hanuman prepared to fulfill even this strange request.
+
+        But just as he was about to act, the brahmin revealed his true form - it was Lord Rama himself, accompanied by Sita and Lakshman.
+
+        "Stop, my dear Hanuman," said Rama, his voice filled with divine love. "Your willingness to do even this proves your devotion beyond any doubt. You were ready to give your very life without question, without seeking to understand why, simply because you believed it was my wish."
+
+        Hanuman fell at Rama's feet, tears of joy streaming down his face. "My Lord, I would gladly give my life a thousand times if it serves your purpose."
+
+        Rama lifted Hanuman gently. "This is why you are my greatest devotee, Hanuman. Not because you are powerful, not because you can leap across oceans or move mountains, but because your love is pure and selfless. You seek nothing for yourself, not even understanding - only the joy of service."
+
+        The watching gods bowed in reverence, understanding now that true devotion was not about what one could gain, but what one was willing to give. And Hanuman's name became synonymous with selfless service and unwavering faith.
+
+        From that day forward, whenever someone spoke of perfect devotion, they would remember Hanuman - not just for his mighty deeds, but for his readiness to surrender everything, even his own understanding, at the feet of his beloved Lord.
+
+        The lesson echoed through the ages: True devotion asks no questions, seeks no rewards, and finds its greatest joy in the simple act of loving service.
+        """
+    }
+}
+
+MOCK_IMAGES = [
+    "https://images.pexels.com/photos/1587927/pexels-photo-1587927.jpeg",  # Palace
+    "https://images.pexels.com/photos/2889344/pexels-photo-2889344.jpeg",  # Historical figure
+    "https://images.pexels.com/photos/1586298/pexels-photo-1586298.jpeg"   # Cultural scene
+]
+
+ENHANCEMENT_NOTES = {
+    "grammar_and_flow": "Enhanced for better grammar and narrative flow",
+    "cultural_authenticity": "Enhanced with more authentic cultural details",
+    "dramatic_effect": "Enhanced with more dramatic elements and suspense",
+    "accessibility": "Enhanced for better readability and accessibility"
+}
+
+def build_story_messages(prompt, story_type, length, style, cultural_context):
+    """Build the chat messages for a story generation request"""
+    # Construct detailed prompt
+    system_prompt = f"""
+    You are a master storyteller specializing in cultural and traditional stories from India.
+    Create a {story_type} story in {style} writing style.
+    The story should be approximately {length} and incorporate {cultural_context} cultural elements.
+
+    Make the story engaging, culturally authentic, and appropriate for preservation of cultural heritage.
+    Include moral lessons or wisdom typical of traditional Indian storytelling.
+    """
+
+    user_prompt = f"""
+    Create a story based on this prompt: {prompt}
+
+    Please format the response as JSON with the following structure:
+    {{
+        "title": "Story Title",
+        "description": "Brief story description",
+        "content": "Full story content with proper paragraphs"
+    }}
+    """
+
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def parse_story_json(text):
+    """Parse a model's JSON story reply, tolerating code fences around it"""
+    parser = JSONFieldStreamParser()
+    parser.feed(text)
+    story = parser.result()
+    if not story.get('content'):
+        raise ProviderError("Model reply did not contain a story")
+    return story
+
+class AIProvider(ABC):
+    """
+    Interface every AI backend implements
+
+    ``cache_id`` identifies the backend and model in cache keys so results
+    from different providers never mix. A backend missing any of the
+    abstract methods fails when it is created, not halfway through a request.
+    """
+
+    name = 'base'
+
+    @property
+    def cache_id(self):
+        return self.name
+
+    @abstractmethod
+    def generate_story(self, prompt, story_type, length, style, cultural_context):
+        """Return a dict with title, description and content"""
+
+    @abstractmethod
+    def stream_story(self, prompt, story_type, length, style, cultural_context):
+        """Yield fragments of the story's JSON text as they are produced"""
+
+    @abstractmethod
+    def generate_images(self, prompt, num_images):
+        """Return a list of image URLs"""
+
+    @abstractmethod
+    def enhance(self, text, enhancement_type):
+        """Return the enhanced text"""
+
+    @abstractmethod
+    def summarize(self, text, max_length):
+        """Return a summary of at most max_length characters"""
+
+class OpenAICompatibleProvider(AIProvider):
+    """Backend for any server speaking the OpenAI REST API (OpenAI, vLLM, LocalAI, ...)"""
+
+    name = 'openai'
+
+    def __init__(self, base_url, api_key=None, model="gpt-3.5-turbo", image_model="dall-e-3", timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.image_model = image_model
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{self.base_url}:{self.model}"
+
+    def _post(self, path, payload, stream=False):
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+
+        try:
+            response = self._session.post(f"{self.base_url}{path}", json=payload, headers=headers,
+                                          timeout=self.timeout, stream=stream)
+        except requests.RequestException as e:
+            raise ProviderError(str(e)) from e
+
+        if response.status_code >= 400:
+            retry_after = response.headers.get('Retry-After')
+            raise ProviderError(
+                f"{self.name} returned HTTP {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                retry_after=float(retry_after) if retry_after and retry_after.replace('.', '', 1).isdigit() else None
+            )
+        return response
+
+    def _chat(self, messages, max_tokens=None, stream=False):
+        settings = AI_CONFIG['story_generation']
+        payload = {
+            'model': self.model,
+            'messages': messages,
+            'max_tokens': max_tokens or settings['max_tokens'],
+            'temperature': settings['temperature'],
+            'presence_penalty': settings['presence_penalty'],
+            'frequency_penalty': settings['frequency_penalty'],
+            'stream': stream
+        }
+        return self._post('/chat/completions', payload, stream=stream)
+
+    def _complete(self, messages, max_tokens=None):
+        data = self._chat(messages, max_tokens).json()
+        try:
+            return data['choices'][0]['message']['content']
+        except (KeyError, IndexError) as e:
+            raise ProviderError(f"Unexpected response from {self.name}: {data}") from e
+
+    def generate_story(self, prompt, story_type, length, style, cultural_context):
+        return parse_story_json(self._complete(
+            build_story_messages(prompt, story_type, length, style, cultural_context)))
+
+    def stream_story(self, prompt, story_type, length, style, cultural_context):
+        response = self._chat(build_story_messages(prompt, story_type, length, style, cultural_context), stream=True)
+        try:
+            # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                delta = json.loads(data)['choices'][0].get('delta', {})
+                if delta.get('content'):
+                    yield delta['content']
+        except requests.RequestException as e:
+            raise ProviderError(str(e)) from e
+        finally:
+            response.close()
+
+    def generate_images(self, prompt, num_images):
+        payload = {
+            'model': self.image_model,
+            'prompt': prompt,
+            'n': num_images,
+            'size': AI_CONFIG['image_generation']['image_size']
+        }
+        data = self._post('/images/generations', payload).json()
+        return [item['url'] for item in data.get('data', []) if item.get('url')]
+
+    def enhance(self, text, enhancement_type):
+        goal = ENHANCEMENT_NOTES.get(enhancement_type, 'general improvement')
+        return self._complete([
+            {"role": "system", "content": "You are an editor of traditional Indian stories. "
+                                          "Return only the revised story text, keeping its meaning and cultural details. "
+                                          "Keep one paragraph per input paragraph, separated by blank lines."},
+            {"role": "user", "content": f"Goal: {goal}.\n\n{text}"}
+        ])
+
+    def summarize(self, text, max_length):
+        summary = self._complete([
+            {"role": "system", "content": f"Summarize the story in at most {max_length} characters."},
+            {"role": "user", "content": text}
+        ], max_tokens=max(32, max_length // 2))
+        return summary.strip()[:max_length]
+
+class MockProvider(AIProvider):
+    """
+    Deterministic offline backend with canned content
+
+    Latency and failures are injectable so the rest of the pipeline can be
+    load tested without sleeps or network access.
+
+    Args:
+        latency (float): Seconds added to every call
+        jitter (float): Extra random latency, up to this many seconds
+        failure_rate (float): Fraction of calls that raise ProviderError
+        failure_status (int): Status code attached to injected failures
+        stream_chunk_size (int): Characters per streamed fragment
+        seed (int): Seed for the jitter/failure sequence
+    """
+
+    name = 'mock'
+
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=503,
+                 stream_chunk_size=12, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.stream_chunk_size = stream_chunk_size
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _simulate(self):
+        with self._rng_lock:
+            delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+            fail = self.failure_rate and self._rng.random() < self.failure_rate
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise ProviderError("Injected mock provider failure", status=self.failure_status)
+
+    def _story(self, story_type, cultural_context):
+        # Return appropriate mock story based on story type
+        story_key = story_type if story_type in MOCK_STORIES else "Historical Fiction"
+        generated_story = MOCK_STORIES[story_key].copy()
+
+        # Modify based on cultural context if provided
+        if cultural_context:
+            generated_story["description"] = f"{generated_story['description']} Set in the context of {cultural_context}."
+
+        return generated_story
+
+    def generate_story(self, prompt, story_type, length, style, cultural_context):
+        self._simulate()
+        return self._story(story_type, cultural_context)
+
+    def stream_story(self, prompt, story_type, length, style, cultural_context):
+        self._simulate()
+        text = json.dumps(self._story(story_type, cultural_context), ensure_ascii=False)
+        for i in range(0, len(text), self.stream_chunk_size):
+            yield text[i:i + self.stream_chunk_size]
+
+    def generate_images(self, prompt, num_images):
+        self._simulate()
+        return MOCK_IMAGES[:num_images]
+
+    def enhance(self, text, enhancement_type):
+        self._simulate()
+        # Tidy whitespace paragraph by paragraph, like an editor would, so
+        # chunked enhancement can line paragraphs up again
+        paragraphs = [' '.join(p.split()) for p in re.split(r'\n\s*\n', text)]
+        return '\n\n'.join(p for p in paragraphs if p)
+
+    def summarize(self, text, max_length):
+        self._simulate()
+        return textrank_summary(text, max_length)
+
+def _make_openai(settings):
+    return OpenAICompatibleProvider(
+        base_url=settings['base_url'],
+        api_key=settings.get('api_key') or get_api_key('openai'),
+        model=settings['model'],
+        image_model=settings['image_model'],
+        timeout=settings['timeout']
+    )
+
+def _make_mock(settings):
+    return MockProvider(**settings)
+
+# Provider name -> factory taking that provider's settings dict
+_PROVIDER_FACTORIES = {
+    'openai': _make_openai,
+    'mock': _make_mock
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+def register_provider(name, factory):
+    """
+    Register an AI backend
+
+    Args:
+        name (str): Name used in AI_PROVIDER_CONFIG['provider']
+        factory (callable): Builds the provider from its settings dict
+    """
+    _PROVIDER_FACTORIES[name] = factory
+    with _instances_lock:
+        _instances.pop(name, None)
+
+def resolve_provider_name(name=None):
+    """Resolve 'auto' (the default) to openai when a key is configured, else mock"""
+    name = name or AI_PROVIDER_CONFIG['provider']
+    if name == 'auto':
+        return 'openai' if get_api_key('openai') else 'mock'
+    return name
+
+def get_provider(name=None):
+    """
+    Get the configured (or named) AI provider instance
+
+    Calls on the returned object go through the provider's circuit breaker
+    and per-call deadlines (see utils.circuit_breaker).
+
+    Args:
+        name (str): Provider name; defaults to AI_PROVIDER_CONFIG['provider']
+
+    Returns:
+        GuardedProvider: Shared provider instance
+    """
+    from utils.circuit_breaker import GuardedProvider
+
+    name = resolve_provider_name(name)
+
+    with _instances_lock:
+        provider = _instances.get(name)
+        if provider is None:
+            if name not in _PROVIDER_FACTORIES:
+                raise ValueError(f"Unknown AI provider: {name}")
+            settings = AI_PROVIDER_CONFIG['providers'].get(name, {})
+            provider = GuardedProvider(_PROVIDER_FACTORIES[name](settings))
+            _instances[name] = provider
+        return provider
@@ -0,0 +1,492 @@
+import os
+import math
+import wave
+import zlib
+import numpy as np
+from utils.config import MUSIC_CONFIG
+
+def concatenate_wavs(paths, out_file):
+    """
+    Join WAV files back to back with no gap between them
+
+    Frames are copied as-is, so the result plays exactly like the parts in
+    sequence.
+
+    Args:
+        paths (list): WAV files, all with the same format
+        out_file (str): File to write
+
+    Returns:
+        float: Duration of the result in seconds
+    """
+    if not paths:
+        raise ValueError("No WAV files to concatenate")
+
+    params = None
+    frames = 0
+    with wave.open(out_file, 'wb') as out:
+        for path in paths:
+            with wave.open(path, 'rb') as part:
+                part_params = (part.getnchannels(), part.getsampwidth(), part.getframerate())
+                if params is None:
+                    params = part_params
+                    out.setnchannels(params[0])
+                    out.setsampwidth(params[1])
+                    out.setframerate(params[2])
+                elif part_params != params:
+                    raise ValueError(f"{path} has format {part_params}, expected {params}")
+                out.writeframes(part.readframes(part.getnframes()))
+                frames += part.getnframes()
+
+    return frames / params[2]
+
+def pcm_to_float(raw, sample_width, channels):
+    """Decode PCM bytes to float32 samples in [-1, 1], shaped (frames, channels)"""
+    if sample_width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width} bytes")
+    return samples.reshape(-1, channels)
+
+def float_to_pcm16(samples):
+    """Encode float samples as 16-bit little-endian PCM, clipping overs"""
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype('<i2').tobytes()
+
+def match_channels(samples, channels):
+    """Up- or down-mix samples to a channel count"""
+    if samples.shape[1] == channels:
+        return samples
+    mono = samples.mean(axis=1, keepdims=True)
+    return np.repeat(mono, channels, axis=1)
+
+def resample(samples, from_rate, to_rate, block=65536):
+    """Linear-interpolation resampling, computed block by block to bound temporaries"""
+    if from_rate == to_rate or len(samples) == 0:
+        return samples
+    length = int(round(len(samples) * to_rate / from_rate))
+    step = from_rate / to_rate
+    resampled = np.empty((length, samples.shape[1]), dtype=np.float32)
+
+    for start in range(0, length, block):
+        positions = np.arange(start, min(start + block, length)) * step
+        left = np.minimum(positions.astype(np.int64), len(samples) - 1)
+        right = np.minimum(left + 1, len(samples) - 1)
+        fraction = (positions - left).astype(np.float32)[:, None]
+        resampled[start:start + len(positions)] = samples[left] * (1.0 - fraction) + samples[right] * fraction
+
+    return resampled
+
+def load_music_loop(path, rate, channels, crossfade):
+    """
+    Load a music track as a seamless loop in the narration's format
+
+    The last ``crossfade`` seconds are blended into the start, so playing
+    the loop end to start has no click or jump.
+
+    Returns:
+        ndarray: float32 samples, shaped (frames, channels)
+    """
+    block = MUSIC_CONFIG['block_frames']
+    with wave.open(path, 'rb') as track:
+        samples = np.empty((track.getnframes(), channels), dtype=np.float32)
+        filled = 0
+        while True:
+            raw = track.readframes(block)
+            if not raw:
+                break
+            part = match_channels(pcm_to_float(raw, track.getsampwidth(), track.getnchannels()), channels)
+            samples[filled:filled + len(part)] = part
+            filled += len(part)
+        samples = resample(samples[:filled], track.getframerate(), rate)
+    if len(samples) == 0:
+        raise ValueError(f"{path} has no audio")
+
+    overlap = min(int(crossfade * rate), len(samples) // 2)
+    if overlap == 0:
+        return samples
+    fade = np.linspace(0.0, 1.0, overlap, dtype=np.float32)[:, None]
+    samples[:overlap] = samples[:overlap] * fade + samples[-overlap:] * (1.0 - fade)
+    return samples[:-overlap]
+
+def synthesize_music_bed(out_file, name, drone, notes, note_seconds, seconds=None, rate=None):
+    """
+    Write a simple, loopable music bed: a slowly breathing drone with an
+    optional plucked melody over it
+
+    Used in place of a music track that isn't installed. The melody is
+    picked from ``notes`` with a generator seeded by ``name``, so the same
+    bed is produced every time.
+
+    Args:
+        out_file (str): WAV file to write (mono, 16-bit)
+        name (str): Music type, seeds the melody
+        drone (list): Drone pitches in Hz
+        notes (list): Melody pitches in Hz; empty for a drone only
+        note_seconds (float): Length of each melody note
+        seconds (float): Length of the bed; defaults to MUSIC_CONFIG
+        rate (int): Sample rate; defaults to MUSIC_CONFIG
+
+    Returns:
+        str: out_file
+    """
+    seconds = MUSIC_CONFIG['bed_seconds'] if seconds is None else seconds
+    rate = MUSIC_CONFIG['bed_rate'] if rate is None else rate
+    frames = int(seconds * rate)
+    t = np.arange(frames) / rate
+
+    # Each drone voice swells at its own slow rate, completing whole cycles so the bed loops
+    bed = np.zeros(frames)
+    for i, pitch in enumerate(drone):
+        swell = 0.6 + 0.4 * np.sin(2 * np.pi * (i + 1) * t / seconds + i)
+        bed += swell * (np.sin(2 * np.pi * pitch * t) + 0.3 * np.sin(4 * np.pi * pitch * t)) / len(drone)
+
+    if notes and note_seconds:
+        rng = np.random.default_rng(zlib.crc32(name.encode('utf-8')))
+        length = int(note_seconds * rate)
+        tn = np.arange(length) / rate
+        envelope = np.exp(-4.0 * tn / note_seconds) * np.minimum(1.0, tn / 0.01)
+        for start in range(0, frames - length + 1, length):
+            pitch = notes[rng.integers(len(notes))]
+            note = sum(np.sin(2 * np.pi * pitch * k * tn) / k ** 2 for k in range(1, 5))
+            bed[start:start + length] += 0.5 * envelope * note
+
+    bed *= 0.5 / max(float(np.abs(bed).max()), 1e-9)
+
+    os.makedirs(os.path.dirname(out_file) or '.', exist_ok=True)
+    temp_file = f"{out_file}.{os.getpid()}.tmp"
+    with wave.open(temp_file, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(float_to_pcm16(bed.astype(np.float32)))
+    os.replace(temp_file, out_file)
+    return out_file
+
+class Ducker:
+    """
+    Sidechain gain for music under a narration
+
+    The narration level is measured in 10 ms windows; the gain moves
+    toward duck_gain while it is above the threshold and back to 1 in
+    between, with separate attack and release times. State carries across
+    blocks, so the narration can be processed in any block size.
+    """
+
+    def __init__(self, rate):
+        self.window = max(1, int(rate * 0.01))
+        self.threshold = 10 ** (MUSIC_CONFIG['duck_threshold_db'] / 20.0)
+        self.duck_gain = MUSIC_CONFIG['duck_gain']
+        self.attack = math.exp(-self.window / (MUSIC_CONFIG['attack'] * rate))
+        self.release = math.exp(-self.window / (MUSIC_CONFIG['release'] * rate))
+        self.gain = 1.0
+
+    def gains(self, speech):
+        """Per-frame music gain for a block of narration"""
+        frames = len(speech)
+        windows = -(-frames // self.window)
+        padded = np.zeros((windows * self.window, speech.shape[1]), dtype=np.float32)
+        padded[:frames] = speech
+        rms = np.sqrt((padded.reshape(windows, -1) ** 2).mean(axis=1))
+        targets = np.where(rms > self.threshold, self.duck_gain, 1.0)
+
+        # One-pole smoothing is a recurrence, but only one step per window
+        smoothed = np.empty(windows)
+        gain = self.gain
+        for i, target in enumerate(targets):
+            coefficient = self.attack if target < gain else self.release
+            gain = target + coefficient * (gain - target)
+            smoothed[i] = gain
+
+        # Interpolate between window ends, starting from the previous block's gain
+        ends = (np.arange(windows) + 1) * self.window - 1
+        per_frame = np.interp(np.arange(frames), np.concatenate([[-1], ends]),
+                              np.concatenate([[self.gain], smoothed]))
+        self.gain = gain
+        return per_frame.astype(np.float32)
+
+def mix_with_music(narration_file, music_file, out_file, music_volume=None):
+    """
+    Mix a looping music bed under a narration
+
+    The narration is read, mixed and written block by block, so memory use
+    stays constant however long it is; only the music loop is held in
+    memory. The music is resampled and re-channeled to the narration's
+    format, crossfaded at its loop point, ducked under speech, faded in at
+    the start and faded out over a short tail after the narration ends.
+
+    Args:
+        narration_file (str): Narration WAV
+        music_file (str): Music WAV, any rate or channel count
+        out_file (str): 16-bit WAV to write
+        music_volume (float): Music level; defaults to MUSIC_CONFIG
+
+    Returns:
+        float: Duration of the mix in seconds
+    """
+    volume = MUSIC_CONFIG['music_volume'] if music_volume is None else music_volume
+    block = MUSIC_CONFIG['block_frames']
+
+    with wave.open(narration_file, 'rb') as voice, wave.open(out_file, 'wb') as out:
+        channels, sample_width, rate = voice.getnchannels(), voice.getsampwidth(), voice.getframerate()
+        out.setnchannels(channels)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+
+        loop = load_music_loop(music_file, rate, channels, MUSIC_CONFIG['crossfade'])
+        fade = max(1, int(MUSIC_CONFIG['crossfade'] * rate))
+        ducker = Ducker(rate)
+        position = 0
+
+        def music_block(frames):
+            indices = (position + np.arange(frames)) % len(loop)
+            return loop[indices]
+
+        while True:
+            raw = voice.readframes(block)
+            if not raw:
+                break
+            speech = pcm_to_float(raw, sample_width, channels)
+            frames = len(speech)
+
+            gain = ducker.gains(speech) * volume
+            gain *= np.minimum(1.0, (position + np.arange(frames)) / fade)  # fade in
+            out.writeframes(float_to_pcm16(speech + music_block(frames) * gain[:, None]))
+            position += frames
+
+        # Let the music ring out after the last word
+        tail = int(MUSIC_CONFIG['tail'] * rate)
+        if tail:
+            ramp = np.linspace(1.0, 0.0, tail, dtype=np.float32)
+            gain = ducker.gains(np.zeros((tail, channels), dtype=np.float32)) * volume * ramp
+            gain *= np.minimum(1.0, (position + np.arange(tail)) / fade)
+            out.writeframes(float_to_pcm16(music_block(tail) * gain[:, None]))
+            position += tail
+
+    return position / rate
+
+def k_weighting_power(rate, length):
+    """
+    Power response of the BS.1770 K-weighting filter at the rfft bins of a
+    ``length``-sample segment, with the rfft's one-sided bins doubled
+
+    Both stages (a +4 dB shelf for the head, a 38 Hz high-pass) are
+    designed for the given sample rate; at 48 kHz they reproduce the
+    standard's coefficients.
+    """
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(length, 1.0 / rate) / rate)
+
+    def biquad(b, a):
+        return (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+
+    # Shelf
+    k = math.tan(math.pi * 1681.974450955533 / rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    shelf = biquad((vh + vb * k / q + k * k, 2 * (k * k - vh), vh - vb * k / q + k * k),
+                   (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k))
+
+    # High-pass
+    k = math.tan(math.pi * 38.13547087602444 / rate)
+    q = 0.5003270373238773
+    high_pass = biquad((1, -2, 1), (1 + k / q + k * k, 2 * (k * k - 1), 1 - k / q + k * k))
+
+    power = np.abs(shelf * high_pass) ** 2
+    power[1:(length + 1) // 2] *= 2  # energy of the negative frequencies rfft leaves out
+    return power
+
+class LoudnessMeter:
+    """
+    Integrated loudness in LUFS (ITU-R BS.1770-4), measured block by block
+
+    Each 100 ms step is K-weighted in the frequency domain; by Parseval's
+    theorem its weighted spectrum gives its mean square directly, with no
+    filter state to carry between blocks. Only one number per step is
+    kept (36,000 for an hour), so any length of audio can be measured.
+    """
+
+    def __init__(self, rate, channels):
+        self.step = max(1, int(round(rate * 0.1)))
+        self.weights = k_weighting_power(rate, self.step)
+        self.pending = np.zeros((0, channels), dtype=np.float32)
+        self.powers = []
+        self.mean_squares = []
+        self.peak = 0.0
+
+    def add(self, samples):
+        """Measure a block of float samples shaped (frames, channels)"""
+        if len(samples):
+            self.peak = max(self.peak, float(np.abs(samples).max()))
+        data = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        steps = len(data) // self.step
+        if steps:
+            segments = data[:steps * self.step].reshape(steps, self.step, -1)
+            spectrum = np.abs(np.fft.rfft(segments, axis=1)) ** 2
+            # Mean square per step, summed over channels (all weighted 1.0)
+            self.powers.append((spectrum * self.weights[None, :, None]).sum(axis=(1, 2)) / self.step ** 2)
+            # Unweighted mean square per channel, the measure SilenceCondenser uses
+            self.mean_squares.append((segments ** 2).mean(axis=(1, 2)))
+        self.pending = data[steps * self.step:].copy()
+
+    def integrated(self):
+        """
+        Gated loudness of everything measured so far
+
+        Returns:
+            float: LUFS, or None if it was all below the -70 LUFS absolute gate
+        """
+        powers = np.concatenate(self.powers) if self.powers else np.zeros(0)
+        if len(powers) == 0:
+            return None
+        # 400 ms gating blocks overlapping by 75%
+        if len(powers) >= 4:
+            blocks = np.convolve(powers, np.full(4, 0.25), mode='valid')
+        else:
+            blocks = np.array([powers.mean()])
+        loudness = -0.691 + 10 * np.log10(np.maximum(blocks, 1e-20))
+
+        audible = loudness > -70
+        if not audible.any():
+            return None
+        relative_gate = -0.691 + 10 * math.log10(blocks[audible].mean()) - 10
+        gated = blocks[audible & (loudness > relative_gate)]
+        return -0.691 + 10 * math.log10(gated.mean())
+
+    def noise_floor(self, fraction=0.1):
+        """
+        Level of the quietest 100 ms steps, e.g. room tone between phrases
+
+        Measured as SilenceCondenser measures its windows: unweighted mean
+        square per channel, not K-weighted loudness.
+
+        Returns:
+            float: dBFS, or None if nothing has been measured
+        """
+        if not self.mean_squares:
+            return None
+        return 10 * math.log10(max(float(np.quantile(np.concatenate(self.mean_squares), fraction)), 1e-20))
+
+    def speech_level(self):
+        """
+        Level of the steps that pass integrated()'s gates, i.e. the speech,
+        on the same unweighted scale as noise_floor()
+
+        Returns:
+            float: dBFS, or None if it was all below the absolute gate
+        """
+        if not self.powers:
+            return None
+        powers = np.concatenate(self.powers)
+        loudness = -0.691 + 10 * np.log10(np.maximum(powers, 1e-20))
+        audible = loudness > -70
+        if not audible.any():
+            return None
+        relative_gate = -0.691 + 10 * math.log10(powers[audible].mean()) - 10
+        speech = np.concatenate(self.mean_squares)[audible & (loudness > relative_gate)]
+        return 10 * math.log10(max(float(speech.mean()), 1e-20))
+
+class SilenceCondenser:
+    """
+    Shorten long pauses in a stream of audio
+
+    Pauses up to max_silence seconds are left alone. Longer ones are cut
+    to keep_silence, keeping its first and last halves with short fades at
+    the cut. Trailing silence, and leading silence longer than max_silence,
+    is cut to half of keep_silence.
+    Silence is held back only until it is known whether to cut it, so at
+    most max_silence seconds are ever buffered.
+    """
+
+    def __init__(self, rate, channels, threshold, max_silence, keep_silence, fade):
+        """
+        Args:
+            threshold (float): Mean square per channel below which a 10 ms
+                window counts as silence
+            max_silence (float): Longest pause left as it is, in seconds
+            keep_silence (float): What longer pauses are cut to, in seconds
+            fade (float): Fade at each cut, in seconds
+        """
+        self.window = max(1, int(rate * 0.01))
+        self.threshold = threshold
+        self.max_frames = int(max_silence * rate)
+        self.half_frames = int(keep_silence * rate / 2)
+        self.fade = max(1, int(fade * rate))
+        self.pending = np.zeros((0, channels), dtype=np.float32)
+        self.held = np.zeros((0, channels), dtype=np.float32)
+        self.cutting = False
+        self.started = False
+
+    def _faded(self, samples, fade_in):
+        samples = samples.copy()
+        n = min(self.fade, len(samples))
+        ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)[:, None]
+        if fade_in:
+            samples[:n] *= ramp
+        else:
+            samples[len(samples) - n:] *= ramp[::-1]
+        return samples
+
+    def _silence(self, samples, out):
+        self.held = np.concatenate([self.held, samples])
+        if not self.cutting and len(self.held) > self.max_frames:
+            self.cutting = True
+            if self.started:
+                out.append(self._faded(self.held[:self.half_frames], fade_in=False))
+        if self.cutting and len(self.held) > self.half_frames:
+            self.held = self.held[len(self.held) - self.half_frames:]
+
+    def _speech(self, samples, out):
+        if len(self.held):
+            out.append(self._faded(self.held, fade_in=True) if self.cutting else self.held)
+            self.held = self.held[:0]
+            self.cutting = False
+        out.append(samples)
+        self.started = True
+
+    def _runs(self, data, out):
+        windows = len(data) // self.window
+        if not windows:
+            return
+        power = (data[:windows * self.window].reshape(windows, self.window, -1) ** 2).mean(axis=(1, 2))
+        silent = power < self.threshold
+        # Handle each run of speech or silence in one go
+        edges = np.flatnonzero(np.diff(silent.astype(np.int8))) + 1
+        starts = np.concatenate([[0], edges])
+        ends = np.concatenate([edges, [windows]])
+        for start, end in zip(starts, ends):
+            run = data[start * self.window:end * self.window]
+            if silent[start]:
+                self._silence(run, out)
+            else:
+                self._speech(run, out)
+
+    def process(self, samples):
+        """
+        Condense a block
+
+        Returns:
+            ndarray: Audio ready to write (possibly empty)
+        """
+        data = np.concatenate([self.pending, samples]) if len(self.pending) else samples
+        whole = len(data) // self.window * self.window
+        out = []
+        self._runs(data[:whole], out)
+        self.pending = data[whole:].copy()
+        return np.concatenate(out) if out else data[:0]
+
+    def flush(self):
+        """The audio still held back at the end of the stream"""
+        out = []
+        if len(self.pending):
+            power = float((self.pending ** 2).mean())
+            (self._silence if power < self.threshold else self._speech)(self.pending, out)
+            self.pending = self.pending[:0]
+        # Trailing silence; if it is being cut, its first half is already out
+        if len(self.held) and self.started and not self.cutting:
+            out.append(self._faded(self.held[:self.half_frames], fade_in=False))
+        self.held = self.held[:0]
+        return np.concatenate(out) if out else self.held
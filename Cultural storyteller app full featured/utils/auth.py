@@ -1,5 +1,69 @@
+import json
 import streamlit as st
-from utils.database import get_user_by_username
+from streamlit_js_eval import streamlit_js_eval
+from utils.config import SESSION_CONFIG
+from utils.database import get_user_by_username, get_user_by_id
+from utils.sessions import create_session, load_session, refresh_session, destroy_session
+
+# Order defines each permission's bit in the session permission bitset
+PERMISSION_NAMES = [
+    'can_create_stories',
+    'can_upload_content',
+    'can_host_calls',
+    'can_use_avatars',
+    'can_comment',
+    'can_like',
+    'can_follow',
+    'can_create_rooms',
+    'can_access_analytics'
+]
+
+USER_TYPE_PERMISSIONS = {
+    'storyteller': {
+        'can_create_stories': True,
+        'can_upload_content': True,
+        'can_host_calls': True,
+        'can_use_avatars': True,
+        'can_comment': True,
+        'can_like': True,
+        'can_follow': True,
+        'can_create_rooms': True,
+        'can_access_analytics': True
+    },
+    'audience': {
+        'can_create_stories': False,
+        'can_upload_content': False,
+        'can_host_calls': False,
+        'can_use_avatars': True,
+        'can_comment': True,
+        'can_like': True,
+        'can_follow': True,
+        'can_create_rooms': False,
+        'can_access_analytics': False
+    },
+    'guest': {
+        'can_create_stories': False,
+        'can_upload_content': False,
+        'can_host_calls': False,
+        'can_use_avatars': False,
+        'can_comment': False,
+        'can_like': False,
+        'can_follow': False,
+        'can_create_rooms': False,
+        'can_access_analytics': False
+    }
+}
+
+_PERMISSION_INDEX = {name: i for i, name in enumerate(PERMISSION_NAMES)}
+
+_PERMISSION_BITS = {
+    user_type: sum(1 << i for i, name in enumerate(PERMISSION_NAMES) if permissions[name])
+    for user_type, permissions in USER_TYPE_PERMISSIONS.items()
+}
+
+def get_permission_bits(user_type):
+    """Get the permission bitset for a user type"""
+    return _PERMISSION_BITS.get(user_type, _PERMISSION_BITS['guest'])
 
 def check_authentication():
     """Check if user is authenticated"""
@@ -9,11 +73,120 @@ def get_current_user():
     """Get current logged in user"""
     return st.session_state.get('current_user', None)
 
+def _apply_session(user, permission_bits):
+    """Populate st.session_state from a session's user record"""
+    st.session_state.authenticated = True
+    st.session_state.user_type = user['user_type']
+    st.session_state.current_user = user
+    st.session_state.permission_bits = permission_bits
+
+def _read_stored_token():
+    """
+    The token an earlier login saved in the browser's localStorage
+
+    Returns:
+        str: The token, '' if none is stored, or None until the browser
+            has answered (the component reruns the script when it does)
+    """
+    name = json.dumps(SESSION_CONFIG['storage_key'])
+    return streamlit_js_eval(js_expressions=f"localStorage.getItem({name}) || ''", key='session_token_read')
+
+def _store_token(token):
+    """Save the token in the browser, or remove it if token is empty, on the next rerun"""
+    st.session_state.stored_token_pending = token or ''
+    st.session_state.stored_token_writes = st.session_state.get('stored_token_writes', 0) + 1
+
+def _sync_stored_token():
+    """Apply a pending _store_token; logins and logouts rerun before a component can render"""
+    pending = st.session_state.get('stored_token_pending')
+    if pending is None:
+        return
+
+    name = json.dumps(SESSION_CONFIG['storage_key'])
+    if pending:
+        script = f"localStorage.setItem({name}, {json.dumps(pending)}) || 'stored'"
+    else:
+        script = f"localStorage.removeItem({name}) || 'removed'"
+    if streamlit_js_eval(js_expressions=script, key=f"session_token_write_{st.session_state.stored_token_writes}"):
+        st.session_state.stored_token_pending = None
+
+def login_user(username):
+    """
+    Start a server-side session for a verified user
+
+    The signed token is kept in st.session_state and the browser's
+    localStorage, so the login survives page reloads and server restarts.
+    It never goes in the URL, where it would leak through browser history,
+    shared links and Referer headers.
+    """
+    user = get_user_by_username(username)
+    permission_bits = get_permission_bits(user['user_type'])
+    token = create_session(user, permission_bits)
+
+    st.session_state.session_token = token
+    _store_token(token)
+    _apply_session(user, permission_bits)
+
+def restore_session():
+    """
+    Sync st.session_state with the server-side session on each rerun
+
+    A new Streamlit session (a reload, a new tab, a server restart) picks
+    up the token saved in localStorage; that takes one extra rerun while
+    the browser answers. Served from the in-memory LRU; the user record is
+    only re-read from the database after it has been invalidated.
+
+    Returns:
+        bool: True if a valid session is active
+    """
+    _sync_stored_token()
+    token = st.session_state.get('session_token')
+    if not token and not st.session_state.get('stored_token_checked'):
+        token = _read_stored_token()
+        if token is None:
+            return False
+        st.session_state.stored_token_checked = True
+    if not token:
+        return False
+
+    session = load_session(token)
+    if session is None:
+        # Expired or revoked: drop the stale login, in the browser too
+        _store_token(None)
+        st.session_state.session_token = None
+        st.session_state.authenticated = False
+        st.session_state.current_user = None
+        st.session_state.permission_bits = None
+        return False
+
+    user = session['user']
+    if user is None:
+        user = get_user_by_id(session['user_id'])
+        if user is None:
+            destroy_session(token)
+            _store_token(None)
+            st.session_state.session_token = None
+            return False
+        refresh_session(token, user, get_permission_bits(user['user_type']))
+        session = load_session(token) or session
+
+    st.session_state.session_token = token
+    if st.session_state.get('current_user') is not session['user'] or not check_authentication():
+        _apply_session(session['user'], session['permission_bits'])
+    return True
+
 def logout():
     """Logout current user"""
+    token = st.session_state.get('session_token')
+    if token:
+        destroy_session(token)
+    _store_token(None)
+
     st.session_state.authenticated = False
     st.session_state.user_type = None
     st.session_state.current_user = None
+    st.session_state.session_token = None
+    st.session_state.permission_bits = None
     st.rerun()
 
 def require_auth(user_types=None):
@@ -46,49 +219,21 @@ def is_guest():
     """Check if current user is a guest"""
     return st.session_state.get('user_type') == 'guest'
 
+def _current_permission_bits():
+    """Permission bitset from the session, falling back to the user type"""
+    bits = st.session_state.get('permission_bits')
+    if bits is None:
+        bits = get_permission_bits(st.session_state.get('user_type') or 'guest')
+    return bits
+
 def get_user_permissions():
     """Get current user permissions"""
-    user_type = st.session_state.get('user_type', 'guest')
-    
-    permissions = {
-        'storyteller': {
-            'can_create_stories': True,
-            'can_upload_content': True,
-            'can_host_calls': True,
-            'can_use_avatars': True,
-            'can_comment': True,
-            'can_like': True,
-            'can_follow': True,
-            'can_create_rooms': True,
-            'can_access_analytics': True
-        },
-        'audience': {
-            'can_create_stories': False,
-            'can_upload_content': False,
-            'can_host_calls': False,
-            'can_use_avatars': True,
-            'can_comment': True,
-            'can_like': True,
-            'can_follow': True,
-            'can_create_rooms': False,
-            'can_access_analytics': False
-        },
-        'guest': {
-            'can_create_stories': False,
-            'can_upload_content': False,
-            'can_host_calls': False,
-            'can_use_avatars': False,
-            'can_comment': False,
-            'can_like': False,
-            'can_follow': False,
-            'can_create_rooms': False,
-            'can_access_analytics': False
-        }
-    }
-    
-    return permissions.get(user_type, permissions['guest'])
+    bits = _current_permission_bits()
+    return {name: bool(bits >> i & 1) for i, name in enumerate(PERMISSION_NAMES)}
 
 def check_permission(permission_name):
     """Check if current user has specific permission"""
-    permissions = get_user_permissions()
-    return permissions.get(permission_name, False)
\ No newline at end of file
+    index = _PERMISSION_INDEX.get(permission_name)
+    if index is None:
+        return False
+    return bool(_current_permission_bits() >> index & 1)
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import random
+import asyncio
+from utils.config import BATCH_GENERATION_CONFIG
+from utils.ai_cache import make_cache_key
+from utils.ai_providers import ProviderError, get_provider
+from utils.ai_content import generate_story_content
+
+STORY_FIELDS = ('prompt', 'story_type', 'length', 'style', 'cultural_context')
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (int): Maximum burst size
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Hold back every caller, e.g. after the server sent Retry-After"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+def backoff_delay(attempt, base=None, maximum=None):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    base = BATCH_GENERATION_CONFIG['backoff_base'] if base is None else base
+    maximum = BATCH_GENERATION_CONFIG['backoff_max'] if maximum is None else maximum
+    return random.uniform(0, min(maximum, base * (2 ** attempt)))
+
+def _item_key(request, backend_id):
+    """Progress key of one item: the story fields and the backend (provider and model) that wrote it"""
+    item = {field: request.get(field, '') for field in STORY_FIELDS}
+    item['backend'] = backend_id
+    return make_cache_key('batch_item', item)
+
+def _progress_path(job_id):
+    return os.path.join(BATCH_GENERATION_CONFIG['progress_dir'], f"{job_id}.jsonl")
+
+def load_batch_progress(job_id):
+    """
+    Load the finished items of a batch job
+
+    Returns:
+        dict: Item key -> result dict for every item already completed
+    """
+    path = _progress_path(job_id)
+    done = {}
+    if not os.path.exists(path):
+        return done
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn last line from an interrupted run
+            done[record['key']] = record
+    return done
+
+async def _generate_one(request, provider, bucket, semaphore, max_retries, fresh):
+    """
+    Generate one story, retrying rate limits and server errors
+
+    The concurrency slot is only held while a request is in flight, not
+    through the backoff sleep, so other items use it meanwhile.
+    """
+    attempts = 0
+    while True:
+        async with semaphore:
+            await bucket.acquire()
+            attempts += 1
+            try:
+                story = await asyncio.to_thread(
+                    generate_story_content,
+                    request['prompt'],
+                    **{field: request[field] for field in STORY_FIELDS[1:] if field in request},
+                    fresh=fresh, provider=provider, fallback=False
+                )
+                return {'status': 'ok', 'story': story, 'error': None, 'attempts': attempts}
+
+            except ProviderError as e:
+                if not e.retryable or attempts > max_retries:
+                    return {'status': 'failed', 'story': None, 'error': str(e), 'attempts': attempts}
+                delay = backoff_delay(attempts - 1)
+                if e.retry_after:
+                    bucket.pause(e.retry_after)
+                    delay = max(delay, e.retry_after)
+
+            except Exception as e:
+                return {'status': 'failed', 'story': None, 'error': str(e), 'attempts': attempts}
+
+        await asyncio.sleep(delay)
+
+async def generate_story_batch_async(story_requests, job_id=None, provider=None, fresh=False,
+                                     progress_callback=None, requests_per_minute=None,
+                                     max_concurrency=None, max_retries=None):
+    """
+    Generate many stories concurrently under a shared rate limit
+
+    Finished items are appended to a progress file as they complete, so
+    running the same job again with the same provider only generates what
+    is still missing.
+
+    Args:
+        story_requests (list): Dicts with 'prompt' and optionally story_type,
+            length, style and cultural_context
+        job_id (str): Progress file name; derived from the requests if omitted
+        provider (str): AI provider name; defaults to AI_PROVIDER_CONFIG['provider']
+        fresh (bool): Bypass the generation cache and regenerate items
+            already in the progress file
+        progress_callback (callable): Called as (completed, total, result)
+        requests_per_minute (float): Override the configured rate limit
+        max_concurrency (int): Override the configured concurrency
+        max_retries (int): Override the configured retry count
+
+    Returns:
+        list: One result dict per request, in order, with index, request,
+            status ('ok' or 'failed'), story, error and attempts
+    """
+    config = BATCH_GENERATION_CONFIG
+    rate = (requests_per_minute or config['requests_per_minute']) / 60.0
+    max_retries = config['max_retries'] if max_retries is None else max_retries
+    job_id = job_id or make_cache_key('batch_job', story_requests)[:16]
+    backend_id = get_provider(provider).cache_id
+
+    done = {} if fresh else load_batch_progress(job_id)
+    results = [None] * len(story_requests)
+    pending = []
+    for index, request in enumerate(story_requests):
+        record = done.get(_item_key(request, backend_id))
+        if record and record['status'] == 'ok':
+            results[index] = dict(record, index=index, request=request)
+        else:
+            pending.append(index)
+
+    total = len(story_requests)
+    completed = total - len(pending)
+    if not pending:
+        return results
+
+    bucket = TokenBucket(rate, config['burst'])
+    semaphore = asyncio.Semaphore(max_concurrency or config['max_concurrency'])
+
+    os.makedirs(config['progress_dir'], exist_ok=True)
+    with open(_progress_path(job_id), 'a', encoding='utf-8') as progress:
+
+        async def run(index):
+            request = story_requests[index]
+            result = await _generate_one(request, provider, bucket, semaphore, max_retries, fresh)
+            return index, dict(result, key=_item_key(request, backend_id))
+
+        for finished in asyncio.as_completed([run(index) for index in pending]):
+            index, record = await finished
+            progress.write(json.dumps(record, ensure_ascii=False) + '\n')
+            progress.flush()
+
+            results[index] = dict(record, index=index, request=story_requests[index])
+            completed += 1
+            if progress_callback:
+                progress_callback(completed, total, results[index])
+
+    return results
+
+def generate_story_batch(story_requests, **kwargs):
+    """
+    Blocking wrapper around generate_story_batch_async
+
+    Accepts the same arguments and returns the same per-item results.
+    """
+    return asyncio.run(generate_story_batch_async(story_requests, **kwargs))
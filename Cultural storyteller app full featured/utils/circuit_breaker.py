@@ -0,0 +1,285 @@
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from utils.config import CIRCUIT_BREAKER_CONFIG
+from utils.ai_providers import ProviderError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitOpenError(ProviderError):
+    """Raised without calling the provider while its breaker is open"""
+
+class DeadlineExceeded(ProviderError):
+    """A provider call ran past its latency budget"""
+
+class CircuitBreaker:
+    """
+    Sliding-window circuit breaker for one provider
+
+    The breaker opens when, over the last ``window_size`` calls (and at
+    least ``min_calls``), the failure rate or the rate of calls slower than
+    ``slow_call_duration`` reaches its threshold. After ``open_duration``
+    seconds it lets ``half_open_max_calls`` probe calls through; their
+    success closes it again, any failure reopens it.
+
+    Every state change starts a new generation. allow() hands out the
+    current one and record() ignores outcomes from an earlier generation,
+    so a slow call that started before the breaker opened can't close it
+    or count against it afterwards.
+    """
+
+    def __init__(self, name, window_size=20, min_calls=5, failure_rate_threshold=0.5,
+                 slow_call_duration=20.0, slow_call_rate_threshold=0.8, open_duration=30.0,
+                 half_open_max_calls=1):
+        self.name = name
+        self.window_size = window_size
+        self.min_calls = min_calls
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._outcomes = deque(maxlen=window_size)  # (failed, slow) per call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._rejected = 0
+        self._last_error = None
+        self._generation = 0
+
+    def _transition(self, state, now):
+        self._state = state
+        self._probes = 0
+        self._generation += 1
+        if state == OPEN:
+            self._opened_at = now
+        else:
+            self._outcomes.clear()
+
+    def allow(self):
+        """
+        Reserve permission for one call
+
+        Returns:
+            int: Generation to pass to record() with the call's outcome
+
+        Raises:
+            CircuitOpenError: While open, or when half-open probes are in use
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN and now - self._opened_at >= self.open_duration:
+                self._transition(HALF_OPEN, now)
+
+            if self._state == CLOSED:
+                return self._generation
+            if self._state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return self._generation
+
+            self._rejected += 1
+            retry_after = max(0.0, self.open_duration - (now - self._opened_at))
+            raise CircuitOpenError(f"{self.name} circuit is open: {self._last_error}",
+                                   status=503, retry_after=retry_after or None)
+
+    def record(self, duration, error=None, generation=None):
+        """
+        Record the outcome of a call made after allow()
+
+        Args:
+            duration (float): Seconds the call took
+            error (Exception): Why it failed, or None on success
+            generation (int): From allow(); outcomes from an earlier
+                generation are ignored. None always records.
+        """
+        now = time.monotonic()
+        failed = error is not None
+        slow = duration >= self.slow_call_duration
+
+        with self._lock:
+            if failed:
+                self._last_error = str(error)
+            if generation is not None and generation != self._generation:
+                return
+
+            if self._state == HALF_OPEN:
+                self._transition(OPEN if failed or slow else CLOSED, now)
+                return
+            if self._state == OPEN:
+                return
+
+            self._outcomes.append((failed, slow))
+            calls = len(self._outcomes)
+            if calls < self.min_calls:
+                return
+
+            failure_rate = sum(f for f, _ in self._outcomes) / calls
+            slow_rate = sum(s for _, s in self._outcomes) / calls
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_call_rate_threshold:
+                self._transition(OPEN, now)
+
+    def snapshot(self):
+        """Current state and window statistics, for dashboards"""
+        now = time.monotonic()
+        with self._lock:
+            calls = len(self._outcomes)
+            state = self._state
+            if state == OPEN and now - self._opened_at >= self.open_duration:
+                state = HALF_OPEN  # Takes effect on the next call
+            return {
+                'state': state,
+                'calls_in_window': calls,
+                'failure_rate': sum(f for f, _ in self._outcomes) / calls if calls else 0.0,
+                'slow_call_rate': sum(s for _, s in self._outcomes) / calls if calls else 0.0,
+                'open_for': now - self._opened_at if self._state == OPEN else 0.0,
+                'generation': self._generation,
+                'rejected': self._rejected,
+                'last_error': self._last_error
+            }
+
+    def reset(self):
+        """Force the breaker closed"""
+        with self._lock:
+            self._transition(CLOSED, time.monotonic())
+            self._last_error = None
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+# Calls run here so a caller can give up at its deadline while a hung
+# upstream request finishes (or times out) in the background
+_executor = ThreadPoolExecutor(max_workers=CIRCUIT_BREAKER_CONFIG['max_workers'],
+                               thread_name_prefix='ai-call')
+
+def get_breaker(name):
+    """Get the shared breaker for a provider, creating it on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            settings = dict(CIRCUIT_BREAKER_CONFIG['breaker'])
+            settings.update(CIRCUIT_BREAKER_CONFIG['overrides'].get(name, {}))
+            breaker = CircuitBreaker(name, **settings)
+            _breakers[name] = breaker
+        return breaker
+
+def get_breaker_states():
+    """
+    Get every provider breaker's state
+
+    Returns:
+        dict: Provider name -> snapshot dict (state, failure_rate, ...)
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+def _health_error(error):
+    """The error to record against a breaker; rejected requests (HTTP 4xx other than 429) say nothing about upstream health"""
+    return error if not isinstance(error, ProviderError) or error.retryable else None
+
+def _run(breaker, generation, func, deadline, *args, **kwargs):
+    """
+    Run ``func`` on the executor within ``deadline``, recording a failure
+
+    Success is left to the caller to record.
+
+    Returns:
+        tuple: (result, seconds taken)
+    """
+    start = time.monotonic()
+    future = _executor.submit(func, *args, **kwargs)
+
+    try:
+        return future.result(timeout=deadline), time.monotonic() - start
+    except FutureTimeout:
+        future.cancel()
+        error = DeadlineExceeded(f"{breaker.name} call exceeded {deadline:g}s deadline", status=504)
+        breaker.record(time.monotonic() - start, error, generation)
+        raise error from None
+    except Exception as e:
+        breaker.record(time.monotonic() - start, _health_error(e), generation)
+        raise
+
+def call_with_deadline(breaker, func, deadline, *args, **kwargs):
+    """
+    Call ``func`` through a breaker, giving up after ``deadline`` seconds
+
+    Raises:
+        CircuitOpenError: The breaker rejected the call
+        DeadlineExceeded: The call did not finish in time
+    """
+    generation = breaker.allow()
+    result, duration = _run(breaker, generation, func, deadline, *args, **kwargs)
+    breaker.record(duration, generation=generation)
+    return result
+
+def guard_stream(breaker, fragments, first_fragment_deadline):
+    """
+    Pass a fragment stream through a breaker
+
+    Only the wait for the first fragment is bounded by a deadline; after
+    that the provider's own read timeout applies between fragments. The
+    stream counts as one call, recorded once: failed if it breaks off
+    part-way, otherwise successful with the first fragment's latency,
+    including when the consumer stops reading early.
+    """
+    generation = breaker.allow()
+    iterator = iter(fragments)
+    first, latency = _run(breaker, generation, next, first_fragment_deadline, iterator, None)
+
+    error = None
+    try:
+        if first is not None:
+            yield first
+            yield from iterator
+    except Exception as e:
+        error = _health_error(e)
+        raise
+    finally:
+        breaker.record(latency, error, generation)
+
+class GuardedProvider:
+    """
+    Wrap an AIProvider so every call goes through its breaker and deadline
+
+    Deadlines per operation come from CIRCUIT_BREAKER_CONFIG['deadlines'].
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.breaker = get_breaker(provider.name)
+        self.deadlines = CIRCUIT_BREAKER_CONFIG['deadlines']
+
+    @property
+    def name(self):
+        return self.provider.name
+
+    @property
+    def cache_id(self):
+        return self.provider.cache_id
+
+    def _call(self, operation, *args):
+        return call_with_deadline(self.breaker, getattr(self.provider, operation),
+                                  self.deadlines.get(operation), *args)
+
+    def generate_story(self, prompt, story_type, length, style, cultural_context):
+        return self._call('generate_story', prompt, story_type, length, style, cultural_context)
+
+    def stream_story(self, prompt, story_type, length, style, cultural_context):
+        return guard_stream(self.breaker,
+                            self.provider.stream_story(prompt, story_type, length, style, cultural_context),
+                            self.deadlines.get('stream_story'))
+
+    def generate_images(self, prompt, num_images):
+        return self._call('generate_images', prompt, num_images)
+
+    def enhance(self, text, enhancement_type):
+        return self._call('enhance', text, enhancement_type)
+
+    def summarize(self, text, max_length):
+        return self._call('summarize', text, max_length)
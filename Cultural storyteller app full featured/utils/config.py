@@ -46,6 +46,104 @@ VOICE_CONFIG = {
     }
 }
 
+# Process Pool Configuration (see utils/process_pools.py)
+PROCESS_POOL_CONFIG = {
+    'cpu_budget': os.cpu_count() or 1  # jobs running at once across every worker pool
+}
+
+# TTS Worker Pool Configuration (see utils/tts_pool.py)
+TTS_POOL_CONFIG = {
+    'max_workers': min(4, os.cpu_count() or 1),
+    'job_timeout': 300,  # seconds to wait for one narration
+    'volume': 0.9
+}
+
+# Narration Cache Configuration (see utils/narration_cache.py)
+NARRATION_CACHE_CONFIG = {
+    'root': os.path.join('data', 'narration'),
+    'max_bytes': int(os.getenv('NARRATION_CACHE_MAX_BYTES', 512 * 1024 * 1024)),  # LRU eviction above this
+    'lease_seconds': 300  # narrations looked up or stored this recently are never evicted
+}
+
+# Narration Pipeline Configuration (long stories are narrated in sentence chunks, in parallel)
+NARRATION_PIPELINE_CONFIG = {
+    'min_chars': 1000,  # shorter texts are narrated in one job
+    'first_chunk_chars': 160,  # small first chunk for a fast time-to-first-audio
+    'chunk_chars': 800
+}
+
+# Background Music Configuration (see utils/audio.py)
+MUSIC_CONFIG = {
+    'tracks_dir': os.path.join('data', 'music'),
+    'tracks': {  # music type -> WAV loop in tracks_dir
+        'Traditional Indian': 'traditional_indian.wav',
+        'Peaceful Ambient': 'peaceful_ambient.wav',
+        'Epic Orchestral': 'epic_orchestral.wav',
+        'Folk Melodies': 'folk_melodies.wav'
+    },
+    # Simple beds synthesized into tracks_dir for tracks that aren't installed:
+    # drone pitches (Hz), melody notes picked at random from a scale, and note length
+    'beds': {
+        'Traditional Indian': {'drone': [130.81, 196.00, 261.63], 'notes': [261.63, 293.66, 329.63, 392.00, 440.00],
+                               'note_seconds': 0.75},  # Sa-Pa tanpura drone, pentatonic melody
+        'Peaceful Ambient': {'drone': [110.00, 164.81, 220.00, 277.18], 'notes': [], 'note_seconds': 0},
+        'Epic Orchestral': {'drone': [73.42, 110.00, 146.83], 'notes': [293.66, 349.23, 440.00, 587.33],
+                            'note_seconds': 1.5},
+        'Folk Melodies': {'drone': [146.83, 220.00], 'notes': [293.66, 329.63, 369.99, 440.00, 493.88],
+                          'note_seconds': 0.5}
+    },
+    'bed_seconds': 24,
+    'bed_rate': 22050,
+    'default_track': 'Peaceful Ambient',
+    'music_volume': 0.3,
+    'duck_gain': 0.35,  # music level under speech (about -9 dB)
+    'duck_threshold_db': -40,  # narration level counted as speech
+    'attack': 0.05,  # seconds to duck
+    'release': 0.5,  # seconds to recover between phrases
+    'crossfade': 2.0,  # seconds blended at the loop point, and the fade-in / fade-out
+    'tail': 3.0,  # seconds of music after the narration ends
+    'block_frames': 32768
+}
+
+# Recording Processing Configuration (see utils/recordings.py)
+RECORDING_CONFIG = {
+    'root': os.path.join('data', 'recordings'),  # processed uploads and audio comments
+    'target_lufs': -16.0,  # spoken-word streaming level
+    'peak_ceiling_db': -1.0,  # normalization never pushes a sample peak above this
+    'max_gain_db': 24.0,
+    'silence_margin_db': 6,  # 10 ms windows up to this far above the room tone are silence
+    'silence_below_db': 15,  # ...as long as they are this far under the speech level
+    'silence_floor_db': -60,  # windows below this level always count as silence
+    'max_silence': 1.0,  # seconds; longer pauses are condensed
+    'keep_silence': 0.6,  # seconds a condensed pause is cut to
+    'fade': 0.01,  # seconds faded at each cut
+    'block_frames': 65536,
+    'max_workers': 2
+}
+
+# Playlist Configuration (see utils/playlist.py)
+PLAYLIST_CONFIG = {
+    'max_stories': 50,
+    'prefetch_chunks': 2,  # opening chunks of the next story synthesized while one plays
+    'max_prefetch_jobs': 1,  # TTS workers prefetching at once, across all listeners
+    'max_narrations': 4,  # current stories narrated in the background at once, across all listeners
+    'default_bandwidth_kbps': 300  # for picking a recorded story's rendition
+}
+
+# Voice Sample Configuration (see utils/voice_samples.py)
+VOICE_SAMPLE_CONFIG = {
+    'root': os.path.join('data', 'voice_samples'),  # pre-rendered previews and manifest.json
+    'speeds': [0.8, 0.9, 1.0, 1.1, 1.2, 1.5],  # speeds rendered ahead; others synthesize on demand
+    'warm_on_startup': True
+}
+
+# Narration Duration Configuration (see utils/durations.py)
+DURATION_CONFIG = {
+    'listing_voice': 'Wise Elder',  # synthesized voice whose length listings show, at normal speed
+    'min_samples': 5,  # measurements of a voice needed before its fitted estimate is used
+    'model_ttl': 300  # seconds before re-reading the fit, to see other processes' measurements
+}
+
 # Avatar Configuration
 AVATAR_CONFIG = {
     'available_avatars': [
@@ -133,6 +231,172 @@ AI_CONFIG = {
     }
 }
 
+# AI Provider Configuration (see utils/ai_providers.py)
+AI_PROVIDER_CONFIG = {
+    # 'auto' uses openai when OPENAI_API_KEY is set and the offline mock otherwise
+    'provider': os.getenv('AI_PROVIDER', 'auto'),
+    'providers': {
+        'openai': {
+            'base_url': os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+            'model': os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            'image_model': 'dall-e-3',
+            'timeout': 60  # seconds
+        },
+        'mock': {
+            'latency': float(os.getenv('MOCK_AI_LATENCY', '0')),  # seconds per call
+            'jitter': 0.0,
+            'failure_rate': float(os.getenv('MOCK_AI_FAILURE_RATE', '0')),
+            'failure_status': 503,
+            'stream_chunk_size': 12,
+            'seed': 0
+        }
+    }
+}
+
+# Circuit Breaker Configuration (see utils/circuit_breaker.py)
+CIRCUIT_BREAKER_CONFIG = {
+    'breaker': {
+        'window_size': 20,  # most recent calls considered
+        'min_calls': 5,
+        'failure_rate_threshold': 0.5,
+        'slow_call_duration': 20.0,  # seconds
+        'slow_call_rate_threshold': 0.8,
+        'open_duration': 30.0,  # seconds before half-open probing
+        'half_open_max_calls': 1
+    },
+    'overrides': {},  # provider name -> breaker settings
+    'deadlines': {  # seconds per call
+        'generate_story': 45.0,
+        'stream_story': 15.0,  # time to first fragment
+        'generate_images': 60.0,
+        'enhance': 45.0,
+        'summarize': 20.0
+    },
+    'max_workers': 16
+}
+
+# Batch Generation Configuration (see utils/batch_generation.py)
+BATCH_GENERATION_CONFIG = {
+    'requests_per_minute': 60,  # token bucket refill rate
+    'burst': 10,  # token bucket capacity
+    'max_concurrency': 8,
+    'max_retries': 5,
+    'backoff_base': 1.0,  # seconds, doubled on every retry
+    'backoff_max': 60.0,
+    'progress_dir': os.path.join('data', 'batch_jobs')
+}
+
+# Story Enhancement Configuration (see utils/enhancement.py)
+ENHANCEMENT_CONFIG = {
+    'max_chunk_tokens': 1500,  # estimated tokens per enhancement request
+    'min_chunk_tokens': 400,
+    'boundary_modulus': 4,  # content-defined cut after ~1 in N paragraphs
+    'overlap_paragraphs': 1,  # context carried over from the previous chunk
+    'max_workers': 4
+}
+
+# AI Cache Configuration (persistent cache for AI generation results)
+AI_CACHE_CONFIG = {
+    'enabled': True,
+    'cache_file': os.path.join('data', 'ai_cache.sqlite'),
+    'max_bytes': 256 * 1024 * 1024,  # LRU eviction above this size
+    'ttl': 30 * 24 * 3600  # seconds
+}
+
+# Similar Stories Configuration (local index, no external embedding APIs)
+SIMILARITY_CONFIG = {
+    'index_dir': os.path.join('data', 'similarity'),
+    'dimensions': 64,  # keeps a 500k-story brute-force scan well under 20ms
+    'hash_features': 2 ** 16,
+    'field_weights': {'title': 3, 'description': 2, 'content': 1},
+    'fit_sample_size': 20000,  # stories used to fit IDF + SVD
+    'refit_growth_factor': 2.0,  # refit when catalog doubles since last fit
+    'oversampling': 10,
+    'power_iterations': 2,
+    'default_top_k': 10
+}
+
+# Near-Duplicate Detection Configuration (MinHash + LSH)
+DEDUP_CONFIG = {
+    'num_perm': 128,
+    'bands': 32,  # 32 bands x 4 rows: candidates from roughly 0.4 Jaccard up
+    'shingle_size': 3,  # words per shingle
+    'threshold': 0.8  # estimated Jaccard at which a story is flagged
+}
+
+# Interaction Log Configuration (likes, follows, ...)
+INTERACTION_LOG_CONFIG = {
+    'flush_interval': 1.0,  # seconds between batched appends
+    'flush_batch_size': 500,  # flush early once this many events are pending
+    'compact_interval': 30,  # seconds between compactions
+    'compact_batch_size': 10000  # events folded per transaction
+}
+
+# Session Configuration (server-side login sessions)
+SESSION_CONFIG = {
+    'secret_key': os.getenv('SESSION_SECRET_KEY'),
+    'secret_file': os.path.join('data', 'session_secret'),  # used when no key is set
+    'ttl': 7 * 24 * 3600,  # seconds
+    'lru_size': 1024,  # sessions kept in memory
+    'storage_key': 'cultural_storyteller_session'  # browser localStorage entry holding the token
+}
+
+# Activity Configuration (coalesced last_login / last_seen writes)
+ACTIVITY_CONFIG = {
+    'flush_interval': 15,  # seconds between batched timestamp UPDATEs
+    'online_window': 300  # seconds of inactivity before a user counts as offline
+}
+
+# Image Store Configuration (see utils/image_store.py)
+IMAGE_STORE_CONFIG = {
+    'root': os.path.join('data', 'images'),
+    'widths': [320, 640, 1280],  # responsive WebP variants
+    'thumbnail_size': 160,  # square WebP thumbnail
+    'webp_quality': 80,
+    'max_bytes': 20 * 1024 * 1024,  # largest accepted original
+    'download_timeout': 20,  # seconds
+    'download_workers': 4,
+    'orphan_grace_period': 24 * 3600,  # seconds before unreferenced images are collected
+    'max_workers': 2
+}
+
+# Keyword Extraction Configuration (see utils/keywords.py)
+KEYWORD_CONFIG = {
+    # Optional JSON vocabulary extending the built-in tag and moral keywords
+    'vocabulary_file': os.getenv('KEYWORD_VOCABULARY_FILE', os.path.join('data', 'keyword_vocabulary.json')),
+    'max_tags': 8
+}
+
+# Summarizer Configuration (see utils/summarizer.py)
+SUMMARIZER_CONFIG = {
+    'damping': 0.85,  # TextRank / PageRank damping factor
+    'tolerance': 1e-6,
+    'max_iterations': 100,
+    'max_sentences': 3
+}
+
+# Enrichment Configuration (post-publish summary / tags / moral / narration duration)
+ENRICHMENT_CONFIG = {
+    'max_workers': 2,
+    'batch_size': 100,  # stories per backfill transaction
+    'summary_length': 200,
+    'voice_personality': 'Wise Elder'  # narration duration is estimated for this voice
+}
+
+# Transcoding Configuration (audio renditions at each EXPORT_CONFIG quality, see utils/transcoding.py)
+TRANSCODING_CONFIG = {
+    'root': os.path.join('data', 'audio'),
+    'codecs': {
+        'opus': {'encoder': 'libopus', 'container': 'ogg', 'extension': 'ogg', 'mime': 'audio/ogg',
+                 'sample_rate': 48000, 'max_channel_bitrate': 256000},
+        'aac': {'encoder': 'aac', 'container': 'mp4', 'extension': 'm4a', 'mime': 'audio/mp4'},
+        'mp3': {'encoder': 'libmp3lame', 'container': 'mp3', 'extension': 'mp3', 'mime': 'audio/mpeg'}
+    },
+    'codec_preference': ['opus', 'aac', 'mp3'],  # best quality per bit first
+    'bandwidth_headroom': 0.75,  # share of the client's bandwidth a rendition may use
+    'max_workers': 2
+}
+
 # UI Theme Configuration
 THEME_CONFIG = {
     'primary_color': '#667eea',
@@ -209,10 +473,34 @@ def get_config(config_type):
     configs = {
         'app': APP_CONFIG,
         'voice': VOICE_CONFIG,
+        'process_pool': PROCESS_POOL_CONFIG,
+        'tts_pool': TTS_POOL_CONFIG,
+        'narration_cache': NARRATION_CACHE_CONFIG,
+        'narration_pipeline': NARRATION_PIPELINE_CONFIG,
+        'music': MUSIC_CONFIG,
+        'recording': RECORDING_CONFIG,
+        'voice_samples': VOICE_SAMPLE_CONFIG,
+        'playlist': PLAYLIST_CONFIG,
+        'duration': DURATION_CONFIG,
         'avatar': AVATAR_CONFIG,
         'webrtc': WEBRTC_CONFIG,
         'database': DATABASE_CONFIG,
         'ai': AI_CONFIG,
+        'ai_provider': AI_PROVIDER_CONFIG,
+        'batch_generation': BATCH_GENERATION_CONFIG,
+        'circuit_breaker': CIRCUIT_BREAKER_CONFIG,
+        'enhancement': ENHANCEMENT_CONFIG,
+        'image_store': IMAGE_STORE_CONFIG,
+        'keywords': KEYWORD_CONFIG,
+        'summarizer': SUMMARIZER_CONFIG,
+        'enrichment': ENRICHMENT_CONFIG,
+        'transcoding': TRANSCODING_CONFIG,
+        'ai_cache': AI_CACHE_CONFIG,
+        'similarity': SIMILARITY_CONFIG,
+        'dedup': DEDUP_CONFIG,
+        'interaction_log': INTERACTION_LOG_CONFIG,
+        'session': SESSION_CONFIG,
+        'activity': ACTIVITY_CONFIG,
         'theme': THEME_CONFIG,
         'cultural': CULTURAL_CONFIG,
         'export': EXPORT_CONFIG
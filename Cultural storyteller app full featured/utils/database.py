@@ -2,8 +2,19 @@ import sqlite3
 import json
 import os
 from datetime import datetime
+from utils.similarity import index_story
+from utils.dedup import (
+    compute_minhash, band_keys, signature_to_blob, signature_from_blob,
+    estimate_jaccard, cluster_pairs
+)
+from utils.interaction_log import record_interaction, has_interaction
+from utils.activity import record_login
+from utils.image_store import add_image_references, release_image_references
+from utils.enrichment import enqueue_story_enrichment
+from utils.recordings import submit_comment_audio
+from utils.config import DATABASE_CONFIG, DEDUP_CONFIG
 
-DATABASE_FILE = "cultural_storyteller.db"
+DATABASE_FILE = DATABASE_CONFIG['database_file']
 
 def init_database():
     """Initialize the SQLite database with required tables"""
@@ -45,10 +56,29 @@ def init_database():
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             audio_file TEXT,
             video_file TEXT,
-            images TEXT
+            images TEXT,
+            summary TEXT,
+            suggested_tags TEXT,
+            moral TEXT,
+            narration_seconds REAL,
+            narration_measured INTEGER DEFAULT 0,
+            enriched_at TIMESTAMP
         )
     ''')
     
+    # Enrichment columns (see utils/enrichment.py), and the state of an uploaded
+    # recording (see utils/recordings.py), for databases created before them
+    cursor.execute('PRAGMA table_info(stories)')
+    existing = {row[1] for row in cursor.fetchall()}
+    for column, column_type in [('summary', 'TEXT'), ('suggested_tags', 'TEXT'), ('moral', 'TEXT'),
+                                ('narration_seconds', 'REAL'), ('narration_measured', 'INTEGER DEFAULT 0'),
+                                ('enriched_at', 'TIMESTAMP'), ('audio_status', 'TEXT'), ('audio_error', 'TEXT')]:
+        if column not in existing:
+            cursor.execute(f'ALTER TABLE stories ADD COLUMN {column} {column_type}')
+    
+    # Listings filter and sort by narration length
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stories_narration_seconds ON stories (narration_seconds)')
+    
     # Comments table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS comments (
@@ -110,6 +140,207 @@ def init_database():
         )
     ''')
     
+    # Last activity per user, written in batches by utils/activity.py
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_presence (
+            user_id INTEGER PRIMARY KEY,
+            last_seen TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    # Server-side login sessions (see utils/sessions.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            user_data TEXT,
+            permission_bits INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)')
+    
+    # Append-only interaction event log (delta: +1 set, -1 undo)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interaction_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            target_type TEXT NOT NULL,
+            target_id INTEGER NOT NULL,
+            interaction_type TEXT NOT NULL,
+            delta INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_interaction_events_key
+        ON interaction_events (user_id, target_type, target_id, interaction_type, seq)
+    ''')
+    
+    # Compacted per-user state and per-target counters
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_interaction_state (
+            user_id INTEGER NOT NULL,
+            target_type TEXT NOT NULL,
+            target_id INTEGER NOT NULL,
+            interaction_type TEXT NOT NULL,
+            active INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, target_type, target_id, interaction_type)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interaction_counters (
+            target_type TEXT NOT NULL,
+            target_id INTEGER NOT NULL,
+            interaction_type TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (target_type, target_id, interaction_type)
+        )
+    ''')
+    
+    # Compaction watermark: last event seq folded into the counters
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interaction_compaction (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    cursor.execute('INSERT OR IGNORE INTO interaction_compaction (id, last_seq) VALUES (1, 0)')
+    
+    # Carry legacy user_interactions rows into the event log once
+    cursor.execute('''
+        INSERT INTO interaction_events (user_id, target_type, target_id, interaction_type, delta, created_at)
+        SELECT user_id, target_type, target_id, interaction_type, 1, created_at
+        FROM user_interactions
+        WHERE NOT EXISTS (SELECT 1 FROM interaction_events)
+        ORDER BY id
+    ''')
+    
+    # MinHash signatures and LSH buckets for near-duplicate detection
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS story_signatures (
+            story_id INTEGER PRIMARY KEY,
+            signature BLOB NOT NULL,
+            FOREIGN KEY (story_id) REFERENCES stories (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS story_lsh_buckets (
+            band INTEGER NOT NULL,
+            bucket INTEGER NOT NULL,
+            story_id INTEGER NOT NULL,
+            FOREIGN KEY (story_id) REFERENCES stories (id)
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lsh_band_bucket
+        ON story_lsh_buckets (band, bucket)
+    ''')
+    
+    # Flagged near-duplicate pairs (story_id duplicates the older duplicate_of)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS story_duplicates (
+            story_id INTEGER NOT NULL,
+            duplicate_of INTEGER NOT NULL,
+            jaccard REAL NOT NULL,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (story_id, duplicate_of)
+        )
+    ''')
+    
+    # Content-addressed image store (files live under IMAGE_STORE_CONFIG['root'])
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_objects (
+            digest TEXT PRIMARY KEY,
+            mime TEXT,
+            width INTEGER,
+            height INTEGER,
+            size INTEGER,
+            refcount INTEGER DEFAULT 0,
+            created_at REAL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_sources (
+            source TEXT PRIMARY KEY,
+            digest TEXT NOT NULL
+        )
+    ''')
+    
+    # Synthesized narration files (see utils/narration_cache.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS narration_cache (
+            key TEXT PRIMARY KEY,
+            voice TEXT,
+            speech_speed REAL,
+            duration REAL,
+            bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_narration_cache_last_used ON narration_cache (last_used)')
+    
+    # Compressed audio renditions of a story's narration (see utils/transcoding.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS story_audio_renditions (
+            story_id INTEGER NOT NULL,
+            quality TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mime TEXT,
+            bitrate INTEGER,
+            sample_rate INTEGER,
+            bytes INTEGER,
+            duration REAL,
+            created_at REAL,
+            PRIMARY KEY (story_id, quality, codec),
+            FOREIGN KEY (story_id) REFERENCES stories (id)
+        )
+    ''')
+    
+    # Compressed renditions of synthesized narrations, by narration cache key
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS narration_audio_renditions (
+            key TEXT NOT NULL,
+            quality TEXT NOT NULL,
+            codec TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mime TEXT,
+            bitrate INTEGER,
+            sample_rate INTEGER,
+            bytes INTEGER,
+            duration REAL,
+            created_at REAL,
+            PRIMARY KEY (key, quality, codec)
+        )
+    ''')
+    
+    # Measured narration lengths per story and voice (see utils/durations.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS story_durations (
+            story_id INTEGER NOT NULL,
+            voice TEXT NOT NULL,
+            speech_speed REAL NOT NULL,
+            seconds REAL NOT NULL,
+            words INTEGER NOT NULL,
+            measured_at REAL,
+            PRIMARY KEY (story_id, voice, speech_speed),
+            FOREIGN KEY (story_id) REFERENCES stories (id)
+        )
+    ''')
+    
     conn.commit()
     conn.close()
 
@@ -148,15 +379,12 @@ def verify_user(username, password_hash, user_type):
     ''', (username, password_hash, user_type))
     
     result = cursor.fetchone()
+    conn.close()
     
-    # Update last login
+    # Update last login (coalesced and flushed in batches)
     if result:
-        cursor.execute('''
-            UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?
-        ''', (result[0],))
-        conn.commit()
+        record_login(result[0])
     
-    conn.close()
     return result is not None
 
 def get_user_by_username(username):
@@ -185,6 +413,17 @@ def get_user_by_username(username):
         }
     return None
 
+def get_user_by_id(user_id):
+    """Get user information by ID"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT username FROM users WHERE id = ?', (user_id,))
+    result = cursor.fetchone()
+    conn.close()
+    
+    return get_user_by_username(result[0]) if result else None
+
 def save_story(story_data, author):
     """Save a new story to the database"""
     conn = sqlite3.connect(DATABASE_FILE)
@@ -193,8 +432,8 @@ def save_story(story_data, author):
     cursor.execute('''
         INSERT INTO stories (
             title, author, content, description, category, region, 
-            language, tags, duration, settings
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            language, tags, duration, settings, images
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         story_data['title'],
         author,
@@ -205,31 +444,279 @@ def save_story(story_data, author):
         story_data['language'],
         json.dumps(story_data.get('tags', [])),
         story_data['duration'],
-        json.dumps(story_data.get('settings', {}))
+        json.dumps(story_data.get('settings', {})),
+        json.dumps(story_data.get('images', []))
     ))
     
     story_id = cursor.lastrowid
+    add_image_references(cursor, story_data.get('images', []))
+    
+    # Flag near-duplicates of the new story, then add it to the LSH index
+    signature = compute_minhash(story_data['content'])
+    for duplicate in _find_near_duplicates(cursor, signature):
+        cursor.execute('''
+            INSERT OR REPLACE INTO story_duplicates (story_id, duplicate_of, jaccard)
+            VALUES (?, ?, ?)
+        ''', (story_id, duplicate['story_id'], duplicate['jaccard']))
+    _index_story_signature(cursor, story_id, signature)
+    
     conn.commit()
     conn.close()
     
+    # Keep the "similar stories" index current; never fail the save over it
+    try:
+        index_story(story_id, story_data)
+    except Exception:
+        pass
+    
+    # Summary, tags, moral and narration length are filled in off the request thread
+    enqueue_story_enrichment(story_id)
+    
     return story_id
 
-def get_all_stories(limit=50):
-    """Get all stories with pagination"""
+def get_story_images(story_id):
+    """Get the image digests attached to a story, in display order"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('SELECT images FROM stories WHERE id = ?', (story_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return json.loads(row[0]) if row and row[0] else []
+
+def set_story_images(story_id, digests):
+    """Replace a story's images, keeping image reference counts in step"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT images FROM stories WHERE id = ?', (story_id,))
+    row = cursor.fetchone()
+    if row is None:
+        conn.close()
+        return False
+    
+    release_image_references(cursor, json.loads(row[0]) if row[0] else [])
+    add_image_references(cursor, digests)
+    cursor.execute('''
+        UPDATE stories SET images = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    ''', (json.dumps(digests), story_id))
+    
+    conn.commit()
+    conn.close()
+    return True
+
+def _index_story_signature(cursor, story_id, signature):
+    """Store a story's MinHash signature and its LSH band buckets"""
+    # Stories without words are marked as indexed, but get no buckets to match in
+    cursor.execute('''
+        INSERT OR REPLACE INTO story_signatures (story_id, signature)
+        VALUES (?, ?)
+    ''', (story_id, signature_to_blob(signature) if signature is not None else b''))
+    
+    if signature is None:
+        return
+    
+    cursor.executemany('''
+        INSERT INTO story_lsh_buckets (band, bucket, story_id)
+        VALUES (?, ?, ?)
+    ''', [(band, bucket, story_id) for band, bucket in band_keys(signature)])
+
+def _find_near_duplicates(cursor, signature, threshold=None):
+    """Look up LSH candidates for a signature and keep those above threshold"""
+    threshold = DEDUP_CONFIG['threshold'] if threshold is None else threshold
+    if signature is None:
+        return []
+    keys = band_keys(signature)
+    
+    clause = ' OR '.join(['(b.band = ? AND b.bucket = ?)'] * len(keys))
+    params = [value for key in keys for value in key]
+    
+    cursor.execute(f'''
+        SELECT DISTINCT s.story_id, s.signature
+        FROM story_lsh_buckets b
+        JOIN story_signatures s ON s.story_id = b.story_id
+        WHERE {clause}
+    ''', params)
+    
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    
+    others = [signature_from_blob(row[1]) for row in rows]
+    scores = estimate_jaccard(signature, others)
+    
+    duplicates = [
+        {'story_id': row[0], 'jaccard': float(score)}
+        for row, score in zip(rows, scores) if score >= threshold
+    ]
+    duplicates.sort(key=lambda d: d['jaccard'], reverse=True)
+    return duplicates
+
+def find_near_duplicate_stories(content, threshold=None):
+    """
+    Find published stories that are near-duplicates of the given content
+    
+    Args:
+        content (str): Story text to check
+        threshold (float): Minimum estimated Jaccard similarity
+    
+    Returns:
+        list: Dicts with story_id, title, author and jaccard, best match first
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    duplicates = _find_near_duplicates(cursor, compute_minhash(content), threshold)
+    
+    for duplicate in duplicates:
+        cursor.execute('SELECT title, author FROM stories WHERE id = ?', (duplicate['story_id'],))
+        row = cursor.fetchone()
+        duplicate['title'], duplicate['author'] = row if row else (None, None)
+    
+    conn.close()
+    return duplicates
+
+def get_story_duplicates(story_id):
+    """
+    Stories a saved story was flagged as a near-duplicate of when it was saved
+    
+    Returns:
+        list: Dicts with story_id, title, author and jaccard, best match first
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT d.duplicate_of, s.title, s.author, d.jaccard
+        FROM story_duplicates d
+        LEFT JOIN stories s ON s.id = d.duplicate_of
+        WHERE d.story_id = ?
+        ORDER BY d.jaccard DESC
+    ''', (story_id,))
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [dict(zip(('story_id', 'title', 'author', 'jaccard'), row)) for row in rows]
+
+def cluster_duplicate_stories(threshold=None, batch_size=500):
+    """
+    Batch job: cluster near-duplicate stories across the whole catalog
+    
+    Stories saved before signatures existed are indexed first, then every
+    LSH bucket shared by two or more stories yields candidate pairs that are
+    verified against the Jaccard threshold and recorded in story_duplicates.
+    
+    Args:
+        threshold (float): Minimum estimated Jaccard similarity
+        batch_size (int): Stories fetched per batch while backfilling
+    
+    Returns:
+        list: Clusters as sorted lists of story IDs
+    """
+    threshold = DEDUP_CONFIG['threshold'] if threshold is None else threshold
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    # Backfill signatures for stories that predate the index
+    while True:
+        cursor.execute('''
+            SELECT id, content FROM stories
+            WHERE id NOT IN (SELECT story_id FROM story_signatures)
+            LIMIT ?
+        ''', (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        for story_id, content in rows:
+            _index_story_signature(cursor, story_id, compute_minhash(content))
+        conn.commit()
+    
+    # Candidate pairs from every shared bucket
+    cursor.execute('''
+        SELECT GROUP_CONCAT(story_id)
+        FROM story_lsh_buckets
+        GROUP BY band, bucket
+        HAVING COUNT(*) > 1
+    ''')
+    
+    candidates = set()
+    for (members,) in cursor.fetchall():
+        ids = sorted({int(x) for x in members.split(',')})
+        for i, a in enumerate(ids):
+            for b in ids[i + 1:]:
+                candidates.add((a, b))
+    
+    signatures = {}
+    needed = sorted({story_id for pair in candidates for story_id in pair})
+    for start in range(0, len(needed), batch_size):
+        chunk = needed[start:start + batch_size]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'''
+            SELECT story_id, signature FROM story_signatures
+            WHERE story_id IN ({placeholders})
+        ''', chunk)
+        for story_id, blob in cursor.fetchall():
+            signatures[story_id] = signature_from_blob(blob)
+    
+    pairs = []
+    for a, b in candidates:
+        jaccard = float(estimate_jaccard(signatures[b], [signatures[a]])[0])
+        if jaccard >= threshold:
+            pairs.append((a, b))
+            cursor.execute('''
+                INSERT OR REPLACE INTO story_duplicates (story_id, duplicate_of, jaccard)
+                VALUES (?, ?, ?)
+            ''', (b, a, jaccard))
+    
+    conn.commit()
+    conn.close()
+    
+    return cluster_pairs(pairs)
+
+def iter_story_documents(batch_size=500):
+    """Stream id, title, description and content for every story"""
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
     
     cursor.execute('''
+        SELECT id, title, description, content
+        FROM stories
+        ORDER BY id
+    ''')
+    
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield {
+                    'id': row[0],
+                    'title': row[1],
+                    'description': row[2],
+                    'content': row[3]
+                }
+    finally:
+        conn.close()
+
+def get_stories_by_ids(story_ids):
+    """Get story summaries for a list of IDs, preserving the given order"""
+    if not story_ids:
+        return []
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    placeholders = ','.join('?' * len(story_ids))
+    cursor.execute(f'''
         SELECT id, title, author, description, category, region, language, 
                views, likes, created_at, duration, tags
         FROM stories 
-        ORDER BY created_at DESC 
-        LIMIT ?
-    ''', (limit,))
+        WHERE id IN ({placeholders})
+    ''', list(story_ids))
     
-    stories = []
+    by_id = {}
     for row in cursor.fetchall():
-        stories.append({
+        by_id[row[0]] = {
             'id': row[0],
             'title': row[1],
             'author': row[2],
@@ -242,23 +729,134 @@ def get_all_stories(limit=50):
             'created_at': row[9],
             'duration': row[10],
             'tags': json.loads(row[11]) if row[11] else []
-        })
+        }
+    
+    conn.close()
+    return [by_id[story_id] for story_id in story_ids if story_id in by_id]
+
+# Listing orders; the length orders only list stories whose length is known
+STORY_SORT_ORDERS = {
+    'recent': 'created_at DESC',
+    'shortest': 'narration_seconds',
+    'longest': 'narration_seconds DESC'
+}
+
+def _duration_filters(sql, params, min_seconds, max_seconds, sort_by):
+    """Add narration length bounds to a listing query; served by idx_stories_narration_seconds"""
+    if min_seconds is not None:
+        sql += ' AND narration_seconds >= ?'
+        params.append(min_seconds)
+    if max_seconds is not None:
+        sql += ' AND narration_seconds <= ?'
+        params.append(max_seconds)
+    if sort_by != 'recent':
+        sql += ' AND narration_seconds IS NOT NULL'
+    return sql + f' ORDER BY {STORY_SORT_ORDERS[sort_by]}'
+
+def _story_row(row):
+    return {
+        'id': row[0],
+        'title': row[1],
+        'author': row[2],
+        'description': row[3],
+        'category': row[4],
+        'region': row[5],
+        'language': row[6],
+        'views': row[7],
+        'likes': row[8],
+        'created_at': row[9],
+        'duration': row[10],
+        'tags': json.loads(row[11]) if row[11] else [],
+        'narration_seconds': row[12],
+        'narration_measured': bool(row[13])
+    }
+
+def get_all_stories(limit=50, min_seconds=None, max_seconds=None, sort_by='recent'):
+    """
+    Get all stories with pagination
+    
+    Args:
+        limit (int): Maximum stories to return
+        min_seconds (float): Only stories at least this long to narrate
+        max_seconds (float): Only stories at most this long to narrate
+        sort_by (str): A key of STORY_SORT_ORDERS
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    
+    sql = '''
+        SELECT id, title, author, description, category, region, language, 
+               views, likes, created_at, duration, tags, narration_seconds, narration_measured
+        FROM stories 
+        WHERE 1 = 1
+    '''
+    params = []
+    sql = _duration_filters(sql, params, min_seconds, max_seconds, sort_by)
+    sql += ' LIMIT ?'
+    params.append(limit)
+    
+    cursor.execute(sql, params)
+    stories = [_story_row(row) for row in cursor.fetchall()]
     
     conn.close()
     return stories
 
+# Story fields a playlist can be built from
+PLAYLIST_FIELDS = ('category', 'author', 'region')
+
+def get_playlist_values(field):
+    """Distinct values of a playlist field, e.g. every author with a story"""
+    if field not in PLAYLIST_FIELDS:
+        raise ValueError(f"Unknown playlist field: {field}")
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT DISTINCT {field} FROM stories WHERE {field} IS NOT NULL ORDER BY {field}')
+    values = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    return values
+
+def get_playlist_stories(field, value, limit=50):
+    """Stories sharing a category, author or region, oldest first, to play back to back"""
+    if field not in PLAYLIST_FIELDS:
+        raise ValueError(f"Unknown playlist field: {field}")
+    
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id, title, author, description, category, region, language, 
+               views, likes, created_at, duration, tags, narration_seconds, narration_measured
+        FROM stories 
+        WHERE {field} = ?
+        ORDER BY created_at, id
+        LIMIT ?
+    ''', (value, limit))
+    stories = [_story_row(row) for row in cursor.fetchall()]
+    conn.close()
+    return stories
+
+def get_story_content(story_id):
+    """Full text of a story, or None if it doesn't exist"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('SELECT content FROM stories WHERE id = ?', (story_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row[0] if row else None
+
 def get_recent_stories(limit=10):
     """Get recent stories for home page"""
     return get_all_stories(limit)
 
-def search_stories(query, category=None, region=None, language=None):
-    """Search stories with filters"""
+def search_stories(query, category=None, region=None, language=None,
+                   min_seconds=None, max_seconds=None, sort_by='recent'):
+    """Search stories with filters, including narration length in seconds"""
     conn = sqlite3.connect(DATABASE_FILE)
     cursor = conn.cursor()
     
     sql = '''
         SELECT id, title, author, description, category, region, language, 
-               views, likes, created_at, duration, tags
+               views, likes, created_at, duration, tags, narration_seconds, narration_measured
         FROM stories 
         WHERE (title LIKE ? OR description LIKE ? OR content LIKE ?)
     '''
@@ -276,26 +874,11 @@ def search_stories(query, category=None, region=None, language=None):
         sql += ' AND language = ?'
         params.append(language)
     
-    sql += ' ORDER BY created_at DESC LIMIT 50'
+    sql = _duration_filters(sql, params, min_seconds, max_seconds, sort_by)
+    sql += ' LIMIT 50'
     
     cursor.execute(sql, params)
-    
-    stories = []
-    for row in cursor.fetchall():
-        stories.append({
-            'id': row[0],
-            'title': row[1],
-            'author': row[2],
-            'description': row[3],
-            'category': row[4],
-            'region': row[5],
-            'language': row[6],
-            'views': row[7],
-            'likes': row[8],
-            'created_at': row[9],
-            'duration': row[10],
-            'tags': json.loads(row[11]) if row[11] else []
-        })
+    stories = [_story_row(row) for row in cursor.fetchall()]
     
     conn.close()
     return stories
@@ -340,6 +923,10 @@ def add_comment(story_id, user_id, comment_text, comment_type='text', audio_file
     conn.commit()
     conn.close()
     
+    # Level and trim the recording in the background
+    if audio_file:
+        submit_comment_audio(comment_id, audio_file)
+    
     return comment_id
 
 def get_story_comments(story_id):
@@ -482,30 +1069,33 @@ def update_story_views(story_id):
     conn.close()
 
 def like_story(story_id, user_id):
-    """Like a story"""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    
-    # Check if already liked
-    cursor.execute('''
-        SELECT id FROM user_interactions 
-        WHERE user_id = ? AND target_type = 'story' AND target_id = ? AND interaction_type = 'like'
-    ''', (user_id, story_id))
-    
-    if cursor.fetchone():
+    """Like a story (appended to the interaction log; counters update on compaction)"""
+    if has_interaction(user_id, 'story', story_id, 'like'):
         return False  # Already liked
     
-    # Add like interaction
-    cursor.execute('''
-        INSERT INTO user_interactions (user_id, target_type, target_id, interaction_type)
-        VALUES (?, 'story', ?, 'like')
-    ''', (user_id, story_id))
+    record_interaction(user_id, 'story', story_id, 'like')
+    return True
+
+def unlike_story(story_id, user_id):
+    """Remove a like from a story"""
+    if not has_interaction(user_id, 'story', story_id, 'like'):
+        return False
     
-    # Increment story likes
-    cursor.execute('''
-        UPDATE stories SET likes = likes + 1 WHERE id = ?
-    ''', (story_id,))
+    record_interaction(user_id, 'story', story_id, 'like', active=False)
+    return True
+
+def follow_user(target_user_id, user_id):
+    """Follow another user"""
+    if has_interaction(user_id, 'user', target_user_id, 'follow'):
+        return False  # Already following
     
-    conn.commit()
-    conn.close()
-    return True
\ No newline at end of file
+    record_interaction(user_id, 'user', target_user_id, 'follow')
+    return True
+
+def unfollow_user(target_user_id, user_id):
+    """Stop following another user"""
+    if not has_interaction(user_id, 'user', target_user_id, 'follow'):
+        return False
+    
+    record_interaction(user_id, 'user', target_user_id, 'follow', active=False)
+    return True
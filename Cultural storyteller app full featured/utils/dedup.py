@@ -0,0 +1,134 @@
+import re
+import zlib
+import hashlib
+import numpy as np
+from utils.config import DEDUP_CONFIG
+
+# 2**61 - 1, the usual MinHash modulus
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+_WORD_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+
+def _permutations():
+    """Fixed random hash permutations so signatures are stable across restarts"""
+    rng = np.random.default_rng(1)
+    num_perm = DEDUP_CONFIG['num_perm']
+    a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+_PERM_A, _PERM_B = _permutations()
+
+def shingle(text):
+    """
+    Split text into overlapping word shingles
+
+    Args:
+        text (str): Story text
+
+    Returns:
+        set: Word n-grams of length ``shingle_size``
+    """
+    words = _WORD_RE.findall((text or '').lower())
+    size = DEDUP_CONFIG['shingle_size']
+
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def compute_minhash(text):
+    """
+    Compute the MinHash signature of a story's content
+
+    Args:
+        text (str): Story text
+
+    Returns:
+        numpy.ndarray: uint64 signature of length ``num_perm``, or None for
+            text with no words, which can't be compared (every such text
+            would get the same signature and match every other)
+    """
+    shingles = shingle(text)
+    if not shingles:
+        return None
+
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    # (a * h + b) mod p for every permutation at once: shape (shingles, num_perm)
+    permuted = (hashes[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME
+    return permuted.min(axis=0)
+
+def band_keys(signature):
+    """
+    Hash each LSH band of a signature into a bucket key
+
+    Args:
+        signature (numpy.ndarray): MinHash signature
+
+    Returns:
+        list: (band number, signed 64-bit bucket key) tuples
+    """
+    bands = DEDUP_CONFIG['bands']
+    rows = len(signature) // bands
+
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        keys.append((band, int.from_bytes(digest, 'little', signed=True)))
+    return keys
+
+def signature_to_blob(signature):
+    """Serialize a signature for storage"""
+    return signature.astype(np.uint64).tobytes()
+
+def signature_from_blob(blob):
+    """Deserialize a stored signature"""
+    return np.frombuffer(blob, dtype=np.uint64)
+
+def estimate_jaccard(signature, others):
+    """
+    Estimate Jaccard similarity between one signature and many others
+
+    Args:
+        signature (numpy.ndarray): Signature of shape (num_perm,)
+        others (numpy.ndarray): Signatures of shape (n, num_perm)
+
+    Returns:
+        numpy.ndarray: Estimated Jaccard similarity per row of ``others``
+    """
+    if not len(others):
+        return np.zeros(0)
+    return (np.asarray(others) == signature).mean(axis=1)
+
+def cluster_pairs(pairs):
+    """
+    Group duplicate pairs into clusters with union-find
+
+    Args:
+        pairs (iterable): (story_id, story_id) tuples
+
+    Returns:
+        list: Sorted lists of story IDs, one per cluster of two or more
+    """
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = {}
+    for x in parent:
+        clusters.setdefault(find(x), []).append(x)
+
+    return sorted(sorted(c) for c in clusters.values() if len(c) > 1)
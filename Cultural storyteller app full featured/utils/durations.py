@@ -0,0 +1,169 @@
+import math
+import time
+import sqlite3
+import threading
+from utils.config import DATABASE_CONFIG, DURATION_CONFIG
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+# Voice recorded for a story's own uploaded audio, as opposed to a TTS personality
+RECORDED_VOICE = 'recorded'
+
+_models = None
+_models_loaded_at = 0.0
+_models_lock = threading.Lock()
+
+def count_words(text):
+    """Words in a text, counted the same way for measuring and estimating"""
+    return len(text.split())
+
+def _refresh_story_seconds(cursor, story_id):
+    """
+    Set the story's listed narration length from its measurements
+
+    Uploaded audio wins, since that is what listeners hear; otherwise the
+    listing voice at normal speed. Other voices and speeds don't change
+    the listing.
+    """
+    cursor.execute('''
+        SELECT seconds FROM story_durations
+        WHERE story_id = ? AND (voice = ? OR (voice = ? AND speech_speed = 1.0))
+        ORDER BY voice = ? DESC LIMIT 1
+    ''', (story_id, RECORDED_VOICE, DURATION_CONFIG['listing_voice'], RECORDED_VOICE))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute('UPDATE stories SET narration_seconds = ?, narration_measured = 1 WHERE id = ?',
+                       (round(row[0], 1), story_id))
+
+def record_story_duration(story_id, voice_personality, speech_speed, seconds, text=None):
+    """
+    Store the measured length of a story's narration
+
+    Args:
+        story_id (int): Story narrated
+        voice_personality (str): TTS personality, or RECORDED_VOICE for uploaded audio
+        speech_speed (float): Speed the narration was synthesized at (1.0 for recordings)
+        seconds (float): Measured length of the audio
+        text (str): Text narrated; defaults to the story's content
+
+    Returns:
+        bool: True if recorded, False if the story doesn't exist or seconds is unknown
+    """
+    global _models
+    if not seconds:
+        return False
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    if text is None:
+        cursor.execute('SELECT content FROM stories WHERE id = ?', (story_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return False
+        text = row[0]
+
+    cursor.execute('''
+        INSERT OR REPLACE INTO story_durations (story_id, voice, speech_speed, seconds, words, measured_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (story_id, voice_personality, round(float(speech_speed), 3), float(seconds), count_words(text), time.time()))
+    _refresh_story_seconds(cursor, story_id)
+    conn.commit()
+    conn.close()
+
+    # Refit on next use
+    with _models_lock:
+        _models = None
+    return True
+
+def get_story_durations(story_id):
+    """
+    Measured narration lengths of a story
+
+    Returns:
+        list: Dicts with voice, speech_speed, seconds, words and measured_at
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT voice, speech_speed, seconds, words, measured_at
+        FROM story_durations WHERE story_id = ? ORDER BY voice, speech_speed
+    ''', (story_id,))
+    rows = cursor.fetchall()
+    conn.close()
+
+    columns = ('voice', 'speech_speed', 'seconds', 'words', 'measured_at')
+    return [dict(zip(columns, row)) for row in rows]
+
+def fit_duration_models():
+    """
+    Fit seconds = intercept + seconds_per_word * words / speed for each voice
+
+    Speech speed scales the words-per-minute rate, so time per word goes
+    as 1 / speed, while the leading and trailing silence (the intercept)
+    doesn't. The least-squares fit is computed from SQL aggregates, so it
+    costs one scan of story_durations however many measurements there are.
+
+    Returns:
+        dict: voice -> dict with intercept, seconds_per_word, samples and
+            rmse (seconds)
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT voice, COUNT(*),
+               SUM(words / speech_speed), SUM(seconds),
+               SUM((words / speech_speed) * (words / speech_speed)),
+               SUM((words / speech_speed) * seconds), SUM(seconds * seconds)
+        FROM story_durations WHERE words > 0 AND speech_speed > 0
+        GROUP BY voice
+    ''')
+    rows = cursor.fetchall()
+    conn.close()
+
+    models = {}
+    for voice, n, sx, sy, sxx, sxy, syy in rows:
+        variance = n * sxx - sx * sx
+        if n > 1 and variance > 1e-9 * n * sxx:
+            slope = (n * sxy - sx * sy) / variance
+            intercept = (sy - slope * sx) / n
+        else:
+            slope, intercept = None, 0.0
+        if slope is None or slope <= 0 or intercept < 0:
+            # Too few distinct lengths, or a fit that makes no physical sense:
+            # fall back to a plain rate through the origin
+            slope, intercept = sy / sx, 0.0
+        residual = syy - 2 * intercept * sy - 2 * slope * sxy + n * intercept * intercept \
+            + 2 * intercept * slope * sx + slope * slope * sxx
+        models[voice] = {
+            'intercept': intercept,
+            'seconds_per_word': slope,
+            'samples': n,
+            'rmse': math.sqrt(max(residual, 0.0) / n)
+        }
+    return models
+
+def get_duration_models(refresh=False):
+    """Fitted models, cached in memory until a new measurement or model_ttl"""
+    global _models, _models_loaded_at
+    with _models_lock:
+        if refresh or _models is None or time.time() - _models_loaded_at > DURATION_CONFIG['model_ttl']:
+            try:
+                _models = fit_duration_models()
+            except sqlite3.Error:
+                _models = {}  # e.g. the database isn't initialized yet
+            _models_loaded_at = time.time()
+        return _models
+
+def calibrated_duration(text, voice_personality, speech_speed=1.0):
+    """
+    Narration length predicted from this voice's measured narrations
+
+    Returns:
+        float: Seconds, or None if the voice has fewer than min_samples
+            measurements
+    """
+    model = get_duration_models().get(voice_personality)
+    if not model or model['samples'] < DURATION_CONFIG['min_samples'] or speech_speed <= 0:
+        return None
+    return model['intercept'] + model['seconds_per_word'] * count_words(text) / speech_speed
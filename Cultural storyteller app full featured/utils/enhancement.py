@@ -0,0 +1,191 @@
+import re
+import math
+import hashlib
+from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import ENHANCEMENT_CONFIG
+from utils.ai_cache import cached_call
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?।॥])\s+')
+
+def estimate_tokens(text):
+    """
+    Rough token count for a model's BPE tokenizer
+
+    ASCII text averages about four characters per token. Devanagari and
+    other non-Latin scripts get few merges and cost about a token per
+    character, so those characters are counted one each.
+    """
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+def _pack(pieces, separator, max_tokens):
+    """Join consecutive pieces while they fit in max_tokens"""
+    packed = []
+    current = ''
+    for piece in pieces:
+        if current and estimate_tokens(current + separator + piece) > max_tokens:
+            packed.append(current)
+            current = piece
+        else:
+            current = f"{current}{separator}{piece}" if current else piece
+    if current:
+        packed.append(current)
+    return packed
+
+def split_paragraphs(text):
+    """Split text into non-empty paragraphs, breaking up any paragraph over the token budget"""
+    max_tokens = ENHANCEMENT_CONFIG['max_chunk_tokens']
+    paragraphs = []
+
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            paragraphs.append(paragraph)
+            continue
+
+        # Oversized paragraph: pack whole sentences instead, and words of
+        # any sentence that is over the budget on its own
+        pieces = []
+        for sentence in _SENTENCE_END.split(paragraph):
+            if estimate_tokens(sentence) > max_tokens:
+                pieces.extend(_pack(sentence.split(), ' ', max_tokens))
+            else:
+                pieces.append(sentence)
+        paragraphs.extend(_pack(pieces, ' ', max_tokens))
+
+    return paragraphs
+
+def _is_boundary(paragraph):
+    """Content-defined cut point, so an edit only moves nearby chunk boundaries"""
+    digest = hashlib.blake2b(paragraph.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') % ENHANCEMENT_CONFIG['boundary_modulus'] == 0
+
+def chunk_paragraphs(paragraphs):
+    """
+    Group paragraphs into chunks within the token budget
+
+    A chunk ends after a paragraph whose hash marks a boundary (once it has
+    at least min_chunk_tokens) or when the next paragraph would overflow
+    max_chunk_tokens. Boundaries depend only on nearby paragraphs, so
+    editing one paragraph leaves the other chunks, and their cached
+    results, unchanged.
+
+    Returns:
+        list: Lists of paragraphs
+    """
+    max_tokens = ENHANCEMENT_CONFIG['max_chunk_tokens']
+    min_tokens = ENHANCEMENT_CONFIG['min_chunk_tokens']
+    chunks = []
+    current = []
+    tokens = 0
+
+    for paragraph in paragraphs:
+        size = estimate_tokens(paragraph)
+        if current and tokens + size > max_tokens:
+            chunks.append(current)
+            current, tokens = [], 0
+
+        current.append(paragraph)
+        tokens += size
+        if tokens >= min_tokens and _is_boundary(paragraph):
+            chunks.append(current)
+            current, tokens = [], 0
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _similarity(a, b):
+    return SequenceMatcher(None, a.casefold(), b.casefold()).ratio()
+
+def _reconcile(output, overlap, chunk_size):
+    """
+    Drop the enhanced copy of the overlap paragraphs from a chunk's output
+
+    The previous chunk already produced those paragraphs; this chunk only
+    saw them as context.
+    """
+    paragraphs = [p.strip() for p in _PARAGRAPH_BREAK.split(output) if p.strip()]
+    if not overlap:
+        return paragraphs
+
+    # The model kept the paragraph structure: cut by position
+    if len(paragraphs) == len(overlap) + chunk_size:
+        return paragraphs[len(overlap):]
+
+    # Otherwise cut after the paragraph that best matches the last overlap paragraph
+    candidates = paragraphs[:len(overlap) + 1]
+    scores = [_similarity(p, overlap[-1]) for p in candidates]
+    if scores and max(scores) >= 0.5:
+        return paragraphs[scores.index(max(scores)) + 1:]
+    return paragraphs
+
+def enhancement_deadline(text, call_deadline):
+    """
+    Longest enhance_in_chunks() should take for a text
+
+    Chunks run max_workers at a time, each within call_deadline; one extra
+    round is allowed as margin.
+
+    Args:
+        text (str): Story text
+        call_deadline (float): Seconds allowed per provider call
+
+    Returns:
+        float: Seconds
+    """
+    chunks = len(chunk_paragraphs(split_paragraphs(text)))
+    rounds = math.ceil(chunks / ENHANCEMENT_CONFIG['max_workers'])
+    return (rounds + 1) * call_deadline
+
+def enhance_in_chunks(text, enhancement_type, backend, fresh=False):
+    """
+    Enhance a long story chunk by chunk, in parallel (map), and stitch the
+    results back together (reduce)
+
+    Each chunk is sent with the last paragraphs of the previous chunk as
+    context, and per-chunk results are cached, so re-enhancing an edited
+    story only calls the provider for the chunks that changed.
+
+    Args:
+        text (str): Story text
+        enhancement_type (str): Type of enhancement to apply
+        backend: Provider from get_provider()
+        fresh (bool): Bypass the per-chunk cache
+
+    Returns:
+        str: Enhanced story with paragraphs separated by blank lines
+    """
+    overlap_size = ENHANCEMENT_CONFIG['overlap_paragraphs']
+    chunks = chunk_paragraphs(split_paragraphs(text))
+    if not chunks:
+        return text
+
+    jobs = []
+    for i, chunk in enumerate(chunks):
+        overlap = chunks[i - 1][-overlap_size:] if i and overlap_size else []
+        jobs.append((overlap, chunk))
+
+    def enhance_chunk(job):
+        overlap, chunk = job
+        request = '\n\n'.join(overlap + chunk)
+        output = cached_call(
+            'enhance_chunk',
+            {'text': request, 'enhancement_type': enhancement_type, 'model': backend.cache_id},
+            lambda: backend.enhance(request, enhancement_type),
+            fresh=fresh
+        )
+        return _reconcile(output, overlap, len(chunk))
+
+    if len(jobs) == 1:
+        results = [enhance_chunk(jobs[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=ENHANCEMENT_CONFIG['max_workers'],
+                                thread_name_prefix='enhance') as pool:
+            results = list(pool.map(enhance_chunk, jobs))
+
+    return '\n\n'.join(paragraph for paragraphs in results for paragraph in paragraphs)
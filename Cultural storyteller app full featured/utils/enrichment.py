@@ -0,0 +1,205 @@
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import DATABASE_CONFIG, ENRICHMENT_CONFIG
+from utils.ai_content import generate_story_summaries, tag_story_corpus
+from utils.voice_synthesis import estimate_narration_duration
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+_executor = None
+_executor_lock = threading.Lock()
+_queued = set()  # story ids waiting for or being enriched
+
+def _get_executor():
+    """Worker pool for enrichment, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ENRICHMENT_CONFIG['max_workers'],
+                                           thread_name_prefix='enrich')
+        return _executor
+
+def enrich_documents(stories):
+    """
+    Compute summary, suggested tags, moral and narration duration for stories
+
+    Args:
+        stories (list): Dicts with 'content' and optionally 'region' and 'category'
+
+    Returns:
+        list: Enrichment dicts in the same order
+    """
+    contents = [story['content'] for story in stories]
+    contexts = [f"{story.get('region') or ''} {story.get('category') or ''}" for story in stories]
+
+    summaries = generate_story_summaries(contents, ENRICHMENT_CONFIG['summary_length'])
+    tagged = tag_story_corpus(contents, contexts)
+
+    return [
+        {
+            'summary': summary,
+            'suggested_tags': tags,
+            'moral': moral,
+            'narration_seconds': round(estimate_narration_duration(content, ENRICHMENT_CONFIG['voice_personality']), 1)
+        }
+        for content, summary, (tags, moral) in zip(contents, summaries, tagged)
+    ]
+
+def _write_enrichment(cursor, rows):
+    cursor.executemany('''
+        UPDATE stories
+        SET summary = ?, suggested_tags = ?, moral = ?,
+            -- an estimate never replaces a length measured from audio (see utils/durations.py)
+            narration_seconds = CASE WHEN narration_measured THEN narration_seconds ELSE ? END,
+            enriched_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', [
+        (e['summary'], json.dumps(e['suggested_tags']), e['moral'], e['narration_seconds'], story_id)
+        for story_id, e in rows
+    ])
+
+def _load_stories(cursor, story_ids):
+    cursor.execute(f'''
+        SELECT id, content, region, category FROM stories WHERE id IN ({','.join('?' * len(story_ids))})
+    ''', story_ids)
+    return [{'id': r[0], 'content': r[1], 'region': r[2], 'category': r[3]} for r in cursor.fetchall()]
+
+def enrich_story(story_id):
+    """
+    Enrich one story and write the results to its row
+
+    Returns:
+        dict: The enrichment, or None if the story doesn't exist
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    stories = _load_stories(cursor, [story_id])
+    if not stories:
+        conn.close()
+        return None
+
+    enrichment = enrich_documents(stories)[0]
+    _write_enrichment(cursor, [(story_id, enrichment)])
+    conn.commit()
+    conn.close()
+    return enrichment
+
+def _run_queued(story_id):
+    try:
+        return enrich_story(story_id)
+    except Exception:
+        return None  # Left unenriched; the next backfill picks it up
+    finally:
+        with _executor_lock:
+            _queued.discard(story_id)
+
+def enqueue_story_enrichment(story_id):
+    """
+    Enrich a newly published story in the background
+
+    Returns immediately. A story already queued isn't queued twice.
+
+    Returns:
+        Future: Resolves to the enrichment dict (None on failure), or None
+            if the story was already queued
+    """
+    executor = _get_executor()
+    with _executor_lock:
+        if story_id in _queued:
+            return None
+        _queued.add(story_id)
+    return executor.submit(_run_queued, story_id)
+
+def get_story_enrichment(story_id):
+    """
+    Get a story's computed summary, suggested tags, moral and narration duration
+
+    narration_measured tells whether the duration was measured from audio
+    rather than estimated.
+
+    Returns:
+        dict: Enrichment, or None if it hasn't been computed yet
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT summary, suggested_tags, moral, narration_seconds, enriched_at, narration_measured
+        FROM stories WHERE id = ? AND enriched_at IS NOT NULL
+    ''', (story_id,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if not row:
+        return None
+    return {
+        'summary': row[0],
+        'suggested_tags': json.loads(row[1]) if row[1] else [],
+        'moral': row[2],
+        'narration_seconds': row[3],
+        'enriched_at': row[4],
+        'narration_measured': bool(row[5])
+    }
+
+def backfill_enrichment(force=False, progress_callback=None, batch_size=None):
+    """
+    Enrich the existing catalog in bulk
+
+    Stories are processed in batches spread over the worker pool; each batch
+    is written back in one transaction, so an interrupted backfill resumes
+    where it stopped.
+
+    Args:
+        force (bool): Re-enrich stories that already have results
+        progress_callback (callable): Called as progress_callback(checked, total)
+            after each batch, e.g. to drive st.progress
+        batch_size (int): Stories per batch
+
+    Returns:
+        int: Number of stories enriched
+    """
+    batch_size = batch_size or ENRICHMENT_CONFIG['batch_size']
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT id FROM stories {'' if force else 'WHERE enriched_at IS NULL'} ORDER BY id
+    ''')
+    story_ids = [row[0] for row in cursor.fetchall()]
+    total = len(story_ids)
+
+    # Each worker takes a slice of the batch
+    workers = ENRICHMENT_CONFIG['max_workers']
+    executor = _get_executor()
+
+    done = 0
+    try:
+        for start in range(0, total, batch_size):
+            # Stories deleted since the ids were read are skipped
+            stories = _load_stories(cursor, story_ids[start:start + batch_size])
+            if stories:
+                step = -(-len(stories) // workers)
+                slices = [stories[i:i + step] for i in range(0, len(stories), step)]
+                enrichments = [e for part in executor.map(enrich_documents, slices) for e in part]
+
+                _write_enrichment(cursor, [(story['id'], e) for story, e in zip(stories, enrichments)])
+                conn.commit()
+                done += len(stories)
+
+            if progress_callback:
+                progress_callback(min(start + batch_size, total), total)
+    finally:
+        conn.close()
+
+    return done
+
+if __name__ == '__main__':
+    # Deploy step after upgrading an existing catalog: python -m utils.enrichment [--force]
+    import sys
+    import time
+
+    started = time.time()
+    count = backfill_enrichment(force='--force' in sys.argv[1:],
+                                progress_callback=lambda checked, total: print(f"Checked {checked}/{total} stories"))
+    print(f"Enriched {count} stories in {time.time() - started:.1f}s")
@@ -0,0 +1,263 @@
+import io
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import DATABASE_CONFIG, IMAGE_STORE_CONFIG
+from utils.process_pools import get_process_pool, submit_job
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+def _get_pool():
+    """Process pool for resizing, created on first use"""
+    return get_process_pool('image_store', IMAGE_STORE_CONFIG['max_workers'])
+
+def _shard(digest):
+    """Sharded relative directory for a digest, e.g. 'ab/cd'"""
+    return os.path.join(digest[:2], digest[2:4])
+
+def _original_path(digest):
+    return os.path.join(IMAGE_STORE_CONFIG['root'], 'objects', _shard(digest), digest)
+
+def _variant_path(digest, name):
+    return os.path.join(IMAGE_STORE_CONFIG['root'], 'variants', _shard(digest), f"{digest}_{name}.webp")
+
+def _variant_specs(digest):
+    """(path, max width, square thumbnail?) for every variant of an image"""
+    specs = [(_variant_path(digest, f"w{width}"), width, False) for width in IMAGE_STORE_CONFIG['widths']]
+    specs.append((_variant_path(digest, 'thumb'), IMAGE_STORE_CONFIG['thumbnail_size'], True))
+    return specs
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _render_variants(original, specs, quality):
+    """
+    Resize one image into its variants (runs in a worker process)
+
+    Returns:
+        tuple: (mime type, width, height) of the original
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(original) as image:
+        mime = Image.MIME.get(image.format, 'application/octet-stream')
+        image = ImageOps.exif_transpose(image)
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+        for path, size, square in specs:
+            if os.path.exists(path):
+                continue
+            if square:
+                variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            elif width > size:
+                variant = image.resize((size, round(height * size / width)), Image.LANCZOS)
+            else:
+                variant = image  # Never upscale
+
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=quality, method=4)
+            _write_atomic(path, buffer.getvalue())
+
+    return mime, width, height
+
+def _store_original(data):
+    """Write image bytes under their sha256 unless already stored; return the digest"""
+    if len(data) > IMAGE_STORE_CONFIG['max_bytes']:
+        raise ValueError("Image is larger than the configured limit")
+
+    digest = hashlib.sha256(data).hexdigest()
+    path = _original_path(digest)
+    if not os.path.exists(path):
+        _write_atomic(path, data)
+    return digest
+
+def _try_fetch(url):
+    """Download an image, or None if it can't be fetched"""
+    try:
+        response = requests.get(url, timeout=IMAGE_STORE_CONFIG['download_timeout'])
+        response.raise_for_status()
+        return response.content
+    except requests.RequestException:
+        return None
+
+def ingest_images(sources):
+    """
+    Add images to the store and render their variants
+
+    Each source is ingested once: identical bytes share one stored file,
+    and URLs already fetched are resolved from the database without a
+    download. Variants are rendered in parallel in the process pool.
+
+    Args:
+        sources (list): Image bytes, file-like objects (e.g. Streamlit
+            uploads) or http(s) URLs
+
+    Returns:
+        list: sha256 digests in the same order; None for sources that failed
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+
+    # Download URLs we haven't ingested before, concurrently
+    urls = list(dict.fromkeys(s for s in sources if isinstance(s, str)))
+    resolved = {}
+    for url in urls:
+        cursor.execute('SELECT digest FROM image_sources WHERE source = ?', (url,))
+        row = cursor.fetchone()
+        if row:
+            resolved[url] = row[0]
+
+    to_fetch = [url for url in urls if url not in resolved]
+    new_sources = []
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=IMAGE_STORE_CONFIG['download_workers']) as downloads:
+            fetched = downloads.map(_try_fetch, to_fetch)
+            for url, data in zip(to_fetch, fetched):
+                try:
+                    resolved[url] = _store_original(data) if data is not None else None
+                except (ValueError, OSError):
+                    resolved[url] = None
+                if resolved[url]:
+                    new_sources.append((url, resolved[url]))
+
+    digests = []
+    for source in sources:
+        if isinstance(source, str):
+            digests.append(resolved.get(source))
+            continue
+        try:
+            data = source if isinstance(source, bytes) else source.getvalue()
+            digests.append(_store_original(data))
+        except (ValueError, OSError):
+            digests.append(None)
+
+    # Render variants for images the database doesn't know yet
+    known = set()
+    pending = [d for d in dict.fromkeys(digests) if d]
+    if pending:
+        cursor.execute(f'''
+            SELECT digest FROM image_objects WHERE digest IN ({','.join('?' * len(pending))})
+        ''', pending)
+        known = {row[0] for row in cursor.fetchall()}
+
+    to_render = [digest for digest in pending if digest not in known]
+    futures = {
+        digest: submit_job(_get_pool, _render_variants, _original_path(digest), _variant_specs(digest),
+                            IMAGE_STORE_CONFIG['webp_quality'])
+        for digest in to_render
+    }
+
+    failed = set()
+    for digest, future in futures.items():
+        try:
+            mime, width, height = future.result()
+        except Exception:
+            failed.add(digest)  # Not a decodable image
+            continue
+        cursor.execute('''
+            INSERT OR IGNORE INTO image_objects (digest, mime, width, height, size, refcount, created_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?)
+        ''', (digest, mime, width, height, os.path.getsize(_original_path(digest)), time.time()))
+
+    cursor.executemany('''
+        INSERT OR IGNORE INTO image_sources (source, digest) VALUES (?, ?)
+    ''', [(source, digest) for source, digest in new_sources if digest not in failed])
+
+    conn.commit()
+    conn.close()
+
+    for digest in failed:
+        _delete_files(digest)
+    return [None if digest in failed else digest for digest in digests]
+
+def add_image_references(cursor, digests):
+    """Count one more reference (e.g. a story) to each image"""
+    cursor.executemany('UPDATE image_objects SET refcount = refcount + 1 WHERE digest = ?',
+                       [(digest,) for digest in digests])
+
+def release_image_references(cursor, digests):
+    """Drop one reference to each image; unreferenced files go at the next collection"""
+    cursor.executemany('UPDATE image_objects SET refcount = MAX(refcount - 1, 0) WHERE digest = ?',
+                       [(digest,) for digest in digests])
+
+def get_image_path(digest, width=None):
+    """
+    Local file to display an image at a given width
+
+    Args:
+        digest (str): Image sha256
+        width (int): Display width in pixels; None for the largest variant
+
+    Returns:
+        str: Path to the smallest variant at least ``width`` wide, or the
+            original if no variant exists
+    """
+    widths = sorted(IMAGE_STORE_CONFIG['widths'])
+    if width is not None:
+        widths = [w for w in widths if w >= width] or widths[-1:]
+    else:
+        widths = widths[::-1]
+
+    for candidate in widths:
+        path = _variant_path(digest, f"w{candidate}")
+        if os.path.exists(path):
+            return path
+    return _original_path(digest)
+
+def get_thumbnail_path(digest):
+    """Local path of an image's square WebP thumbnail"""
+    path = _variant_path(digest, 'thumb')
+    return path if os.path.exists(path) else get_image_path(digest, IMAGE_STORE_CONFIG['thumbnail_size'])
+
+def _delete_files(digest):
+    for path in [_original_path(digest)] + [spec[0] for spec in _variant_specs(digest)]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def collect_unreferenced_images(min_age=None):
+    """
+    Delete images no story references, once they are older than min_age
+
+    The grace period keeps freshly generated previews until they are saved.
+
+    Returns:
+        int: Number of images removed
+    """
+    min_age = IMAGE_STORE_CONFIG['orphan_grace_period'] if min_age is None else min_age
+
+    # One write transaction: a digest re-referenced after the SELECT can't
+    # be deleted, and only rows actually deleted have their files removed
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT digest FROM image_objects WHERE refcount = 0 AND created_at < ?',
+                       (time.time() - min_age,))
+        orphans = []
+        for (digest,) in cursor.fetchall():
+            cursor.execute('DELETE FROM image_objects WHERE digest = ? AND refcount = 0', (digest,))
+            if cursor.rowcount:
+                cursor.execute('DELETE FROM image_sources WHERE digest = ?', (digest,))
+                orphans.append(digest)
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+
+    for digest in orphans:
+        _delete_files(digest)
+    return len(orphans)
@@ -0,0 +1,329 @@
+import sqlite3
+import json
+import time
+import atexit
+import threading
+from collections import deque
+from utils.sessions import invalidate_user_sessions
+from utils.config import DATABASE_CONFIG, INTERACTION_LOG_CONFIG
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+# Events waiting to be appended to interaction_events, and the batch
+# being written (still visible to has_interaction until it is committed)
+_pending = deque()
+_in_flight = []
+_pending_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_compact_lock = threading.Lock()
+_wakeup = threading.Event()
+_writer = None
+_writer_lock = threading.Lock()
+
+def _ensure_writer():
+    """Start the background writer/compactor thread on first use"""
+    global _writer
+    if _writer is not None:
+        return
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name="interaction-log", daemon=True)
+            _writer.start()
+
+def _writer_loop():
+    """Flush pending events in batches and compact the log periodically"""
+    last_compaction = time.monotonic()
+
+    while True:
+        _wakeup.wait(INTERACTION_LOG_CONFIG['flush_interval'])
+        _wakeup.clear()
+
+        try:
+            flush_events()
+            if time.monotonic() - last_compaction >= INTERACTION_LOG_CONFIG['compact_interval']:
+                compact_events()
+                last_compaction = time.monotonic()
+        except sqlite3.Error:
+            pass  # Retried on the next tick; pending events stay queued
+
+def record_interaction(user_id, target_type, target_id, interaction_type, active=True):
+    """
+    Append an interaction event (cheap, in-memory; written in batches)
+
+    Args:
+        user_id (int): Acting user
+        target_type (str): 'story', 'user', ...
+        target_id (int): Target ID
+        interaction_type (str): 'like', 'follow', ...
+        active (bool): True to set the interaction, False to undo it
+    """
+    event = (user_id, target_type, target_id, interaction_type, 1 if active else -1, time.time())
+
+    with _pending_lock:
+        _pending.append(event)
+        backlog = len(_pending)
+
+    _ensure_writer()
+    if backlog >= INTERACTION_LOG_CONFIG['flush_batch_size']:
+        _wakeup.set()
+
+def flush_events():
+    """
+    Append all pending events to the event log in one batch
+
+    Returns:
+        int: Number of events written
+    """
+    global _in_flight
+
+    with _flush_lock:
+        with _pending_lock:
+            if not _pending:
+                return 0
+            batch = _in_flight = list(_pending)
+            _pending.clear()
+
+        try:
+            conn = sqlite3.connect(DATABASE_FILE)
+            conn.executemany('''
+                INSERT INTO interaction_events (user_id, target_type, target_id, interaction_type, delta, created_at)
+                VALUES (?, ?, ?, ?, ?, datetime(?, 'unixepoch'))
+            ''', batch)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error:
+            # Put the batch back in front so ordering is preserved
+            with _pending_lock:
+                _pending.extendleft(reversed(batch))
+                _in_flight = []
+            raise
+
+        with _pending_lock:
+            _in_flight = []
+
+    return len(batch)
+
+def has_interaction(user_id, target_type, target_id, interaction_type):
+    """
+    Check the current state of an interaction
+
+    Looks at pending events first (including a batch being written), then
+    uncompacted log entries, then the compacted per-user snapshot.
+
+    Returns:
+        bool: True if the interaction is currently set
+    """
+    key = (user_id, target_type, target_id, interaction_type)
+
+    with _pending_lock:
+        for events in (_pending, _in_flight):
+            for event in reversed(events):
+                if event[:4] == key:
+                    return event[4] > 0
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT delta FROM interaction_events
+        WHERE user_id = ? AND target_type = ? AND target_id = ? AND interaction_type = ?
+          AND seq > (SELECT last_seq FROM interaction_compaction WHERE id = 1)
+        ORDER BY seq DESC LIMIT 1
+    ''', key)
+    row = cursor.fetchone()
+
+    if row is None:
+        cursor.execute('''
+            SELECT active FROM user_interaction_state
+            WHERE user_id = ? AND target_type = ? AND target_id = ? AND interaction_type = ?
+        ''', key)
+        row = cursor.fetchone()
+
+    conn.close()
+    return bool(row and row[0] > 0)
+
+def compact_events(batch_size=None):
+    """
+    Fold new log events into per-target counters and per-user state
+
+    Only state changes move a counter, so repeated likes never double count.
+    Counters are then projected onto stories.likes and users.stats. Each
+    batch is one transaction together with the watermark update.
+
+    Args:
+        batch_size (int): Events folded per transaction
+
+    Returns:
+        int: Number of events folded
+    """
+    batch_size = batch_size or INTERACTION_LOG_CONFIG['compact_batch_size']
+
+    with _compact_lock:
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        folded = _fold_events(conn, cursor, batch_size)
+        conn.close()
+
+    return folded
+
+def _fold_events(conn, cursor, batch_size, commit=True):
+    """
+    Fold every event past the watermark, batch by batch
+
+    Args:
+        commit (bool): Commit after each batch; otherwise the caller
+            commits everything as one transaction
+
+    Returns:
+        int: Number of events folded
+    """
+    folded = 0
+
+    while True:
+        cursor.execute('SELECT last_seq FROM interaction_compaction WHERE id = 1')
+        last_seq = cursor.fetchone()[0]
+
+        cursor.execute('''
+            SELECT seq, user_id, target_type, target_id, interaction_type, delta
+            FROM interaction_events
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        ''', (last_seq, batch_size))
+        events = cursor.fetchall()
+        if not events:
+            break
+
+        _fold_batch(cursor, events)
+        cursor.execute('UPDATE interaction_compaction SET last_seq = ? WHERE id = 1', (events[-1][0],))
+        if commit:
+            conn.commit()
+        folded += len(events)
+
+    return folded
+
+def _fold_batch(cursor, events):
+    """Apply a batch of events to state, counters and their projections"""
+    keys = {event[1:5] for event in events}
+
+    state = {}
+    for key in keys:
+        cursor.execute('''
+            SELECT active FROM user_interaction_state
+            WHERE user_id = ? AND target_type = ? AND target_id = ? AND interaction_type = ?
+        ''', key)
+        row = cursor.fetchone()
+        state[key] = row[0] if row else 0
+
+    counter_deltas = {}
+    for _, user_id, target_type, target_id, interaction_type, delta in events:
+        key = (user_id, target_type, target_id, interaction_type)
+        active = 1 if delta > 0 else 0
+        change = active - state[key]
+        state[key] = active
+        if change:
+            target = (target_type, target_id, interaction_type)
+            counter_deltas[target] = counter_deltas.get(target, 0) + change
+
+    cursor.executemany('''
+        INSERT INTO user_interaction_state (user_id, target_type, target_id, interaction_type, active)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, target_type, target_id, interaction_type)
+        DO UPDATE SET active = excluded.active, updated_at = CURRENT_TIMESTAMP
+    ''', [key + (active,) for key, active in state.items()])
+
+    cursor.executemany('''
+        INSERT INTO interaction_counters (target_type, target_id, interaction_type, count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (target_type, target_id, interaction_type)
+        DO UPDATE SET count = count + excluded.count
+    ''', [target + (delta,) for target, delta in counter_deltas.items() if delta])
+
+    story_ids = sorted({t[1] for t in counter_deltas if t[0] == 'story' and t[2] == 'like'})
+    user_ids = sorted({t[1] for t in counter_deltas if t[0] == 'user' and t[2] == 'follow'})
+    _project_counters(cursor, story_ids, user_ids)
+
+def _project_counters(cursor, story_ids, user_ids):
+    """Copy compacted counters onto stories.likes and users.stats"""
+    authors = set()
+
+    for story_id in story_ids:
+        cursor.execute('''
+            UPDATE stories SET likes = COALESCE((
+                SELECT count FROM interaction_counters
+                WHERE target_type = 'story' AND target_id = stories.id AND interaction_type = 'like'
+            ), 0)
+            WHERE id = ?
+        ''', (story_id,))
+        cursor.execute('SELECT author FROM stories WHERE id = ?', (story_id,))
+        row = cursor.fetchone()
+        if row:
+            authors.add(row[0])
+
+    for username in authors:
+        cursor.execute('SELECT COALESCE(SUM(likes), 0) FROM stories WHERE author = ?', (username,))
+        likes_received = cursor.fetchone()[0]
+        _update_user_stats(cursor, 'username = ?', username, {'likes_received': likes_received})
+
+    for user_id in user_ids:
+        cursor.execute('''
+            SELECT count FROM interaction_counters
+            WHERE target_type = 'user' AND target_id = ? AND interaction_type = 'follow'
+        ''', (user_id,))
+        row = cursor.fetchone()
+        _update_user_stats(cursor, 'id = ?', user_id, {'followers': row[0] if row else 0})
+
+def _update_user_stats(cursor, where, value, updates):
+    """Merge values into a user's JSON stats"""
+    cursor.execute(f'SELECT id, stats FROM users WHERE {where}', (value,))
+    row = cursor.fetchone()
+    if not row:
+        return
+
+    stats = json.loads(row[1]) if row[1] else {}
+    stats.update(updates)
+    cursor.execute('UPDATE users SET stats = ? WHERE id = ?', (json.dumps(stats), row[0]))
+    invalidate_user_sessions(row[0], cursor)
+
+def rebuild_interaction_counters():
+    """
+    Replay the whole event log to rebuild counters and user state
+
+    The reset and the replay are one transaction, so readers keep seeing
+    the old counts until the rebuilt ones are committed.
+
+    Returns:
+        int: Number of events replayed
+    """
+    flush_events()
+
+    with _compact_lock:
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+
+        cursor.execute('DELETE FROM interaction_counters')
+        cursor.execute('DELETE FROM user_interaction_state')
+        cursor.execute('UPDATE interaction_compaction SET last_seq = 0 WHERE id = 1')
+        cursor.execute("UPDATE stories SET likes = 0")
+
+        cursor.execute('SELECT id, stats FROM users')
+        for user_id, stats in cursor.fetchall():
+            stats = json.loads(stats) if stats else {}
+            stats.update({'likes_received': 0, 'followers': 0})
+            cursor.execute('UPDATE users SET stats = ? WHERE id = ?', (json.dumps(stats), user_id))
+            invalidate_user_sessions(user_id, cursor)
+
+        replayed = _fold_events(conn, cursor, INTERACTION_LOG_CONFIG['compact_batch_size'], commit=False)
+        conn.commit()
+        conn.close()
+
+    return replayed
+
+@atexit.register
+def _flush_on_exit():
+    """Don't lose buffered events on a clean shutdown"""
+    try:
+        flush_events()
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,198 @@
+import string
+
+# Stands in for undecodable \uXXXX escapes and unpaired surrogates
+_REPLACEMENT = '\ufffd'
+
+_SIMPLE_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'
+}
+
+class JSONFieldStreamParser:
+    """
+    Incremental parser for a flat JSON object of string fields
+
+    Feed it text fragments as they arrive from a token stream and it returns
+    the newly decoded characters of each top-level string value, so a UI can
+    render ``title``, ``description`` and ``content`` while the model is still
+    writing. Anything before the opening brace (e.g. a Markdown code fence)
+    is ignored, escapes split across fragments are handled, and non-string
+    values are skipped.
+
+    Example:
+        parser = JSONFieldStreamParser()
+        for fragment in fragments:
+            for field, text in parser.feed(fragment):
+                ...
+        story = parser.result()
+    """
+
+    def __init__(self):
+        self._state = 'start'
+        self._key = []
+        self._field = None
+        self._escape = None  # None, '' after a backslash, or partial \\uXXXX hex
+        self._high_surrogate = None
+        self._nesting = 0
+        self._in_nested_string = False
+        self._fields = {}
+
+    def feed(self, fragment):
+        """
+        Consume a fragment of the JSON text
+
+        Args:
+            fragment (str): Next piece of the streamed response
+
+        Returns:
+            list: (field, text) tuples decoded from this fragment, in order
+        """
+        events = []
+        buffer = []
+
+        def flush():
+            if buffer:
+                text = ''.join(buffer)
+                self._fields[self._field] = self._fields.get(self._field, '') + text
+                events.append((self._field, text))
+                buffer.clear()
+
+        for ch in fragment:
+            state = self._state
+
+            if state == 'start':
+                if ch == '{':
+                    self._state = 'seek_key'
+
+            elif state == 'seek_key':
+                if ch == '"':
+                    self._key = []
+                    self._state = 'in_key'
+                elif ch == '}':
+                    self._state = 'done'
+
+            elif state == 'in_key':
+                if self._escape is not None:
+                    self._key.append(_SIMPLE_ESCAPES.get(ch, ch))
+                    self._escape = None
+                elif ch == '\\':
+                    self._escape = ''
+                elif ch == '"':
+                    self._state = 'seek_colon'
+                else:
+                    self._key.append(ch)
+
+            elif state == 'seek_colon':
+                if ch == ':':
+                    self._state = 'seek_value'
+
+            elif state == 'seek_value':
+                if ch == '"':
+                    self._field = ''.join(self._key)
+                    self._fields.setdefault(self._field, '')
+                    self._state = 'in_value'
+                elif not ch.isspace():
+                    self._nesting = 1 if ch in '[{' else 0
+                    self._state = 'other_value'
+
+            elif state == 'in_value':
+                decoded, ended = self._decode_value_char(ch)
+                if decoded:
+                    buffer.append(decoded)
+                if ended:
+                    flush()
+                    self._state = 'seek_comma'
+
+            elif state == 'other_value':
+                # Skip numbers, booleans, arrays and objects we don't render
+                if self._in_nested_string:
+                    if self._escape is not None:
+                        self._escape = None
+                    elif ch == '\\':
+                        self._escape = ''
+                    elif ch == '"':
+                        self._in_nested_string = False
+                elif ch == '"':
+                    self._in_nested_string = True
+                elif ch in '[{':
+                    self._nesting += 1
+                elif ch in ']}':
+                    if self._nesting == 0:
+                        self._state = 'done'
+                    else:
+                        self._nesting -= 1
+                elif ch == ',' and self._nesting == 0:
+                    self._state = 'seek_key'
+
+            elif state == 'seek_comma':
+                if ch == ',':
+                    self._state = 'seek_key'
+                elif ch == '}':
+                    self._state = 'done'
+
+        if self._state == 'in_value':
+            flush()
+        return events
+
+    def _decode_value_char(self, ch):
+        """
+        Decode one character of a string value
+
+        Returns:
+            tuple: (decoded text, True if ch closed the string)
+        """
+        if self._escape is None:
+            if ch == '\\':
+                self._escape = ''
+                return '', False
+            if ch == '"':
+                # A high surrogate left waiting for its pair is replaced
+                dangling = _REPLACEMENT if self._high_surrogate is not None else ''
+                self._high_surrogate = None
+                return dangling, True
+            return self._combine_surrogate(ch), False
+
+        if self._escape == '':
+            if ch == 'u':
+                self._escape = 'u'
+                return '', False
+            self._escape = None
+            return self._combine_surrogate(_SIMPLE_ESCAPES.get(ch, ch)), False
+
+        # Collecting the four hex digits of a \uXXXX escape
+        if ch not in string.hexdigits:
+            # Invalid escape: replace it and read ch as ordinary text
+            self._escape = None
+            replacement = self._combine_surrogate(_REPLACEMENT)
+            decoded, ended = self._decode_value_char(ch)
+            return replacement + decoded, ended
+        self._escape += ch
+        if len(self._escape) < 5:
+            return '', False
+        code = int(self._escape[1:], 16)
+        self._escape = None
+        return self._combine_surrogate(chr(code)), False
+
+    def _combine_surrogate(self, ch):
+        """Join UTF-16 surrogate pairs produced by \\u escapes, replacing unpaired halves"""
+        code = ord(ch)
+        dangling = _REPLACEMENT if self._high_surrogate is not None else ''
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return dangling
+        if 0xDC00 <= code <= 0xDFFF:
+            if self._high_surrogate is None:
+                return _REPLACEMENT
+            high, self._high_surrogate = self._high_surrogate, None
+            return chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00))
+        self._high_surrogate = None
+        return dangling + ch
+
+    @property
+    def done(self):
+        """True once the closing brace of the object has been seen"""
+        return self._state == 'done'
+
+    def result(self):
+        """Get every string field decoded so far"""
+        return dict(self._fields)
@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import threading
+import unicodedata
+from collections import Counter
+from utils.config import KEYWORD_CONFIG
+
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+
+# Keyword -> tags it suggests. Whole words only, so inflections are listed.
+TAG_KEYWORDS = {
+    'akbar': ['Mughal', 'Emperor', 'Historical', 'Wisdom'],
+    'birbal': ['Akbar-Birbal', 'Wit', 'Court', 'Wisdom'],
+    'hanuman': ['Mythology', 'Devotion', 'Ramayana', 'Spiritual'],
+    'rama': ['Ramayana', 'Mythology', 'Dharma', 'Epic'],
+    'ram': ['Ramayana', 'Mythology', 'Dharma', 'Epic'],
+    'ramayana': ['Ramayana', 'Mythology', 'Epic'],
+    'sita': ['Ramayana', 'Mythology', 'Epic'],
+    'lakshman': ['Ramayana', 'Mythology', 'Epic'],
+    'ravana': ['Ramayana', 'Mythology', 'Epic'],
+    'krishna': ['Mythology', 'Mahabharata', 'Divine', 'Wisdom'],
+    'arjuna': ['Mahabharata', 'Mythology', 'Epic', 'Heroic'],
+    'pandavas': ['Mahabharata', 'Mythology', 'Epic'],
+    'kauravas': ['Mahabharata', 'Mythology', 'Epic'],
+    'mahabharata': ['Mahabharata', 'Mythology', 'Epic'],
+    'bhagavad gita': ['Mahabharata', 'Spiritual', 'Philosophy'],
+    'shiva': ['Mythology', 'Divine', 'Spiritual'],
+    'ganesha': ['Mythology', 'Divine', 'Wisdom'],
+    'durga': ['Mythology', 'Divine', 'Heroic'],
+    'vishnu': ['Mythology', 'Divine'],
+    'narada': ['Mythology', 'Divine', 'Wit'],
+    'panchatantra': ['Panchatantra', 'Fable', 'Moral'],
+    'jataka': ['Jataka', 'Buddhist', 'Moral', 'Fable'],
+    'buddha': ['Buddhist', 'Spiritual', 'Wisdom'],
+    'tenali raman': ['Tenali Raman', 'Wit', 'Court', 'Wisdom'],
+    'vikram': ['Vikram-Betaal', 'Folk Tale', 'Mystery'],
+    'betaal': ['Vikram-Betaal', 'Folk Tale', 'Mystery'],
+    'shivaji': ['Maratha', 'Historical', 'Heroic'],
+    'rani lakshmibai': ['Historical', 'Heroic', 'Freedom Struggle'],
+    'ashoka': ['Mauryan', 'Historical', 'Emperor'],
+    'chanakya': ['Mauryan', 'Historical', 'Wisdom', 'Strategy'],
+    'mughal': ['Mughal', 'Historical'],
+    'emperor': ['Royal', 'Historical'],
+    'king': ['Royal', 'Folk Tale'],
+    'queen': ['Royal', 'Folk Tale'],
+    'palace': ['Royal', 'Historical', 'Architecture'],
+    'fort': ['Historical', 'Architecture'],
+    'temple': ['Spiritual', 'Architecture', 'Religious'],
+    'court': ['Royal', 'Justice', 'Historical'],
+    'devotion': ['Spiritual', 'Faith', 'Religious'],
+    'devotee': ['Spiritual', 'Faith', 'Religious'],
+    'sage': ['Spiritual', 'Wisdom'],
+    'guru': ['Teaching', 'Wisdom', 'Spiritual'],
+    'wisdom': ['Moral', 'Teaching', 'Philosophy'],
+    'wise': ['Moral', 'Teaching', 'Philosophy'],
+    'brave': ['Heroic', 'Courage', 'Adventure'],
+    'bravery': ['Heroic', 'Courage', 'Adventure'],
+    'warrior': ['Heroic', 'Courage', 'Adventure'],
+    'battle': ['Heroic', 'Adventure', 'Historical'],
+    'princess': ['Royal', 'Heroic', 'Historical'],
+    'prince': ['Royal', 'Heroic', 'Folk Tale'],
+    'merchant': ['Trade', 'Commerce', 'Social'],
+    'merchants': ['Trade', 'Commerce', 'Social'],
+    'trader': ['Trade', 'Commerce', 'Social'],
+    'village': ['Rural', 'Folk Tale', 'Social'],
+    'farmer': ['Rural', 'Folk Tale', 'Social'],
+    'monsoon': ['Nature', 'Rural'],
+    'river': ['Nature'],
+    'forest': ['Nature', 'Adventure'],
+    'tiger': ['Animals', 'Nature', 'Fable'],
+    'elephant': ['Animals', 'Nature', 'Fable'],
+    'monkey': ['Animals', 'Fable'],
+    'crow': ['Animals', 'Fable'],
+    'jackal': ['Animals', 'Fable', 'Panchatantra'],
+    'diwali': ['Festival', 'Diwali', 'Celebration'],
+    'holi': ['Festival', 'Holi', 'Celebration'],
+    'pongal': ['Festival', 'South Indian', 'Harvest'],
+    'onam': ['Festival', 'Kerala', 'Harvest'],
+    'durga puja': ['Festival', 'Bengali', 'Religious'],
+    'राम': ['Ramayana', 'Mythology', 'Dharma', 'Epic'],
+    'कृष्ण': ['Mythology', 'Mahabharata', 'Divine', 'Wisdom'],
+    'हनुमान': ['Mythology', 'Devotion', 'Ramayana', 'Spiritual'],
+    'अकबर': ['Mughal', 'Emperor', 'Historical', 'Wisdom'],
+    'बीरबल': ['Akbar-Birbal', 'Wit', 'Court', 'Wisdom'],
+    'राजा': ['Royal', 'Folk Tale'],
+    'रानी': ['Royal', 'Folk Tale']
+}
+
+# Keyword -> moral; the earliest matching entry wins
+MORAL_KEYWORDS = {
+    'justice': "True justice considers all perspectives and seeks fair solutions for everyone involved.",
+    'wisdom': "Wisdom lies not just in knowledge, but in the compassionate application of that knowledge.",
+    'devotion': "Pure devotion seeks nothing in return and finds joy in selfless service.",
+    'honesty': "Honesty and transparent communication prevent misunderstandings and build trust.",
+    'honest': "Honesty and transparent communication prevent misunderstandings and build trust.",
+    'courage': "True courage is not the absence of fear, but the determination to do what is right despite fear.",
+    'humility': "Humility opens the door to learning and growth, while pride closes it.",
+    'friendship': "Genuine friendship is built on mutual respect, understanding, and shared values.",
+    'greed': "Greed blinds us to what we already have and often costs us everything.",
+    'patience': "Patience turns the hardest trials into lasting rewards.",
+    'kindness': "Kindness given freely returns to us in ways we cannot foresee.",
+    'compassion': "Compassion for every living being is the root of dharma.",
+    'unity': "Together we stand strong; divided we are easily defeated.",
+    'forgiveness': "Forgiveness frees both the wronged and the wrongdoer.",
+    'pride': "Pride comes before a fall; humility keeps us steady.",
+    'cleverness': "A quick and clever mind can overcome even great strength.",
+    'duty': "Doing one's duty without attachment to reward brings true peace.",
+    'dharma': "Following dharma, even when it is hard, sustains the world.",
+    'sacrifice': "Selfless sacrifice for others is the highest form of love."
+}
+
+def normalize(text):
+    """NFKC-normalize and casefold text so keywords match regardless of form or case"""
+    return unicodedata.normalize('NFKC', text).casefold()
+
+def tokenize(text):
+    """Split normalized text into word tokens (Indic combining marks included)"""
+    return _TOKEN_RE.findall(normalize(text))
+
+class KeywordMatcher:
+    """
+    Aho-Corasick automaton over word tokens
+
+    Patterns are phrases of one or more whole words. Matching runs over the
+    token stream, so it is word-boundary aware by construction and finds
+    every pattern in one pass however large the vocabulary is.
+
+    Args:
+        phrases (iterable): Keyword phrases; a match reports the phrase's
+            index in this sequence
+    """
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self.size = 0
+
+        for index, phrase in enumerate(phrases):
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            state = 0
+            for token in tokens:
+                nxt = self._goto[state].get(token)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][token] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = nxt
+            self._output[state].append(index)
+            self.size += 1
+
+        self._alphabet = frozenset(token for edges in self._goto for token in edges)
+
+        # Breadth-first failure links; outputs inherit along them
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(token, 0)
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def count(self, text):
+        """
+        Count pattern occurrences in text
+
+        Returns:
+            Counter: Phrase index -> number of occurrences
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        alphabet = self._alphabet
+        counts = Counter()
+
+        # Only words that occur in some pattern can move the automaton; a
+        # gap between them sends it back to the root
+        state = 0
+        previous = -2
+        for position, token in [(i, t) for i, t in enumerate(tokenize(text)) if t in alphabet]:
+            if position != previous + 1:
+                state = 0
+            previous = position
+
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if state:
+                for index in output[state]:
+                    counts[index] += 1
+
+        return counts
+
+def load_vocabulary(path=None):
+    """
+    Built-in keyword vocabulary merged with the external vocabulary file
+
+    The file is JSON with optional "tags" ({keyword: [tags]}) and "morals"
+    ({keyword: moral}) objects; its entries extend or override the built-ins.
+
+    Returns:
+        tuple: (tag keywords dict, moral keywords dict)
+    """
+    tags = dict(TAG_KEYWORDS)
+    morals = dict(MORAL_KEYWORDS)
+
+    path = path or KEYWORD_CONFIG['vocabulary_file']
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            extra = json.load(f)
+        tags.update(extra.get('tags', {}))
+        morals.update(extra.get('morals', {}))
+
+    return tags, morals
+
+class KeywordEngine:
+    """Shared matcher for tag and moral keywords"""
+
+    def __init__(self, tags, morals):
+        self.tag_keywords = list(tags.items())
+        self.moral_keywords = list(morals.items())
+        self.matcher = KeywordMatcher([k for k, _ in self.tag_keywords] + [k for k, _ in self.moral_keywords])
+
+    def analyze(self, text):
+        """
+        Scan text once for both vocabularies
+
+        Returns:
+            tuple: (Counter of tag -> weighted hits, moral or None)
+        """
+        counts = self.matcher.count(text)
+        n_tags = len(self.tag_keywords)
+
+        tag_scores = Counter()
+        moral_index = None
+        for index, hits in counts.items():
+            if index < n_tags:
+                for tag in self.tag_keywords[index][1]:
+                    tag_scores[tag] += hits
+            elif moral_index is None or index < moral_index:
+                moral_index = index
+
+        moral = self.moral_keywords[moral_index - n_tags][1] if moral_index is not None else None
+        return tag_scores, moral
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_keyword_engine():
+    """Get the shared keyword engine, compiling it on first use"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = KeywordEngine(*load_vocabulary())
+    return _engine
+
+def reload_keyword_vocabulary(path=None):
+    """Recompile the shared engine, e.g. after editing the vocabulary file"""
+    global _engine
+    engine = KeywordEngine(*load_vocabulary(path))
+    with _engine_lock:
+        _engine = engine
+    return engine
@@ -0,0 +1,239 @@
+import os
+import json
+import time
+import uuid
+import wave
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from importlib import metadata
+from utils.config import DATABASE_CONFIG, NARRATION_CACHE_CONFIG, TTS_POOL_CONFIG
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+def _engine_version():
+    try:
+        return metadata.version('pyttsx3')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+ENGINE_VERSION = _engine_version()
+
+# Narrations in use in this process, by key, with how many users hold each
+_pins = {}
+_pins_lock = threading.Lock()
+
+@contextmanager
+def pin_narrations(keys):
+    """
+    Keep narrations from being evicted while they are in use
+
+    E.g. the chunks of a story until they are joined. Pins are counted, so
+    overlapping users of one key don't release it early.
+
+    Args:
+        keys (list): Keys from narration_key()
+    """
+    keys = list(keys)
+    with _pins_lock:
+        for key in keys:
+            _pins[key] = _pins.get(key, 0) + 1
+    try:
+        yield
+    finally:
+        with _pins_lock:
+            for key in keys:
+                _pins[key] -= 1
+                if not _pins[key]:
+                    del _pins[key]
+
+def narration_key(text, voice_personality, speech_speed, variant=None):
+    """
+    Cache key for a narration: sha256 of everything that changes the audio
+
+    Unlike hash(), this is stable across processes and restarts.
+
+    Args:
+        variant (dict): Post-processing applied to the narration, e.g. the
+            background music mix settings
+    """
+    params = {
+        'text': text,
+        'voice': voice_personality,
+        'speed': round(float(speech_speed), 3),
+        'engine': ENGINE_VERSION,
+        'volume': TTS_POOL_CONFIG['volume']
+    }
+    if variant is not None:
+        params['variant'] = variant
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def narration_path(key):
+    """Where a cached narration lives, sharded by key prefix"""
+    return os.path.join(NARRATION_CACHE_CONFIG['root'], key[:2], f"{key}.wav")
+
+def narration_temp_path(key):
+    """
+    Unique scratch file for synthesizing a narration
+
+    It sits next to the final path so store_narration can move it into
+    place atomically.
+    """
+    path = narration_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return f"{path}.{uuid.uuid4().hex}.tmp.wav"
+
+def _wav_duration(path):
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return None
+
+def lookup_narration(key):
+    """
+    Find a cached narration and mark it recently used
+
+    Marking it starts a lease: evict_narrations() leaves it alone for
+    lease_seconds, so the caller can still read the file it was handed.
+
+    Returns:
+        str: Path to the WAV file, or None on a miss
+    """
+    path = narration_path(key)
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    # Marked before checking the file: an eviction either sees the new
+    # last_used, or has already removed the file by the time it commits
+    cursor.execute('UPDATE narration_cache SET last_used = ? WHERE key = ?', (time.time(), key))
+    exists = os.path.exists(path)
+    if exists and cursor.rowcount == 0:
+        # File survived a database reset: adopt it
+        _record(cursor, key, path, None, None)
+    elif not exists:
+        cursor.execute('DELETE FROM narration_cache WHERE key = ?', (key,))
+    conn.commit()
+    conn.close()
+
+    return path if exists else None
+
+def _record(cursor, key, path, voice_personality, speech_speed):
+    now = time.time()
+    cursor.execute('''
+        INSERT OR REPLACE INTO narration_cache (key, voice, speech_speed, duration, bytes, created_at, last_used)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (key, voice_personality, speech_speed, _wav_duration(path), os.path.getsize(path), now, now))
+
+def store_narration(key, temp_file, voice_personality=None, speech_speed=None):
+    """
+    Move a freshly synthesized file into the cache and record its metadata
+
+    Evicts least recently used narrations if the cache is over its size cap.
+
+    Args:
+        key (str): From narration_key()
+        temp_file (str): File written by the TTS engine, from narration_temp_path()
+
+    Returns:
+        str: Path to the cached WAV file
+    """
+    path = narration_path(key)
+    os.replace(temp_file, path)
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    _record(cursor, key, path, voice_personality, speech_speed)
+    conn.commit()
+    conn.close()
+
+    evict_narrations(keep=key)
+    return path
+
+def get_narration_info(key):
+    """
+    Metadata for a cached narration
+
+    Returns:
+        dict: voice, speech_speed, duration (seconds), bytes, created_at and
+            last_used, or None if not cached
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT voice, speech_speed, duration, bytes, created_at, last_used
+        FROM narration_cache WHERE key = ?
+    ''', (key,))
+    row = cursor.fetchone()
+    conn.close()
+
+    if not row:
+        return None
+    return dict(zip(('voice', 'speech_speed', 'duration', 'bytes', 'created_at', 'last_used'), row))
+
+def evict_narrations(max_bytes=None, keep=None):
+    """
+    Delete least recently used narrations until the cache fits in max_bytes
+
+    Narrations pinned in this process, or used within lease_seconds by
+    any process, are never evicted, so the cache can stay over its cap
+    until they are released.
+
+    Args:
+        max_bytes (int): Size cap; defaults to the configured one
+        keep (str): Key never to evict, e.g. the narration just stored
+
+    Returns:
+        int: Number of narrations evicted
+    """
+    max_bytes = NARRATION_CACHE_CONFIG['max_bytes'] if max_bytes is None else max_bytes
+    leased_since = time.time() - NARRATION_CACHE_CONFIG['lease_seconds']
+    with _pins_lock:
+        pinned = set(_pins)
+
+    # One write transaction, with files removed before it commits: a
+    # lookup racing with it either renews the lease first, so its row
+    # isn't deleted, or finds the file already gone
+    conn = sqlite3.connect(DATABASE_FILE, isolation_level=None)
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT COALESCE(SUM(bytes), 0) FROM narration_cache')
+        total = cursor.fetchone()[0]
+
+        victims = []
+        candidates = []
+        if total > max_bytes:
+            cursor.execute('SELECT key, bytes FROM narration_cache WHERE last_used < ? ORDER BY last_used',
+                           (leased_since,))
+            candidates = cursor.fetchall()
+        for key, size in candidates:
+            if total <= max_bytes:
+                break
+            if key == keep or key in pinned:
+                continue
+            cursor.execute('DELETE FROM narration_cache WHERE key = ?', (key,))
+            try:
+                os.remove(narration_path(key))
+            except FileNotFoundError:
+                pass
+            victims.append(key)
+            total -= size
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        conn.close()
+    return len(victims)
+
+def get_narration_cache_stats():
+    """Number of cached narrations and their total size in bytes"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM narration_cache')
+    entries, total = cursor.fetchone()
+    conn.close()
+    return {'entries': entries, 'bytes': total, 'max_bytes': NARRATION_CACHE_CONFIG['max_bytes']}
@@ -0,0 +1,248 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from utils.config import PLAYLIST_CONFIG
+from utils.database import get_story_content
+from utils.narration_cache import narration_key, lookup_narration
+from utils.transcoding import get_story_renditions, pick_rendition
+from utils.voice_synthesis import (
+    split_narration_chunks, submit_narration, narrate_story, listing_narration_renditions
+)
+
+# Prefetches with chunks still to submit, served round-robin across listeners
+_waiting = deque()
+_running = 0
+_lock = threading.Lock()
+_narrator = None
+
+def _get_narrator():
+    """Threads that narrate the story each listener is on, off the page's rerun"""
+    global _narrator
+    with _lock:
+        if _narrator is None:
+            _narrator = ThreadPoolExecutor(max_workers=PLAYLIST_CONFIG['max_narrations'],
+                                           thread_name_prefix='playlist')
+        return _narrator
+
+class Prefetch:
+    """
+    Background synthesis of the opening chunks of one story
+
+    Chunks are submitted one at a time, and only while fewer than
+    max_prefetch_jobs prefetch chunks are being synthesized in total, so
+    prefetching never holds more than that many TTS workers and listeners
+    actually waiting on a narration are served first. Cancelling stops
+    further chunks; one already being synthesized still finishes into the
+    narration cache.
+    """
+
+    def __init__(self, story_id, chunks, voice_personality, speech_speed):
+        self.story_id = story_id
+        self.chunks = chunks
+        self.voice_personality = voice_personality
+        self.speech_speed = speech_speed
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = False
+
+    @property
+    def ready(self):
+        """True once every prefetched chunk is in the cache"""
+        return self.completed == len(self.chunks)
+
+    def cancel(self):
+        with _lock:
+            self.cancelled = True
+            if self in _waiting:
+                _waiting.remove(self)
+
+def _pump():
+    """Submit waiting chunks while the prefetch budget allows"""
+    global _running
+    jobs = []
+    with _lock:
+        while _running < PLAYLIST_CONFIG['max_prefetch_jobs'] and _waiting:
+            prefetch = _waiting.popleft()
+            if prefetch.cancelled or prefetch.submitted >= len(prefetch.chunks):
+                continue
+            jobs.append((prefetch, prefetch.chunks[prefetch.submitted]))
+            prefetch.submitted += 1
+            _running += 1
+            if prefetch.submitted < len(prefetch.chunks):
+                _waiting.append(prefetch)
+
+    for prefetch, text in jobs:
+        try:
+            future = submit_narration(text, prefetch.voice_personality, prefetch.speech_speed)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+        future.add_done_callback(lambda done, prefetch=prefetch: _finished(prefetch, done))
+
+def _finished(prefetch, future):
+    global _running
+    with _lock:
+        _running -= 1
+        if future.exception() is None:
+            prefetch.completed += 1
+    _pump()
+
+def prefetch_story(story_id, voice_personality, speech_speed=1.0):
+    """
+    Start synthesizing the opening of a story in the background
+
+    Only the first prefetch_chunks chunks are synthesized: enough for
+    playback to start at once and keep ahead of the listener while
+    narrate_story() does the rest.
+
+    Returns:
+        Prefetch: Handle to check or cancel, or None if there is nothing to
+            do (recorded audio, already narrated, or no such story)
+    """
+    if get_story_renditions(story_id):
+        return None
+    text = get_story_content(story_id)
+    if not text or lookup_narration(narration_key(text, voice_personality, speech_speed)):
+        return None
+    if listing_narration_renditions(text, voice_personality, speech_speed):
+        return None
+
+    prefetch = Prefetch(story_id, split_narration_chunks(text)[:PLAYLIST_CONFIG['prefetch_chunks']],
+                        voice_personality, speech_speed)
+    with _lock:
+        _waiting.append(prefetch)
+    _pump()
+    return prefetch
+
+class Narration:
+    """
+    The current story's audio, produced in the background
+
+    chunks lists each narrated chunk's path as soon as it and every chunk
+    before it are playable; future resolves to (path, mime type) for the
+    whole story, or (None, None) if it has no audio. Recorded and already
+    narrated stories resolve at once, with no chunks.
+    """
+
+    def __init__(self, story_id):
+        self.story_id = story_id
+        self.chunks = []
+        self.total = None
+        self.future = Future()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    def _chunk_ready(self, index, path, total):
+        self.total = total
+        self.chunks.append(path)
+
+class Playlist:
+    """
+    A listener's queue of stories, played in order
+
+    While one story plays, the next one's opening is prefetched, so moving
+    on starts from the narration cache rather than from a cold synthesis.
+    Skipping cancels any prefetch the listener no longer needs.
+    """
+
+    def __init__(self, stories, voice_personality, speech_speed=1.0):
+        self.stories = stories
+        self.voice_personality = voice_personality
+        self.speech_speed = speech_speed
+        self.index = 0
+        self.prefetch = None
+        self.narration = None
+        self._lock = threading.Lock()
+
+    @property
+    def current(self):
+        return self.stories[self.index] if self.stories else None
+
+    @property
+    def upcoming(self):
+        return self.stories[self.index + 1] if self.index + 1 < len(self.stories) else None
+
+    def skip_to(self, index):
+        """Move to another story in the playlist"""
+        with self._lock:
+            self.index = max(0, min(index, len(self.stories) - 1))
+            # The prefetch for the new current story is kept running: it is needed now
+            if self.prefetch and self.prefetch.story_id != self.current['id']:
+                self.prefetch.cancel()
+            self.prefetch = None
+            # A narration left behind still finishes into the cache
+            self.narration = None
+
+    def prefetch_next(self):
+        """Start prefetching the upcoming story, once the current one is queued"""
+        with self._lock:
+            upcoming = self.upcoming
+            if upcoming is None or (self.prefetch and self.prefetch.story_id == upcoming['id']):
+                return self.prefetch
+            if self.prefetch:
+                self.prefetch.cancel()
+            self.prefetch = prefetch_story(upcoming['id'], self.voice_personality, self.speech_speed)
+            return self.prefetch
+
+    def stop(self):
+        """Cancel prefetching, e.g. when the listener leaves the playlist"""
+        with self._lock:
+            if self.prefetch:
+                self.prefetch.cancel()
+                self.prefetch = None
+
+    def _narrate(self, narration, text):
+        def chunk_ready(index, path, total):
+            narration._chunk_ready(index, path, total)
+            if index == 0 and self.narration is narration:
+                self.prefetch_next()
+
+        path = narrate_story(text, self.voice_personality, self.speech_speed,
+                             on_chunk=chunk_ready, story_id=narration.story_id)
+        # Fully cached narrations skip the chunk callbacks
+        if self.narration is narration:
+            self.prefetch_next()
+        return path, "audio/wav"
+
+    def play_current(self, bandwidth_kbps=None):
+        """
+        Start the current story's audio without waiting for it
+
+        Recorded stories, and listing-voice narrations that have been
+        transcoded, play their best-fitting rendition; others are narrated
+        in the background, starting with any chunks prefetched
+        while the previous story played. The upcoming story is prefetched
+        as soon as every chunk of this one is queued, so it never delays
+        this one. Safe to call on every rerun: the current story's
+        narration is only started once.
+
+        Args:
+            bandwidth_kbps (float): Listener bandwidth for picking a rendition
+
+        Returns:
+            Narration: The current story's audio, or None for an empty playlist
+        """
+        story = self.current
+        if story is None:
+            return None
+        if self.narration and self.narration.story_id == story['id']:
+            return self.narration
+
+        narration = self.narration = Narration(story['id'])
+        renditions = get_story_renditions(story['id'])
+        text = None if renditions else get_story_content(story['id'])
+        if text:
+            renditions = listing_narration_renditions(text, self.voice_personality, self.speech_speed)
+        if renditions:
+            rendition = pick_rendition(renditions, bandwidth_kbps or PLAYLIST_CONFIG['default_bandwidth_kbps'])
+            narration.future.set_result((rendition['path'], rendition['mime']))
+        elif not text:
+            narration.future.set_result((None, None))
+        else:
+            narration.future = _get_narrator().submit(self._narrate, narration, text)
+            return narration
+
+        self.prefetch_next()
+        return narration
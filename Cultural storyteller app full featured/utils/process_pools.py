@@ -0,0 +1,116 @@
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from utils.config import PROCESS_POOL_CONFIG
+
+# Spawned rather than forked: the Streamlit server process is multi-threaded
+SPAWN = multiprocessing.get_context('spawn')
+
+# name -> ProcessPoolExecutor
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Jobs waiting for the shared CPU budget, and how many are running
+_waiting = deque()
+_running = 0
+_jobs_lock = threading.Lock()
+
+def get_process_pool(name, max_workers, initializer=None, initargs=()):
+    """
+    Worker process pool for one kind of job, created on first use
+
+    Args:
+        name (str): Pool name, e.g. 'tts' or 'transcoding'
+        max_workers (int): Processes in the pool, if it has to be created
+        initializer (callable): Run once in each worker process
+        initargs (tuple): Arguments for initializer
+
+    Returns:
+        ProcessPoolExecutor: The pool
+    """
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=SPAWN,
+                                       initializer=initializer, initargs=initargs)
+            _pools[name] = pool
+        return pool
+
+def discard_process_pool(pool):
+    """Drop a pool whose worker died so the next job starts a fresh one"""
+    with _pools_lock:
+        for name, current in list(_pools.items()):
+            if current is pool:
+                del _pools[name]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_process_pool(name):
+    """Stop a pool's worker processes, waiting for its running jobs"""
+    with _pools_lock:
+        pool = _pools.pop(name, None)
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+def submit_job(get_pool, func, *args):
+    """
+    Run func(*args) on a worker pool once the shared CPU budget allows
+
+    Every pool draws on one budget: at most cpu_budget jobs run at once
+    across all of them, and the rest wait in submission order, so a voice
+    story being narrated, transcoded and illustrated at the same time
+    doesn't oversubscribe the CPUs. A pool that breaks is discarded and the
+    job fails with BrokenProcessPool.
+
+    Args:
+        get_pool (callable): Returns the pool to run on, e.g. a module's _get_pool
+        func (callable): Picklable top-level function
+
+    Returns:
+        Future: Resolves to func's result
+    """
+    result = Future()
+    with _jobs_lock:
+        _waiting.append((get_pool, func, args, result))
+    _pump()
+    return result
+
+def _pump():
+    """Start waiting jobs while the budget allows"""
+    global _running
+    jobs = []
+    with _jobs_lock:
+        while _running < PROCESS_POOL_CONFIG['cpu_budget'] and _waiting:
+            job = _waiting.popleft()
+            if job[3].set_running_or_notify_cancel():
+                jobs.append(job)
+                _running += 1
+
+    for get_pool, func, args, result in jobs:
+        pool = get_pool()
+        try:
+            future = pool.submit(func, *args)
+        except (BrokenProcessPool, RuntimeError) as e:
+            # Broken, or shut down by a discard in another thread
+            discard_process_pool(pool)
+            future = Future()
+            future.set_exception(BrokenProcessPool(str(e)))
+        future.add_done_callback(lambda done, pool=pool, result=result: _finished(pool, done, result))
+
+def _finished(pool, future, result):
+    global _running
+    with _jobs_lock:
+        _running -= 1
+
+    if future.cancelled():
+        # Queued on a pool that was discarded
+        result.set_exception(BrokenProcessPool("The worker pool was discarded"))
+    elif isinstance(future.exception(), BrokenProcessPool):
+        discard_process_pool(pool)
+        result.set_exception(future.exception())
+    elif future.exception() is not None:
+        result.set_exception(future.exception())
+    else:
+        result.set_result(future.result())
+    _pump()
@@ -0,0 +1,267 @@
+import os
+import math
+import json
+import time
+import wave
+import sqlite3
+import logging
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import DATABASE_CONFIG, RECORDING_CONFIG
+from utils.process_pools import get_process_pool, submit_job
+from utils.audio import LoudnessMeter, SilenceCondenser, float_to_pcm16
+from utils.transcoding import transcode_story_audio
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+logger = logging.getLogger(__name__)
+
+_coordinator = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """Audio processing worker pool, created on first use"""
+    return get_process_pool('recordings', RECORDING_CONFIG['max_workers'])
+
+def _get_coordinator():
+    """Threads that process an upload, then hand it on to transcoding or the comments table"""
+    global _coordinator
+    with _pool_lock:
+        if _coordinator is None:
+            _coordinator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='recording')
+        return _coordinator
+
+def _decode_blocks(path, block_frames):
+    """
+    Decode any audio file PyAV can read as float32 blocks shaped (frames, channels)
+
+    More than two channels are mixed down to stereo.
+    """
+    import av
+    import numpy as np
+
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        channels = 1 if stream.channels == 1 else 2
+        resampler = av.AudioResampler(format='flt', layout='mono' if channels == 1 else 'stereo',
+                                      rate=stream.rate)
+        pending = []
+        frames = 0
+        for packet_frame in container.decode(stream):
+            for frame in resampler.resample(packet_frame):
+                pending.append(frame.to_ndarray().reshape(-1, channels))
+                frames += frame.samples
+                if frames >= block_frames:
+                    yield np.concatenate(pending)
+                    pending = []
+                    frames = 0
+        for frame in resampler.resample(None):
+            pending.append(frame.to_ndarray().reshape(-1, channels))
+        if pending:
+            yield np.concatenate(pending)
+
+def _probe(path):
+    import av
+
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        return stream.rate, 1 if stream.channels == 1 else 2
+
+def process_recording(source_file, out_file, normalize=True, condense_silence=True):
+    """
+    Normalize a recording's loudness and condense its silences (runs in a worker process)
+
+    Two streaming passes, so memory use doesn't depend on the file's
+    length: the first measures integrated loudness, peak level and noise
+    floor, the second applies the gain, condenses silence and writes a 16-bit WAV.
+    The gain reaches target_lufs unless that would push the peak over
+    peak_ceiling_db or exceed max_gain_db.
+
+    Args:
+        source_file (str): Any audio file PyAV can decode
+        out_file (str): WAV file to write
+        normalize (bool): Adjust loudness to target_lufs
+        condense_silence (bool): Shorten long pauses
+
+    Returns:
+        dict: input_seconds, output_seconds, loudness_before and
+            loudness_after (LUFS, None for silence), gain_db, cpu_seconds
+            and realtime_factor (audio seconds per CPU second)
+    """
+    started = time.process_time()
+    block = RECORDING_CONFIG['block_frames']
+    rate, channels = _probe(source_file)
+
+    meter = LoudnessMeter(rate, channels)
+    read = 0
+    for samples in _decode_blocks(source_file, block):
+        meter.add(samples)
+        read += len(samples)
+    loudness = meter.integrated()
+
+    gain_db = 0.0
+    if normalize and loudness is not None:
+        gain_db = min(RECORDING_CONFIG['target_lufs'] - loudness, RECORDING_CONFIG['max_gain_db'])
+        if meter.peak > 0:
+            gain_db = min(gain_db, RECORDING_CONFIG['peak_ceiling_db'] - 20 * math.log10(meter.peak))
+    gain = 10 ** (gain_db / 20)
+
+    # Silence is whatever sits just above the room tone, after the gain,
+    # but never closer than silence_below_db to the speech level. Both are
+    # unweighted mean squares per channel, like the condenser's windows
+    threshold_db = RECORDING_CONFIG['silence_floor_db']
+    speech_db = meter.speech_level()
+    if speech_db is not None:
+        threshold_db = max(threshold_db, meter.noise_floor() + gain_db + RECORDING_CONFIG['silence_margin_db'])
+        threshold_db = min(threshold_db, speech_db + gain_db - RECORDING_CONFIG['silence_below_db'])
+    condenser = SilenceCondenser(rate, channels, 10 ** (threshold_db / 10), RECORDING_CONFIG['max_silence'],
+                                 RECORDING_CONFIG['keep_silence'], RECORDING_CONFIG['fade']) if condense_silence else None
+    result = LoudnessMeter(rate, channels)
+
+    temp_file = f"{out_file}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    written = 0
+    try:
+        with wave.open(temp_file, 'wb') as out:
+            out.setnchannels(channels)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+
+            def write(samples):
+                nonlocal written
+                if len(samples):
+                    result.add(samples)
+                    out.writeframes(float_to_pcm16(samples))
+                    written += len(samples)
+
+            for samples in _decode_blocks(source_file, block):
+                samples = samples * gain if gain != 1.0 else samples
+                write(condenser.process(samples) if condenser else samples)
+            if condenser:
+                write(condenser.flush())
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.replace(temp_file, out_file)
+
+    input_seconds = read / rate
+    cpu_seconds = time.process_time() - started
+    return {
+        'input_seconds': input_seconds,
+        'output_seconds': written / rate,
+        'loudness_before': loudness,
+        'loudness_after': result.integrated(),
+        'gain_db': gain_db,
+        'cpu_seconds': cpu_seconds,
+        'realtime_factor': input_seconds / cpu_seconds if cpu_seconds else None
+    }
+
+def _processed_path(source_file, normalize, condense_silence):
+    """Processed files are named after the source's sha256 and the settings"""
+    digest = hashlib.sha256()
+    with open(source_file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    settings = {'normalize': normalize, 'condense_silence': condense_silence,
+                'config': {k: v for k, v in RECORDING_CONFIG.items() if k not in ('root', 'max_workers', 'block_frames')}}
+    digest.update(json.dumps(settings, sort_keys=True).encode('utf-8'))
+    name = digest.hexdigest()
+    return os.path.join(RECORDING_CONFIG['root'], name[:2], f"{name}.wav")
+
+def process_audio(source_file, normalize=True, condense_silence=True):
+    """
+    Process a recording on the worker pool and wait for it
+
+    The same file with the same settings is only processed once.
+
+    Returns:
+        tuple: (path of the processed WAV, stats dict from
+            process_recording, or None if it was already processed)
+    """
+    out_file = _processed_path(source_file, normalize, condense_silence)
+    if os.path.exists(out_file):
+        return out_file, None
+    stats = submit_job(_get_pool, process_recording, source_file, out_file, normalize, condense_silence).result()
+    return out_file, stats
+
+def _set_audio_status(story_id, status, error=None):
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE stories SET audio_status = ?, audio_error = ? WHERE id = ?', (status, error, story_id))
+    conn.commit()
+    conn.close()
+
+def _process_story_audio(story_id, source_file, normalize, condense_silence):
+    path, _ = process_audio(source_file, normalize, condense_silence)
+    return transcode_story_audio(story_id, path)
+
+def _story_recording_done(story_id, future):
+    error = future.exception()
+    if error is None:
+        _set_audio_status(story_id, 'ready')
+        return
+    logger.error("Processing the recording of story %s failed", story_id, exc_info=error)
+    try:
+        _set_audio_status(story_id, 'failed', str(error))
+    except sqlite3.Error:
+        logger.exception("Could not mark story %s's recording as failed", story_id)
+
+def submit_story_recording(story_id, source_file, normalize=True, condense_silence=True):
+    """
+    Process an uploaded story recording, then transcode it, in the background
+
+    The story's audio_status is 'processing' meanwhile, then 'ready', or
+    'failed' with the error in audio_error (see get_story_audio_status).
+
+    Returns:
+        Future: Resolves to the story's renditions (see transcode_story_audio)
+    """
+    _set_audio_status(story_id, 'processing')
+    future = _get_coordinator().submit(_process_story_audio, story_id, source_file, normalize, condense_silence)
+    future.add_done_callback(lambda done: _story_recording_done(story_id, done))
+    return future
+
+def get_story_audio_status(story_id):
+    """
+    State of a story's uploaded recording
+
+    Returns:
+        tuple: (status, error); status is 'processing', 'ready', 'failed',
+            or None if the story has no upload
+    """
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('SELECT audio_status, audio_error FROM stories WHERE id = ?', (story_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return row if row else (None, None)
+
+def _process_comment_audio(comment_id, source_file):
+    path, _ = process_audio(source_file)
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE comments SET audio_file = ? WHERE id = ?', (path, comment_id))
+    conn.commit()
+    conn.close()
+    return path
+
+def submit_comment_audio(comment_id, source_file):
+    """
+    Process an audio comment in the background and point the comment at the result
+
+    Until it finishes, or if it fails, the comment keeps its original upload.
+
+    Returns:
+        Future: Resolves to the processed file's path
+    """
+    future = _get_coordinator().submit(_process_comment_audio, comment_id, source_file)
+
+    def done(finished):
+        if finished.exception() is not None:
+            logger.error("Processing the audio of comment %s failed; keeping the original upload",
+                         comment_id, exc_info=finished.exception())
+
+    future.add_done_callback(done)
+    return future
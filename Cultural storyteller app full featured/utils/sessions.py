@@ -0,0 +1,202 @@
+import os
+import hmac
+import json
+import time
+import sqlite3
+import secrets
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.config import DATABASE_CONFIG, SESSION_CONFIG
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+# token -> session dict, most recently used last
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_secret = None
+
+def _get_secret():
+    """Get the signing key, generating a persistent one if none is configured"""
+    global _secret
+    if _secret is not None:
+        return _secret
+
+    if SESSION_CONFIG['secret_key']:
+        _secret = SESSION_CONFIG['secret_key'].encode()
+        return _secret
+
+    # Persist a generated key so sessions survive restarts
+    path = SESSION_CONFIG['secret_file']
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            _secret = f.read()
+    else:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _secret = secrets.token_bytes(32)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_secret)
+    return _secret
+
+def _sign(session_id):
+    """HMAC-SHA256 signature of a session id"""
+    return hmac.new(_get_secret(), session_id.encode(), hashlib.sha256).hexdigest()[:32]
+
+def _split_token(token):
+    """Verify a token's signature and return its session id, or None"""
+    if not token or '.' not in token:
+        return None
+    session_id, signature = token.rsplit('.', 1)
+    if not hmac.compare_digest(signature, _sign(session_id)):
+        return None
+    return session_id
+
+def _cache_put(token, session):
+    with _cache_lock:
+        _cache[token] = session
+        _cache.move_to_end(token)
+        while len(_cache) > SESSION_CONFIG['lru_size']:
+            _cache.popitem(last=False)
+
+def create_session(user, permission_bits):
+    """
+    Create a server-side session for a logged-in user
+
+    Args:
+        user (dict): User record from get_user_by_username
+        permission_bits (int): Precomputed permission bitset
+
+    Returns:
+        str: Signed session token
+    """
+    session_id = secrets.token_urlsafe(24)
+    token = f"{session_id}.{_sign(session_id)}"
+    now = time.time()
+    expires_at = now + SESSION_CONFIG['ttl']
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    conn.execute('''
+        INSERT INTO sessions (session_id, user_id, user_data, permission_bits, created_at, expires_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (session_id, user['id'], json.dumps(user), permission_bits, now, expires_at))
+    conn.commit()
+    conn.close()
+
+    _cache_put(token, {
+        'user_id': user['id'],
+        'user': user,
+        'permission_bits': permission_bits,
+        'expires_at': expires_at
+    })
+    return token
+
+def load_session(token):
+    """
+    Look up a session by token (memory first, then SQLite)
+
+    Returns:
+        dict: Session with user_id, user (None if invalidated),
+            permission_bits and expires_at; None if missing or expired
+    """
+    with _cache_lock:
+        session = _cache.get(token)
+        if session is not None:
+            _cache.move_to_end(token)
+
+    if session is None:
+        session_id = _split_token(token)
+        if session_id is None:
+            return None
+
+        conn = sqlite3.connect(DATABASE_FILE)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, user_data, permission_bits, expires_at
+            FROM sessions WHERE session_id = ?
+        ''', (session_id,))
+        row = cursor.fetchone()
+        conn.close()
+
+        if row is None:
+            return None
+
+        session = {
+            'user_id': row[0],
+            'user': json.loads(row[1]) if row[1] else None,
+            'permission_bits': row[2],
+            'expires_at': row[3]
+        }
+        _cache_put(token, session)
+
+    if session['expires_at'] < time.time():
+        destroy_session(token)
+        return None
+
+    return session
+
+def refresh_session(token, user, permission_bits):
+    """Store a freshly loaded user record on an existing session"""
+    session_id = _split_token(token)
+    if session_id is None:
+        return
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    conn.execute('''
+        UPDATE sessions SET user_data = ?, permission_bits = ? WHERE session_id = ?
+    ''', (json.dumps(user), permission_bits, session_id))
+    conn.commit()
+    conn.close()
+
+    session = load_session(token)
+    if session is not None:
+        session.update({'user': user, 'permission_bits': permission_bits})
+
+def destroy_session(token):
+    """Log a session out"""
+    with _cache_lock:
+        _cache.pop(token, None)
+
+    session_id = _split_token(token)
+    if session_id is None:
+        return
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    conn.execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+    conn.commit()
+    conn.close()
+
+def invalidate_user_sessions(user_id, cursor=None):
+    """
+    Mark every session of a user stale after their record changes
+
+    The next rerun of each affected session reloads the user record once.
+
+    Args:
+        user_id (int): User whose record changed
+        cursor (sqlite3.Cursor): Optional cursor to join the caller's transaction
+    """
+    with _cache_lock:
+        for session in _cache.values():
+            if session['user_id'] == user_id:
+                session['user'] = None
+
+    sql = 'UPDATE sessions SET user_data = NULL WHERE user_id = ?'
+    if cursor is not None:
+        cursor.execute(sql, (user_id,))
+        return
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    conn.execute(sql, (user_id,))
+    conn.commit()
+    conn.close()
+
+def purge_expired_sessions():
+    """Delete expired sessions; returns the number removed"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM sessions WHERE expires_at < ?', (time.time(),))
+    removed = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return removed
@@ -0,0 +1,379 @@
+import os
+import re
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.config import SIMILARITY_CONFIG
+
+# Files making up the on-disk index
+MODEL_FILE = "model.npz"
+VECTORS_FILE = "vectors.f32"
+IDS_FILE = "ids.i64"
+
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+# Rebuilds run one at a time; stories indexed while one runs are listed
+# in _missed so it can add them to the index it is about to swap in
+_rebuild_lock = threading.Lock()
+_missed = None
+_refitter = ThreadPoolExecutor(max_workers=1, thread_name_prefix='similarity')
+_refit = None
+
+def _index_path(name):
+    """Get the path of an index file, creating the index directory if needed"""
+    index_dir = SIMILARITY_CONFIG['index_dir']
+    os.makedirs(index_dir, exist_ok=True)
+    return os.path.join(index_dir, name)
+
+def _hashed_terms(story):
+    """
+    Turn a story into a signed, hashed bag of words
+
+    Args:
+        story (dict): Story with title, description and content
+
+    Returns:
+        tuple: (feature indices, sublinear term frequencies) as NumPy arrays
+    """
+    n_features = SIMILARITY_CONFIG['hash_features']
+    counts = {}
+
+    for field, weight in SIMILARITY_CONFIG['field_weights'].items():
+        text = story.get(field) or ''
+        for token in _TOKEN_RE.findall(text.lower()):
+            counts[token] = counts.get(token, 0) + weight
+
+    if not counts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+    hashes = np.fromiter(
+        (zlib.crc32(token.encode('utf-8')) for token in counts),
+        dtype=np.uint32, count=len(counts)
+    )
+    tf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+    # The top hash bit picks the sign so bucket collisions tend to cancel out
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    buckets = (hashes % n_features).astype(np.int64)
+
+    indices, inverse = np.unique(buckets, return_inverse=True)
+    values = np.zeros(len(indices), dtype=np.float32)
+    np.add.at(values, inverse, signs * (1.0 + np.log(tf)))
+
+    return indices, values
+
+def _weight_terms(terms, idf):
+    """Apply IDF weights and L2-normalize a hashed term vector"""
+    indices, values = terms
+    weighted = values * idf[indices]
+    norm = np.linalg.norm(weighted)
+    if norm > 0:
+        weighted /= norm
+    return indices, weighted
+
+def _randomized_svd(rows, n_features, dimensions):
+    """
+    Truncated SVD of a sparse row matrix using a randomized range finder
+
+    The matrix is never densified: rows are (indices, values) pairs and every
+    product with it is accumulated row by row.
+
+    Args:
+        rows (list): Sparse document rows
+        n_features (int): Number of hashed feature columns
+        dimensions (int): Number of components to keep
+
+    Returns:
+        numpy.ndarray: Projection matrix of shape (n_features, dimensions)
+    """
+    rank = min(dimensions + SIMILARITY_CONFIG['oversampling'], len(rows))
+    rng = np.random.default_rng(0)
+    omega = rng.standard_normal((n_features, rank), dtype=np.float32)
+
+    def matmul(dense):
+        out = np.zeros((len(rows), dense.shape[1]), dtype=np.float32)
+        for i, (indices, values) in enumerate(rows):
+            out[i] = values @ dense[indices]
+        return out
+
+    def rmatmul(dense):
+        out = np.zeros((n_features, dense.shape[1]), dtype=np.float32)
+        for i, (indices, values) in enumerate(rows):
+            out[indices] += np.outer(values, dense[i])
+        return out
+
+    q, _ = np.linalg.qr(matmul(omega))
+    for _ in range(SIMILARITY_CONFIG['power_iterations']):
+        z, _ = np.linalg.qr(rmatmul(q))
+        q, _ = np.linalg.qr(matmul(z))
+
+    # A.T @ Q = U S V.T, so the columns of U span the top right-singular space of A
+    u, _, _ = np.linalg.svd(rmatmul(q), full_matrices=False)
+
+    components = np.zeros((n_features, dimensions), dtype=np.float32)
+    keep = min(dimensions, u.shape[1])
+    components[:, :keep] = u[:, :keep]
+    return components
+
+def _fit_model(stories):
+    """Fit IDF weights and the SVD projection on a sample of stories"""
+    n_features = SIMILARITY_CONFIG['hash_features']
+    terms = [_hashed_terms(story) for story in stories]
+
+    df = np.zeros(n_features, dtype=np.float32)
+    for indices, _ in terms:
+        df[indices] += 1
+    idf = (np.log((1.0 + len(terms)) / (1.0 + df)) + 1.0).astype(np.float32)
+
+    rows = [_weight_terms(t, idf) for t in terms if len(t[0])]
+    if rows:
+        components = _randomized_svd(rows, n_features, SIMILARITY_CONFIG['dimensions'])
+    else:
+        components = np.zeros((n_features, SIMILARITY_CONFIG['dimensions']), dtype=np.float32)
+
+    return {'idf': idf, 'components': components, 'fitted_docs': len(terms)}
+
+def _embed(story, model):
+    """Embed a single story into the unit-normalized latent space"""
+    indices, values = _weight_terms(_hashed_terms(story), model['idf'])
+    if not len(indices):
+        return np.zeros(model['components'].shape[1], dtype=np.float32)
+
+    vector = values @ model['components'][indices]
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector.astype(np.float32)
+
+def _load_model():
+    """Load the fitted model, cached until the model file changes"""
+    path = _index_path(MODEL_FILE)
+    if not os.path.exists(path):
+        return None
+
+    mtime = os.path.getmtime(path)
+    cached = _index_cache.get('model')
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with np.load(path) as data:
+        model = {
+            'idf': data['idf'],
+            'components': data['components'],
+            'fitted_docs': int(data['fitted_docs'])
+        }
+    _index_cache['model'] = (mtime, model)
+    return model
+
+def _load_vectors():
+    """
+    Memory-map the story vectors and ids
+
+    Returns:
+        tuple: (vectors memmap of shape (n, dimensions), ids array)
+    """
+    vectors_path = _index_path(VECTORS_FILE)
+    ids_path = _index_path(IDS_FILE)
+    dimensions = SIMILARITY_CONFIG['dimensions']
+
+    if not os.path.exists(ids_path) or not os.path.exists(vectors_path):
+        return np.zeros((0, dimensions), dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+    count = os.path.getsize(ids_path) // 8
+    key = (os.path.getmtime(vectors_path), count)
+    cached = _index_cache.get('vectors')
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+
+    if count == 0:
+        vectors = np.zeros((0, dimensions), dtype=np.float32)
+    else:
+        vectors = np.memmap(vectors_path, dtype=np.float32, mode='r', shape=(count, dimensions))
+    ids = np.fromfile(ids_path, dtype=np.int64, count=count)
+
+    _index_cache['vectors'] = (key, vectors, ids)
+    return vectors, ids
+
+def rebuild_similarity_index(stories=None):
+    """
+    Rebuild the similarity index from scratch
+
+    The model is fitted on the first ``fit_sample_size`` stories and the rest
+    of the catalog is streamed through it, so memory stays bounded.
+
+    Args:
+        stories (iterable): Story dicts with id, title, description, content.
+            Defaults to every story in the database.
+
+    Returns:
+        int: Number of stories indexed
+    """
+    if stories is None:
+        # Imported here because utils.database indexes stories on save
+        from utils.database import iter_story_documents
+        stories = iter_story_documents()
+
+    global _missed
+    with _rebuild_lock:
+        # The fit and the new files are made without holding _index_lock,
+        # so stories keep being indexed into the current files meanwhile
+        with _index_lock:
+            _missed = []
+
+        try:
+            stories = iter(stories)
+            sample = []
+            for story in stories:
+                sample.append(story)
+                if len(sample) >= SIMILARITY_CONFIG['fit_sample_size']:
+                    break
+
+            model = _fit_model(sample)
+
+            vectors_tmp = _index_path(VECTORS_FILE + '.tmp')
+            ids_tmp = _index_path(IDS_FILE + '.tmp')
+            written = set()
+
+            with open(vectors_tmp, 'wb') as vf, open(ids_tmp, 'wb') as idf:
+                for story in sample:
+                    vf.write(_embed(story, model).tobytes())
+                    idf.write(np.int64(story['id']).tobytes())
+                    written.add(story['id'])
+                for story in stories:
+                    vf.write(_embed(story, model).tobytes())
+                    idf.write(np.int64(story['id']).tobytes())
+                    written.add(story['id'])
+
+            model_tmp = _index_path('model.tmp.npz')
+            np.savez(model_tmp, idf=model['idf'], components=model['components'],
+                     fitted_docs=model['fitted_docs'])
+
+            with _index_lock:
+                # Saved after the stories were read: add them before swapping
+                with open(vectors_tmp, 'ab') as vf, open(ids_tmp, 'ab') as idf:
+                    for story_id, story in _missed:
+                        if story_id not in written:
+                            vf.write(_embed(story, model).tobytes())
+                            idf.write(np.int64(story_id).tobytes())
+                            written.add(story_id)
+
+                os.replace(vectors_tmp, _index_path(VECTORS_FILE))
+                os.replace(ids_tmp, _index_path(IDS_FILE))
+                os.replace(model_tmp, _index_path(MODEL_FILE))
+                _index_cache.clear()
+                _missed = None
+        finally:
+            with _index_lock:
+                _missed = None
+
+    return len(written)
+
+def _schedule_rebuild():
+    """Rebuild the index on the background worker, unless one is already queued (call with _index_lock held)"""
+    global _refit
+    if _refit is None or _refit.done():
+        _refit = _refitter.submit(rebuild_similarity_index)
+    return _refit
+
+def index_story(story_id, story):
+    """
+    Append a newly saved story to the similarity index
+
+    A rebuild is queued on a background worker when no model exists yet or
+    the catalog has grown enough since the last fit that the projection
+    should be refreshed; the story is searchable with the current model
+    meanwhile, so publishing never waits for a refit.
+
+    Args:
+        story_id (int): Story ID
+        story (dict): Story with title, description and content
+
+    Returns:
+        Future: The queued rebuild, or None if none was needed
+    """
+    with _index_lock:
+        if _missed is not None:
+            _missed.append((story_id, story))
+
+        model = _load_model()
+        if model is None:
+            # The rebuild reads this story from the database
+            return _schedule_rebuild()
+
+        _, ids = _load_vectors()
+        fitted = model['fitted_docs']
+        refit = None
+        if (fitted < SIMILARITY_CONFIG['fit_sample_size']
+                and len(ids) + 1 >= max(fitted, 1) * SIMILARITY_CONFIG['refit_growth_factor']):
+            refit = _schedule_rebuild()
+
+        vector = _embed(story, model)
+        with open(_index_path(VECTORS_FILE), 'ab') as vf:
+            vf.write(vector.tobytes())
+        with open(_index_path(IDS_FILE), 'ab') as idf:
+            idf.write(np.int64(story_id).tobytes())
+        return refit
+
+def _top_k(query, k, exclude_id=None):
+    """Brute-force cosine top-k over the memory-mapped vectors"""
+    vectors, ids = _load_vectors()
+    if not len(ids) or not np.any(query):
+        return []
+
+    scores = vectors @ query
+    # Over-fetch a little so excluded / re-indexed ids don't shrink the result
+    fetch = min(len(scores), k * 2 + 1)
+    candidates = np.argpartition(-scores, fetch - 1)[:fetch]
+    candidates = candidates[np.argsort(-scores[candidates])]
+
+    results = []
+    seen = set()
+    for row in candidates:
+        story_id = int(ids[row])
+        if story_id == exclude_id or story_id in seen:
+            continue
+        seen.add(story_id)
+        results.append((story_id, float(scores[row])))
+        if len(results) >= k:
+            break
+    return results
+
+def find_similar_stories(story_id, k=None):
+    """
+    Find the stories most similar to an indexed story
+
+    Args:
+        story_id (int): Story to find neighbours for
+        k (int): Number of neighbours to return
+
+    Returns:
+        list: (story_id, cosine similarity) tuples, best first
+    """
+    k = k or SIMILARITY_CONFIG['default_top_k']
+    vectors, ids = _load_vectors()
+
+    rows = np.flatnonzero(ids == story_id)
+    if not len(rows):
+        return []
+
+    query = np.array(vectors[rows[-1]], dtype=np.float32)
+    return _top_k(query, k, exclude_id=story_id)
+
+def search_similar_text(title="", description="", content="", k=None):
+    """
+    Find indexed stories similar to arbitrary text, e.g. an unsaved draft
+
+    Returns:
+        list: (story_id, cosine similarity) tuples, best first
+    """
+    k = k or SIMILARITY_CONFIG['default_top_k']
+    model = _load_model()
+    if model is None:
+        return []
+
+    query = _embed({'title': title, 'description': description, 'content': content}, model)
+    return _top_k(query, k)
@@ -0,0 +1,143 @@
+import re
+import numpy as np
+from utils.config import SUMMARIZER_CONFIG
+from utils.ai_cache import cached_call
+
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+
+# Sentence ends at . ! ? or the danda / double danda, optionally followed by
+# up to two closing quotes or brackets that stay with it, or at a paragraph break
+_END = '[.!?।॥]'
+_CLOSE = '["\'”’)]'
+_SENTENCE_BREAK = re.compile(
+    rf'(?:(?<={_END})|(?<={_END}{_CLOSE})|(?<={_END}{_CLOSE}{_CLOSE}))\s+|\n\s*\n'
+)
+
+def split_sentences(text):
+    """
+    Split text into sentences, including Devanagari । and ॥ terminators
+
+    Returns:
+        list: Sentences with surrounding whitespace collapsed
+    """
+    sentences = []
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = ' '.join(sentence.split())
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+def _similarity_matrix(sentences):
+    """
+    TextRank sentence similarity: shared words / (log |Si| + log |Sj|)
+
+    Built as a sentence x word incidence matrix so the pairwise overlap is a
+    single matrix product. Words found in only one sentence can't overlap
+    and are dropped first, which keeps the product small.
+    """
+    rows = []
+    cols = []
+    vocabulary = {}
+    lengths = np.zeros(len(sentences), dtype=np.float32)
+
+    for i, sentence in enumerate(sentences):
+        words = set(_TOKEN_RE.findall(sentence.casefold()))
+        lengths[i] = len(words)
+        for word in words:
+            rows.append(i)
+            cols.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+
+    document_frequency = np.bincount(cols, minlength=len(vocabulary))
+    shared = document_frequency[cols] > 1
+    remap = np.cumsum(document_frequency > 1) - 1
+
+    incidence = np.zeros((len(sentences), int((document_frequency > 1).sum())), dtype=np.float32)
+    incidence[rows[shared], remap[cols[shared]]] = 1.0
+    overlap = incidence @ incidence.T
+
+    log_lengths = np.log(np.maximum(lengths, 2.0))
+    similarity = overlap / (log_lengths[:, None] + log_lengths[None, :])
+    np.fill_diagonal(similarity, 0.0)
+    return similarity
+
+def _pagerank(similarity, damping, tolerance, max_iterations):
+    """Power iteration over the row-normalized similarity graph"""
+    n = similarity.shape[0]
+    out_weight = similarity.sum(axis=1, keepdims=True)
+    # Sentences sharing no words link uniformly to all others
+    transition = np.where(out_weight > 0, similarity / np.where(out_weight > 0, out_weight, 1.0), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    teleport = (1.0 - damping) / n
+    for _ in range(max_iterations):
+        updated = teleport + damping * (scores @ transition)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+def textrank_summary(text, max_length=200):
+    """
+    Extractive TextRank summary
+
+    Sentences are ranked by TextRank and the best ones that fit in
+    ``max_length`` characters are returned in their original order.
+
+    Args:
+        text (str): Story text
+        max_length (int): Maximum length of summary
+
+    Returns:
+        str: Summary
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return ''
+
+    if len(sentences) <= 2:
+        summary = ' '.join(sentences)
+    else:
+        scores = _pagerank(_similarity_matrix(sentences), SUMMARIZER_CONFIG['damping'],
+                           SUMMARIZER_CONFIG['tolerance'], SUMMARIZER_CONFIG['max_iterations'])
+
+        chosen = []
+        used = 0
+        for index in np.argsort(-scores, kind='stable'):
+            cost = len(sentences[index]) + (1 if chosen else 0)
+            if used + cost <= max_length:
+                chosen.append(index)
+                used += cost
+            if len(chosen) >= SUMMARIZER_CONFIG['max_sentences'] or max_length - used < 20:
+                break
+
+        if not chosen:
+            chosen = [int(np.argmax(scores))]
+        summary = ' '.join(sentences[i] for i in sorted(chosen))
+
+    # Trim if too long
+    if len(summary) > max_length:
+        summary = summary[:max_length-3] + "..."
+    return summary
+
+def summarize(text, max_length=200):
+    """TextRank summary, cached by content hash"""
+    return cached_call(
+        'summary',
+        {'text': text, 'max_length': max_length, 'method': 'textrank', 'config': SUMMARIZER_CONFIG},
+        lambda: textrank_summary(text, max_length)
+    )
+
+def summarize_batch(texts, max_length=200):
+    """
+    Summarize many stories, e.g. the whole catalog
+
+    Args:
+        texts (iterable): Story texts
+
+    Returns:
+        list: Summaries in the same order
+    """
+    return [summarize(text, max_length) for text in texts]
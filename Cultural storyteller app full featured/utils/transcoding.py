@@ -0,0 +1,344 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.config import DATABASE_CONFIG, EXPORT_CONFIG, TRANSCODING_CONFIG
+from utils.process_pools import get_process_pool, submit_job
+from utils.durations import RECORDED_VOICE, record_story_duration
+
+DATABASE_FILE = DATABASE_CONFIG['database_file']
+
+_coordinator = None
+_pool_lock = threading.Lock()
+
+# Narration keys queued for transcoding in this process
+_pending_narrations = set()
+
+_RENDITION_COLUMNS = ('quality', 'codec', 'path', 'mime', 'bitrate', 'sample_rate', 'bytes', 'duration')
+
+def _get_pool():
+    """Encoder process pool, created on first use"""
+    return get_process_pool('transcoding', TRANSCODING_CONFIG['max_workers'])
+
+def _get_coordinator():
+    """Threads that fan a story's renditions out to the pool and record them"""
+    global _coordinator
+    with _pool_lock:
+        if _coordinator is None:
+            _coordinator = ThreadPoolExecutor(max_workers=2, thread_name_prefix='transcode')
+        return _coordinator
+
+def parse_bitrate(bitrate):
+    """'192k' -> 192000"""
+    bitrate = str(bitrate).strip().lower()
+    if bitrate.endswith('k'):
+        return int(float(bitrate[:-1]) * 1000)
+    if bitrate.endswith('m'):
+        return int(float(bitrate[:-1]) * 1000000)
+    return int(bitrate)
+
+def rendition_ladder():
+    """
+    Every (quality, codec) rendition to produce
+
+    Returns:
+        list: Dicts with quality, codec, encoder, container, extension,
+            mime, bitrate (bits/s) and sample_rate
+    """
+    ladder = []
+    for quality, settings in EXPORT_CONFIG['quality_settings']['audio'].items():
+        for codec in TRANSCODING_CONFIG['codec_preference']:
+            spec = TRANSCODING_CONFIG['codecs'][codec]
+            ladder.append({
+                'quality': quality,
+                'codec': codec,
+                'encoder': spec['encoder'],
+                'container': spec['container'],
+                'extension': spec['extension'],
+                'mime': spec['mime'],
+                'bitrate': parse_bitrate(settings['bitrate']),
+                # Opus only runs at 48 kHz
+                'sample_rate': spec.get('sample_rate', settings['sample_rate']),
+                'max_channel_bitrate': spec.get('max_channel_bitrate')
+            })
+    return ladder
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _rendition_path(digest, rendition):
+    return os.path.join(TRANSCODING_CONFIG['root'], digest[:2],
+                        f"{digest}_{rendition['quality']}.{rendition['extension']}")
+
+def _encode(source, out_file, encoder, container, bitrate, sample_rate, max_channel_bitrate=None):
+    """
+    Encode one rendition (runs in a worker process)
+
+    Returns:
+        tuple: (bytes written, duration in seconds, CPU seconds used, bits per second)
+    """
+    import av
+
+    started = time.process_time()
+    temp_file = f"{out_file}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+
+    try:
+        with av.open(source) as src, av.open(temp_file, 'w', format=container) as dst:
+            audio_in = src.streams.audio[0]
+            audio_out = dst.add_stream(encoder, rate=sample_rate)
+            if max_channel_bitrate:
+                bitrate = min(bitrate, max_channel_bitrate * min(audio_in.channels, 2))
+            audio_out.bit_rate = bitrate
+            audio_out.layout = 'mono' if audio_in.channels == 1 else 'stereo'
+
+            # The encoder resamples and re-frames decoded audio as it needs
+            for frame in src.decode(audio_in):
+                dst.mux(audio_out.encode(frame))
+            dst.mux(audio_out.encode(None))
+
+        with av.open(temp_file) as result:
+            duration = float(result.duration) / av.time_base if result.duration else None
+    except Exception:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+    os.replace(temp_file, out_file)
+    size = os.path.getsize(out_file)
+
+    # Encoders may not reach the requested rate (e.g. FFmpeg's AAC on mono
+    # speech), so record what was actually produced for bandwidth selection
+    if duration:
+        bitrate = int(size * 8 / duration)
+    return size, duration, time.process_time() - started, bitrate
+
+def transcode_audio(source_file):
+    """
+    Encode a source file into every rendition on the ladder, in parallel
+
+    Renditions are named after the source's sha256, so the same audio is
+    only ever encoded once.
+
+    Args:
+        source_file (str): Any audio file PyAV can decode (WAV, MP3, OGG, M4A...)
+
+    Returns:
+        list: Rendition dicts (see rendition_ladder) with path, bytes,
+            duration and cpu_seconds added; cpu_seconds is 0 for renditions
+            that already existed. Renditions that fail to encode are left
+            out; if all fail, the error is raised.
+    """
+    digest = _file_digest(source_file)
+    ladder = [dict(rendition, path=_rendition_path(digest, rendition)) for rendition in rendition_ladder()]
+
+    # Renditions already encoded for another story or narration sharing this audio
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(ladder))
+    cursor.execute(f'''
+        SELECT path, bitrate, duration FROM story_audio_renditions WHERE path IN ({placeholders})
+        UNION ALL
+        SELECT path, bitrate, duration FROM narration_audio_renditions WHERE path IN ({placeholders})
+    ''', [rendition['path'] for rendition in ladder] * 2)
+    known = {row[0]: row[1:] for row in cursor.fetchall()}
+    conn.close()
+
+    renditions = []
+    futures = []
+    for rendition in ladder:
+        renditions.append(rendition)
+        if rendition['path'] in known and os.path.exists(rendition['path']):
+            futures.append(None)
+        else:
+            futures.append(submit_job(_get_pool, _encode, source_file, rendition['path'], rendition['encoder'],
+                                       rendition['container'], rendition['bitrate'], rendition['sample_rate'],
+                                       rendition['max_channel_bitrate']))
+
+    done = []
+    error = None
+    for rendition, future in zip(renditions, futures):
+        if future is None:
+            bitrate, duration = known[rendition['path']]
+            rendition.update(bytes=os.path.getsize(rendition['path']), duration=duration,
+                             cpu_seconds=0.0, bitrate=bitrate)
+        else:
+            try:
+                size, duration, cpu_seconds, bitrate = future.result()
+            except Exception as e:
+                error = e  # e.g. an encoder missing from this FFmpeg build; skip the rendition
+                continue
+            rendition.update(bytes=size, duration=duration, cpu_seconds=cpu_seconds, bitrate=bitrate)
+        done.append(rendition)
+
+    if not done and error is not None:
+        raise error
+    return done
+
+def transcode_story_audio(story_id, source_file):
+    """
+    Produce a story's renditions and record them against it
+
+    Also records source_file as the story's audio_file and its measured
+    length as the story's narration length.
+
+    Returns:
+        list: Renditions, as from transcode_audio()
+    """
+    renditions = transcode_audio(source_file)
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE stories SET audio_file = ? WHERE id = ?', (source_file, story_id))
+    cursor.executemany('''
+        INSERT OR REPLACE INTO story_audio_renditions
+            (story_id, quality, codec, path, mime, bitrate, sample_rate, bytes, duration, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (story_id, r['quality'], r['codec'], r['path'], r['mime'], r['bitrate'], r['sample_rate'],
+         r['bytes'], r['duration'], time.time())
+        for r in renditions
+    ])
+    conn.commit()
+    conn.close()
+
+    durations = [r['duration'] for r in renditions if r['duration']]
+    if durations:
+        # Encoder padding differs by codec by a few milliseconds; any is close enough
+        record_story_duration(story_id, RECORDED_VOICE, 1.0, min(durations))
+    return renditions
+
+def submit_story_audio(story_id, source_file):
+    """
+    Transcode a story's audio in the background
+
+    Returns:
+        Future: Resolves to the recorded renditions
+    """
+    return _get_coordinator().submit(transcode_story_audio, story_id, source_file)
+
+def transcode_narration_audio(key, source_file):
+    """
+    Produce renditions of a synthesized narration and record them against its cache key
+
+    The renditions outlive the narration cache's eviction of the WAV.
+
+    Returns:
+        list: Renditions, as from transcode_audio()
+    """
+    renditions = transcode_audio(source_file)
+
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.executemany('''
+        INSERT OR REPLACE INTO narration_audio_renditions
+            (key, quality, codec, path, mime, bitrate, sample_rate, bytes, duration, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (key, r['quality'], r['codec'], r['path'], r['mime'], r['bitrate'], r['sample_rate'],
+         r['bytes'], r['duration'], time.time())
+        for r in renditions
+    ])
+    conn.commit()
+    conn.close()
+    return renditions
+
+def submit_narration_audio(key, source_file):
+    """
+    Transcode a narration in the background, unless it already has been
+
+    Returns:
+        Future: Resolves to the recorded renditions, or None if there was
+            nothing to do
+    """
+    with _pool_lock:
+        if key in _pending_narrations:
+            return None
+        _pending_narrations.add(key)
+    if get_narration_renditions(key):
+        with _pool_lock:
+            _pending_narrations.discard(key)
+        return None
+
+    def finished(_):
+        with _pool_lock:
+            _pending_narrations.discard(key)
+
+    future = _get_coordinator().submit(transcode_narration_audio, key, source_file)
+    future.add_done_callback(finished)
+    return future
+
+def _renditions(table, column, value):
+    """Renditions recorded in a table whose files still exist"""
+    conn = sqlite3.connect(DATABASE_FILE)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(_RENDITION_COLUMNS)} FROM {table} WHERE {column} = ?
+    ''', (value,))
+    rows = cursor.fetchall()
+    conn.close()
+
+    return [dict(zip(_RENDITION_COLUMNS, row)) for row in rows if os.path.exists(row[2])]
+
+def get_story_renditions(story_id):
+    """Recorded renditions of a story whose files still exist"""
+    return _renditions('story_audio_renditions', 'story_id', story_id)
+
+def get_narration_renditions(key):
+    """Renditions of a synthesized narration, by narration cache key, whose files still exist"""
+    return _renditions('narration_audio_renditions', 'key', key)
+
+def pick_rendition(renditions, bandwidth_kbps, supported_codecs=None):
+    """
+    Choose the rendition to stream for a client
+
+    Picks the highest bitrate that fits within the client's bandwidth
+    (less headroom), preferring codecs in codec_preference order; falls
+    back to the smallest rendition when none fits.
+
+    Args:
+        renditions (list): From get_story_renditions()
+        bandwidth_kbps (float): Client bandwidth in kilobits per second
+        supported_codecs (iterable): Codecs the client can play; default all
+
+    Returns:
+        dict: The chosen rendition, or None if there are none
+    """
+    preference = TRANSCODING_CONFIG['codec_preference']
+    candidates = [r for r in renditions if supported_codecs is None or r['codec'] in supported_codecs]
+    if not candidates:
+        return None
+
+    budget = bandwidth_kbps * 1000 * TRANSCODING_CONFIG['bandwidth_headroom']
+    fitting = [r for r in candidates if r['bitrate'] <= budget]
+    if not fitting:
+        return min(candidates, key=lambda r: (r['bitrate'], preference.index(r['codec'])))
+    return max(fitting, key=lambda r: (r['bitrate'], -preference.index(r['codec'])))
+
+def store_audio_upload(uploaded_file):
+    """
+    Save an uploaded audio file under its sha256 so it can be transcoded
+
+    Args:
+        uploaded_file: Streamlit upload (or any object with getvalue() and name)
+
+    Returns:
+        str: Path of the stored original
+    """
+    data = uploaded_file.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    extension = os.path.splitext(getattr(uploaded_file, 'name', ''))[1].lower() or '.bin'
+    path = os.path.join(TRANSCODING_CONFIG['root'], 'originals', digest[:2], f"{digest}{extension}")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(data)
+        os.replace(temp_file, path)
+    return path
@@ -0,0 +1,141 @@
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from utils.config import TTS_POOL_CONFIG
+from utils.process_pools import SPAWN, get_process_pool, submit_job, shutdown_process_pool
+
+# Worker-process state: one initialized engine, reused for every job, and
+# the barrier start_tts_pool's pings meet at
+_engine = None
+_warmup_barrier = None
+
+def create_engine():
+    """Start a pyttsx3 engine with the storytelling voice and default properties"""
+    import pyttsx3
+
+    engine = pyttsx3.init()
+
+    # Get available system voices
+    voices = engine.getProperty('voices')
+    if voices:
+        # Set a default voice (preferably female for storytelling)
+        for voice in voices:
+            if 'female' in voice.name.lower() or 'woman' in voice.name.lower():
+                engine.setProperty('voice', voice.id)
+                break
+        else:
+            # If no female voice found, use the first available
+            engine.setProperty('voice', voices[0].id)
+
+    engine.setProperty('rate', 180)
+    engine.setProperty('volume', TTS_POOL_CONFIG['volume'])
+    return engine
+
+def _init_worker(warmup_barrier):
+    """Pay engine start-up and voice enumeration once per worker process"""
+    global _engine, _warmup_barrier
+    _warmup_barrier = warmup_barrier
+    try:
+        _engine = create_engine()
+    except Exception:
+        _engine = None  # Retried by the first job, which reports the error
+
+def _ping():
+    """
+    Warm-up job: held until one is running on every worker
+
+    A worker runs one job at a time, so no worker can answer two pings
+    and every worker is started, rather than one answering them all.
+    """
+    _warmup_barrier.wait(timeout=TTS_POOL_CONFIG['job_timeout'])
+    return os.getpid(), _engine is not None
+
+def _synthesize(text, rate, save_file):
+    """Render text to a WAV file with this worker's engine"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine()
+
+    _engine.setProperty('rate', rate)
+    _engine.save_to_file(text, save_file)
+    _engine.runAndWait()
+    return save_file
+
+_pool_barrier = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """The narration worker pool, created on first use"""
+    global _pool_barrier
+    with _pool_lock:
+        if _pool_barrier is None:
+            _pool_barrier = SPAWN.Barrier(TTS_POOL_CONFIG['max_workers'])
+    return get_process_pool('tts', TTS_POOL_CONFIG['max_workers'], _init_worker, (_pool_barrier,))
+
+def _submit(text, rate, save_file, result, retries):
+    job = submit_job(_get_pool, _synthesize, text, rate, save_file)
+
+    def done(job):
+        try:
+            result.set_result(job.result())
+        except BrokenProcessPool as e:
+            # The worker died mid-job (e.g. a wedged audio driver); the pool was discarded
+            if retries:
+                _submit(text, rate, save_file, result, retries - 1)
+            else:
+                result.set_exception(e)
+        except BaseException as e:
+            result.set_exception(e)
+
+    job.add_done_callback(done)
+
+def submit_speech(text, rate, save_file):
+    """
+    Queue a narration job on the worker pool
+
+    Jobs run within the CPU budget shared with the other worker pools (see
+    utils.process_pools). A job lost to a crashed worker is retried once on
+    a fresh pool.
+
+    Args:
+        text (str): Text to speak
+        rate (int): Words per minute
+        save_file (str): WAV file to write
+
+    Returns:
+        Future: Resolves to save_file once the file is written
+    """
+    result = Future()
+    _submit(text, rate, save_file, result, retries=1)
+    return result
+
+def start_tts_pool():
+    """
+    Start every worker now rather than on the first narrations
+
+    Sends one ping per worker; each ping waits for the others, so they
+    can only complete once every worker is up with its engine initialized.
+    The pings go straight to the pool, outside the shared CPU budget, since
+    they all have to run at once. Call it before queueing narrations, which
+    would otherwise take up the workers the pings need.
+
+    Returns:
+        int: Number of workers with a working engine
+    """
+    pool = _get_pool()
+    _pool_barrier.reset()
+    futures = [pool.submit(_ping) for _ in range(TTS_POOL_CONFIG['max_workers'])]
+    ready = set()
+    for future in futures:
+        try:
+            pid, engine_ok = future.result()
+        except Exception:
+            continue  # e.g. the barrier timed out because a worker failed to start
+        if engine_ok:
+            ready.add(pid)
+    return len(ready)
+
+def shutdown_tts_pool():
+    """Stop the worker processes"""
+    shutdown_process_pool('tts')
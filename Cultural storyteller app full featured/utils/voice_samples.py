@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+from utils.config import VOICE_CONFIG, VOICE_SAMPLE_CONFIG, TTS_POOL_CONFIG
+from utils.narration_cache import narration_key
+from utils.voice_synthesis import get_voice_sample, submit_narration
+
+_manifest = None
+_manifest_mtime = None
+_manifest_lock = threading.Lock()
+_warmup = None
+
+def _manifest_path():
+    return os.path.join(VOICE_SAMPLE_CONFIG['root'], 'manifest.json')
+
+def _speed_label(speech_speed):
+    return f"{round(float(speech_speed), 2):.2f}"
+
+def load_voice_sample_manifest():
+    """
+    The pre-rendered samples, re-read only when the manifest file changes
+
+    Returns:
+        dict: voice -> speed label ('1.00') -> dict with key, path and bytes
+    """
+    global _manifest, _manifest_mtime
+    path = _manifest_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+
+    with _manifest_lock:
+        if mtime != _manifest_mtime:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    _manifest = json.load(f).get('samples', {})
+            except (OSError, ValueError):
+                _manifest = {}
+            _manifest_mtime = mtime
+        return _manifest
+
+def voice_sample_file(voice_personality, speech_speed=1.0):
+    """
+    Pre-rendered sample for a voice and speed
+
+    An entry only counts if it was rendered from the current sample text,
+    engine and settings, i.e. its cache key still matches.
+
+    Returns:
+        str: Path to the WAV file, or None if it hasn't been rendered
+    """
+    entry = load_voice_sample_manifest().get(voice_personality, {}).get(_speed_label(speech_speed))
+    if not entry or not os.path.exists(entry['path']):
+        return None
+    if entry['key'] != narration_key(get_voice_sample(voice_personality), voice_personality, speech_speed):
+        return None
+    return entry['path']
+
+def warm_voice_samples(voices=None, speeds=None, force=False):
+    """
+    Render every voice's sample at the common speeds and write the manifest
+
+    All samples are queued on the TTS pool at once, so they render in
+    parallel, and go through the narration cache. Each is then copied out
+    of the cache into the samples directory, where LRU eviction can't reach
+    it.
+
+    Args:
+        voices (list): Personalities; defaults to all available voices
+        speeds (list): Speech speeds; defaults to VOICE_SAMPLE_CONFIG
+        force (bool): Re-render samples that are already current
+
+    Returns:
+        int: Number of samples rendered
+    """
+    voices = voices or VOICE_CONFIG['available_voices']
+    speeds = speeds or VOICE_SAMPLE_CONFIG['speeds']
+    os.makedirs(VOICE_SAMPLE_CONFIG['root'], exist_ok=True)
+
+    jobs = []
+    for voice in voices:
+        for speed in speeds:
+            if not force and voice_sample_file(voice, speed):
+                continue
+            key = narration_key(get_voice_sample(voice), voice, speed)
+            path = os.path.join(VOICE_SAMPLE_CONFIG['root'], f"{key}.wav")
+            jobs.append((voice, speed, key, path, submit_narration(get_voice_sample(voice), voice, speed, path)))
+
+    samples = {voice: dict(entries) for voice, entries in load_voice_sample_manifest().items()}
+    rendered = 0
+    for voice, speed, key, path, future in jobs:
+        try:
+            future.result(timeout=TTS_POOL_CONFIG['job_timeout'])
+        except Exception:
+            continue  # Previews of this one synthesize on demand
+        samples.setdefault(voice, {})[_speed_label(speed)] = {
+            'key': key, 'path': path, 'bytes': os.path.getsize(path)
+        }
+        rendered += 1
+
+    if rendered or not os.path.exists(_manifest_path()):
+        temp_file = f"{_manifest_path()}.{os.getpid()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': time.time(), 'samples': samples}, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, _manifest_path())
+    return rendered
+
+def start_voice_sample_warmup():
+    """
+    Warm the samples in a background thread, once per process
+
+    Returns immediately; safe to call on every Streamlit rerun.
+
+    Returns:
+        threading.Thread: The warm-up thread
+    """
+    global _warmup
+    with _manifest_lock:
+        if _warmup is None:
+            _warmup = threading.Thread(target=warm_voice_samples, name='voice-sample-warmup', daemon=True)
+            _warmup.start()
+        return _warmup
+
+if __name__ == '__main__':
+    # Deploy step: python -m utils.voice_samples
+    from utils.tts_pool import shutdown_tts_pool
+
+    started = time.time()
+    count = warm_voice_samples()
+    shutdown_tts_pool()
+    print(f"Rendered {count} voice samples in {time.time() - started:.1f}s")
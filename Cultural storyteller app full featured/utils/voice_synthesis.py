@@ -1,9 +1,30 @@
-import pyttsx3
 import os
+import re
+import time
+import shutil
 import tempfile
-from utils.config import VOICE_CONFIG, get_api_key
+import threading
+from concurrent.futures import Future
+from utils.config import (
+    VOICE_CONFIG, TTS_POOL_CONFIG, NARRATION_CACHE_CONFIG, NARRATION_PIPELINE_CONFIG, MUSIC_CONFIG,
+    DURATION_CONFIG, get_api_key
+)
+from utils.tts_pool import create_engine, submit_speech
+from utils.narration_cache import (
+    narration_key, narration_temp_path, lookup_narration, store_narration, get_narration_info, pin_narrations
+)
+from utils.durations import record_story_duration, calibrated_duration
+from utils.transcoding import submit_narration_audio, get_narration_renditions
+from utils.summarizer import split_sentences
+from utils.audio import concatenate_wavs, mix_with_music, synthesize_music_bed
 import streamlit as st
 
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+
+# Narrations being synthesized, by cache key
+_inflight = {}
+_inflight_lock = threading.Lock()
+
 def get_available_voices():
     """Get list of available voice personalities"""
     return VOICE_CONFIG['available_voices']
@@ -11,33 +32,249 @@ def get_available_voices():
 def initialize_tts_engine():
     """Initialize the text-to-speech engine"""
     try:
-        engine = pyttsx3.init()
-        
-        # Get available system voices
-        voices = engine.getProperty('voices')
-        if voices:
-            # Set a default voice (preferably female for storytelling)
-            for voice in voices:
-                if 'female' in voice.name.lower() or 'woman' in voice.name.lower():
-                    engine.setProperty('voice', voice.id)
-                    break
-            else:
-                # If no female voice found, use the first available
-                engine.setProperty('voice', voices[0].id)
-        
-        # Set default properties
-        engine.setProperty('rate', 180)  # Speed of speech
-        engine.setProperty('volume', 0.9)  # Volume level
-        
-        return engine
+        return create_engine()
     except Exception as e:
         st.error(f"Failed to initialize TTS engine: {str(e)}")
         return None
 
+def _speech_rate(voice_personality, speech_speed):
+    """pyttsx3 rate in words per minute for a personality and speed setting"""
+    base_rates = {
+        'Wise Elder': 160,
+        'Royal Narrator': 170,
+        'Dramatic Storyteller': 190,
+        'Gentle Grandmother': 150,
+        'Heroic Warrior': 180,
+        'Playful Youth': 200,
+        'Mystical Sage': 140
+    }
+    
+    base_rate = base_rates.get(voice_personality, 170)
+    return int(base_rate * speech_speed)
+
+def _deliver(path, save_file):
+    """Copy a cached narration to the caller's path, if they asked for one"""
+    if save_file and os.path.abspath(save_file) != os.path.abspath(path):
+        shutil.copyfile(path, save_file)
+        return save_file
+    return path
+
+def _synthesize_cached(key, text, voice_personality, speech_speed):
+    """Future for the cached narration file; identical concurrent requests share one job"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is not None:
+            return future
+        future = Future()
+        _inflight[key] = future
+    
+    temp_file = narration_temp_path(key)
+    
+    def finish(job):
+        try:
+            job.result()
+            path = store_narration(key, temp_file, voice_personality, speech_speed)
+        except BaseException as e:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            future.set_exception(e)
+            return
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        future.set_result(path)
+    
+    try:
+        job = submit_speech(text, _speech_rate(voice_personality, speech_speed), temp_file)
+    except Exception as e:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        future.set_exception(e)
+        return future
+    
+    job.add_done_callback(finish)
+    return future
+
+def submit_narration(text, voice_personality="Wise Elder", speech_speed=1.0, save_file=None):
+    """
+    Queue speech synthesis on the TTS worker pool without waiting for it
+    
+    Narrations are cached by content, so a repeat resolves immediately.
+    
+    Args:
+        text (str): Text to convert to speech
+        voice_personality (str): Voice personality to use
+        speech_speed (float): Speed of speech (0.5 to 2.0)
+        save_file (str): Optional file path to save audio
+    
+    Returns:
+        Future: Resolves to the path of the generated audio file
+    """
+    key = narration_key(text, voice_personality, speech_speed)
+    path = lookup_narration(key)
+    if path:
+        future = Future()
+        future.set_result(_deliver(path, save_file))
+        return future
+    
+    cached = _synthesize_cached(key, text, voice_personality, speech_speed)
+    if not save_file:
+        return cached
+    
+    future = Future()
+    
+    def deliver(done):
+        try:
+            future.set_result(_deliver(done.result(), save_file))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    cached.add_done_callback(deliver)
+    return future
+
+def split_narration_chunks(text):
+    """
+    Split text into chunks of whole sentences for parallel narration
+    
+    The first chunk is kept short so it is ready to play almost at once;
+    later chunks fill up to chunk_chars and end at paragraph breaks where
+    possible, so each part ends on a natural pause.
+    
+    Returns:
+        list: Chunk texts in reading order
+    """
+    chunks = []
+    current = ''
+    
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        for sentence in split_sentences(paragraph):
+            limit = NARRATION_PIPELINE_CONFIG['chunk_chars'] if chunks else NARRATION_PIPELINE_CONFIG['first_chunk_chars']
+            if current and len(current) + 1 + len(sentence) > limit:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        
+        # Paragraph break: end the chunk unless it is still short
+        if current and len(current) >= NARRATION_PIPELINE_CONFIG['chunk_chars'] // 2:
+            chunks.append(current)
+            current = ''
+    
+    if current:
+        chunks.append(current)
+    return chunks
+
+def stream_narration(text, voice_personality="Wise Elder", speech_speed=1.0):
+    """
+    Narrate text chunk by chunk, yielding each chunk's audio as soon as it
+    and every chunk before it are ready
+    
+    All chunks are queued at once, in order, so the pool works on the
+    first chunk first and the rest in parallel. Each chunk is cached on its
+    own, so an edited story only re-synthesizes the chunks that changed,
+    and chunks a listener stopped waiting for still finish into the cache.
+    
+    Yields:
+        str: Path to each chunk's WAV file, in reading order
+    """
+    futures = [submit_narration(chunk, voice_personality, speech_speed)
+               for chunk in split_narration_chunks(text)]
+    for future in futures:
+        yield future.result(timeout=TTS_POOL_CONFIG['job_timeout'])
+
+def _record_duration(story_id, key, text, voice_personality, speech_speed):
+    """Store a story narration's measured length; a failure here never fails the narration"""
+    try:
+        info = get_narration_info(key)
+        if info:
+            record_story_duration(story_id, voice_personality, speech_speed, info['duration'], text)
+    except Exception:
+        pass
+
+def _is_listing_narration(voice_personality, speech_speed):
+    """The narration every listener gets by default, worth keeping as compressed renditions"""
+    return voice_personality == DURATION_CONFIG['listing_voice'] and round(float(speech_speed), 3) == 1.0
+
+def _after_story_narration(story_id, key, path, text, voice_personality, speech_speed):
+    """Record the narration's length and, for the listing voice, transcode it; never fails the narration"""
+    _record_duration(story_id, key, text, voice_personality, speech_speed)
+    if _is_listing_narration(voice_personality, speech_speed):
+        try:
+            submit_narration_audio(key, path)
+        except Exception:
+            pass
+
+def listing_narration_renditions(text, voice_personality, speech_speed=1.0):
+    """
+    Compressed renditions of a story's narration, if it is the listing
+    voice at normal speed and has been transcoded
+    
+    Returns:
+        list: Renditions, as from get_story_renditions(); empty otherwise
+    """
+    if not _is_listing_narration(voice_personality, speech_speed):
+        return []
+    return get_narration_renditions(narration_key(text, voice_personality, speech_speed))
+
+def narrate_story(text, voice_personality="Wise Elder", speech_speed=1.0, on_chunk=None, story_id=None):
+    """
+    Narrate a whole story in parallel chunks and join them into one file
+    
+    Args:
+        text (str): Story text
+        voice_personality (str): Voice personality to use
+        speech_speed (float): Speed of speech (0.5 to 2.0)
+        on_chunk (callable): Called as on_chunk(index, path, total) as each
+            chunk becomes playable, in order, e.g. to start playback early.
+            Not called for a narration that is already cached. Streamlit
+            can neither queue files on one player nor report when one ends,
+            so pages give each chunk its own player rather than swapping
+            the source of the one that is playing
+        story_id (int): Story being narrated, to record the narration's
+            measured length against it; its listing-voice narration is
+            also transcoded in the background for streaming
+    
+    Returns:
+        str: Path to the cached narration of the full story
+    """
+    key = narration_key(text, voice_personality, speech_speed)
+    path = lookup_narration(key)
+    if path:
+        if story_id is not None:
+            _after_story_narration(story_id, key, path, text, voice_personality, speech_speed)
+        return path
+    
+    chunks = split_narration_chunks(text)
+    temp_file = narration_temp_path(key)
+    # Chunks already stored must still be there when they are joined
+    with pin_narrations(narration_key(chunk, voice_personality, speech_speed) for chunk in chunks):
+        parts = []
+        for index, part in enumerate(stream_narration(text, voice_personality, speech_speed)):
+            parts.append(part)
+            if on_chunk:
+                on_chunk(index, part, len(chunks))
+        
+        try:
+            concatenate_wavs(parts, temp_file)
+        except Exception:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+    path = store_narration(key, temp_file, voice_personality, speech_speed)
+    if story_id is not None:
+        _after_story_narration(story_id, key, path, text, voice_personality, speech_speed)
+    return path
+
 def synthesize_speech(text, voice_personality="Wise Elder", speech_speed=1.0, save_file=None):
     """
     Synthesize speech from text using the specified voice personality
     
+    Runs on a pool of long-lived TTS worker processes, so the engine is
+    already initialized and other narrations can run at the same time.
+    The result is cached by text, voice and speed: replaying a story in the
+    same voice never synthesizes it again.
+    
     Args:
         text (str): Text to convert to speech
         voice_personality (str): Voice personality to use
@@ -48,35 +285,12 @@ def synthesize_speech(text, voice_personality="Wise Elder", speech_speed=1.0, sa
         str: Path to generated audio file or None if failed
     """
     try:
-        engine = initialize_tts_engine()
-        if not engine:
-            return None
-        
-        # Adjust speech rate based on personality and speed setting
-        base_rates = {
-            'Wise Elder': 160,
-            'Royal Narrator': 170,
-            'Dramatic Storyteller': 190,
-            'Gentle Grandmother': 150,
-            'Heroic Warrior': 180,
-            'Playful Youth': 200,
-            'Mystical Sage': 140
-        }
-        
-        base_rate = base_rates.get(voice_personality, 170)
-        adjusted_rate = int(base_rate * speech_speed)
-        engine.setProperty('rate', adjusted_rate)
-        
-        # Create temporary file if no save path provided
-        if not save_file:
-            temp_dir = tempfile.gettempdir()
-            save_file = os.path.join(temp_dir, f"narration_{hash(text) % 10000}.wav")
+        # Long texts are narrated in parallel chunks rather than one long job
+        if len(text) > NARRATION_PIPELINE_CONFIG['min_chars']:
+            return _deliver(narrate_story(text, voice_personality, speech_speed), save_file)
         
-        # Save speech to file
-        engine.save_to_file(text, save_file)
-        engine.runAndWait()
-        
-        return save_file
+        future = submit_narration(text, voice_personality, speech_speed, save_file)
+        return future.result(timeout=TTS_POOL_CONFIG['job_timeout'])
         
     except Exception as e:
         st.error(f"Speech synthesis failed: {str(e)}")
@@ -97,7 +311,17 @@ def get_voice_sample(voice_personality):
     return samples.get(voice_personality, "This is a sample of the selected voice personality.")
 
 def play_voice_sample(voice_personality, speech_speed=1.0):
-    """Generate and return audio sample for a voice personality"""
+    """
+    Generate and return audio sample for a voice personality
+    
+    Samples pre-rendered by utils.voice_samples are served as-is.
+    """
+    from utils.voice_samples import voice_sample_file  # it imports this module
+    
+    audio_file = voice_sample_file(voice_personality, speech_speed)
+    if audio_file:
+        return audio_file
+    
     sample_text = get_voice_sample(voice_personality)
     audio_file = synthesize_speech(sample_text, voice_personality, speech_speed)
     
@@ -105,7 +329,32 @@ def play_voice_sample(voice_personality, speech_speed=1.0):
         return audio_file
     return None
 
-def create_narration_with_background_music(text, voice_personality, music_type=None):
+def get_music_track(music_type):
+    """
+    Path of the WAV loop for a music type
+    
+    A track that isn't installed gets a simple synthesized bed in its place,
+    written once; installing a recording at the same path replaces it.
+    
+    Returns:
+        str: Path, or None for an unknown music type
+    """
+    filename = MUSIC_CONFIG['tracks'].get(music_type)
+    if not filename:
+        return None
+    path = os.path.join(MUSIC_CONFIG['tracks_dir'], filename)
+    if os.path.exists(path):
+        return path
+    
+    bed = MUSIC_CONFIG['beds'].get(music_type)
+    if not bed:
+        return None
+    try:
+        return synthesize_music_bed(path, music_type, **bed)
+    except OSError:
+        return None
+
+def create_narration_with_background_music(text, voice_personality, music_type=None, speech_speed=1.0):
     """
     Create narration with optional background music
     
@@ -113,28 +362,40 @@ def create_narration_with_background_music(text, voice_personality, music_type=N
         text (str): Text to narrate
         voice_personality (str): Voice to use
         music_type (str): Type of background music
+        speech_speed (float): Speed of speech (0.5 to 2.0)
     
     Returns:
         str: Path to combined audio file
     """
     # Generate voice narration
-    narration_file = synthesize_speech(text, voice_personality)
+    narration_file = synthesize_speech(text, voice_personality, speech_speed)
     
     if not narration_file:
         return None
     
-    # If no background music requested, return narration only
-    if not music_type:
+    # If no background music requested (or the track isn't installed), return narration only
+    music_file = get_music_track(music_type) if music_type and music_type != "None" else None
+    if not music_file:
         return narration_file
     
-    # In a full implementation, you would:
-    # 1. Load background music file based on music_type
-    # 2. Mix the narration with background music
-    # 3. Return the combined audio file
+    key = narration_key(text, voice_personality, speech_speed,
+                        variant={'music': music_type, 'track_mtime': os.path.getmtime(music_file),
+                                 'mix': {k: v for k, v in MUSIC_CONFIG.items() if k not in ('tracks', 'tracks_dir')}})
+    path = lookup_narration(key)
+    if path:
+        return path
     
-    # For now, return the narration file
-    # This would be enhanced with audio mixing libraries like pydub
-    return narration_file
+    temp_file = narration_temp_path(key)
+    # Storing the mix may evict; the narration it was made from is returned on failure
+    with pin_narrations([narration_key(text, voice_personality, speech_speed)]):
+        try:
+            mix_with_music(narration_file, music_file, temp_file)
+        except Exception as e:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            st.error(f"Background music mixing failed: {str(e)}")
+            return narration_file
+        return store_narration(key, temp_file, voice_personality, speech_speed)
 
 def get_voice_personality_settings(personality):
     """Get detailed settings for a voice personality"""
@@ -196,6 +457,10 @@ def estimate_narration_duration(text, voice_personality, speech_speed=1.0):
     """
     Estimate the duration of narration in seconds
     
+    Once a voice has enough measured narrations (see utils/durations.py),
+    the estimate comes from a fit to them; until then, from typical
+    speaking rates.
+    
     Args:
         text (str): Text to be narrated
         voice_personality (str): Voice personality
@@ -204,6 +469,10 @@ def estimate_narration_duration(text, voice_personality, speech_speed=1.0):
     Returns:
         float: Estimated duration in seconds
     """
+    calibrated = calibrated_duration(text, voice_personality, speech_speed)
+    if calibrated is not None:
+        return calibrated
+    
     # Average reading speed is about 200 words per minute
     # But varies by personality and speech speed
     
@@ -229,7 +498,12 @@ def estimate_narration_duration(text, voice_personality, speech_speed=1.0):
     return duration_minutes * 60  # Convert to seconds
 
 def cleanup_temp_audio_files():
-    """Clean up temporary audio files"""
+    """
+    Clean up temporary audio files
+    
+    Cached narrations are kept; the cache bounds its own size. Only scratch
+    files abandoned by interrupted syntheses are removed from it.
+    """
     temp_dir = tempfile.gettempdir()
     try:
         for filename in os.listdir(temp_dir):
@@ -240,4 +514,14 @@ def cleanup_temp_audio_files():
                 except:
                     pass  # Ignore errors when cleaning up
     except:
-        pass  # Ignore errors when accessing temp directory
\ No newline at end of file
+        pass  # Ignore errors when accessing temp directory
+    
+    cutoff = time.time() - TTS_POOL_CONFIG['job_timeout']
+    for directory, _, filenames in os.walk(NARRATION_CACHE_CONFIG['root']):
+        for filename in filenames:
+            file_path = os.path.join(directory, filename)
+            try:
+                if filename.endswith(".tmp.wav") and os.path.getmtime(file_path) < cutoff:
+                    os.remove(file_path)
+            except OSError:
+                pass